@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Zone, Alert, NotificationLog
+from .models import Zone, Alert, ImportJob, NotificationLog, NotificationJob, NotificationOutbox
 
 
 @admin.register(NotificationLog)
@@ -8,6 +8,24 @@ class NotificationLogAdmin(admin.ModelAdmin):
     list_filter = ('enviado_simulado',)
 
 
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'total', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status',)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'status', 'rows_processed', 'total_rows', 'alerts_created', 'created_at')
+    list_filter = ('status', 'format')
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('alert', 'email', 'status', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status',)
+
+
 @admin.register(Zone)
 class ZoneAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'codigo', 'created_at')
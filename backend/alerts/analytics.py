@@ -0,0 +1,95 @@
+"""
+Analítica de alertas: conteos por periodo (hora, día, semana, mes) y por celda de una
+grilla lat/lon, agregados en la base de datos. Las series por día, semana o mes salen
+del resumen diario (AlertDailyStat) cuando los filtros lo permiten; las series por hora
+y la grilla necesitan la hora exacta y la posición, y agrupan las alertas filtradas.
+"""
+from django.db.models import Count, DateField, DateTimeField, F, Sum, Value
+from django.db.models.functions import Floor, Trunc
+
+from . import rollup
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+# Filtros de AlertFilter que el resumen diario puede aplicar
+ROLLUP_FILTERS = frozenset({'desde', 'hasta', 'zona', 'tipo_desastre', 'nivel_riesgo', 'activas'})
+# Límites de la grilla (grados): celdas menores no agregan nada frente a la exportación
+MIN_CELL_DEGREES = 0.001
+MAX_CELL_DEGREES = 90.0
+MAX_GRID_CELLS = 20000
+
+
+class TooManyCells(Exception):
+    """La grilla pedida tiene más de MAX_GRID_CELLS celdas con datos."""
+
+
+def _active_filters(filters):
+    return {name: value for name, value in filters.items() if value not in (None, '')}
+
+
+def uses_rollup(bucket, filters):
+    """La serie puede salir del resumen diario: periodo de al menos un día y filtros soportados."""
+    return bucket != 'hour' and set(_active_filters(filters)) <= ROLLUP_FILTERS
+
+
+def _rollup_rows(filters):
+    """Filas del resumen con los filtros de AlertFilter (ver ROLLUP_FILTERS)."""
+    filters = _active_filters(filters)
+    rows = rollup.rows_in_range(filters.get('desde'), filters.get('hasta'))
+    if 'zona' in filters:
+        # zona=0 en el resumen significa "sin zona"; en el filtro no coincide con ninguna alerta
+        rows = rows.filter(zona=filters['zona']) if filters['zona'] else rows.none()
+    for name in ('tipo_desastre', 'nivel_riesgo'):
+        if name in filters:
+            rows = rows.filter(**{name: filters[name]})
+    if 'activas' in filters:
+        rows = rows.filter(activa=filters['activas'])
+    return rows
+
+
+def time_series(queryset, bucket, filters):
+    """
+    [(periodo, total)] en orden. Periodos de día, semana (lunes) y mes como fecha local;
+    de hora como datetime local. `queryset` son las alertas ya filtradas con `filters`.
+    """
+    if uses_rollup(bucket, filters):
+        period = F('day') if bucket == 'day' else Trunc('day', bucket, output_field=DateField())
+        rows = _rollup_rows(filters).annotate(period=period).values_list('period').annotate(total=Sum('total'))
+    else:
+        output_field = DateTimeField() if bucket == 'hour' else DateField()
+        rows = (
+            queryset.annotate(period=Trunc('fecha_hora', bucket, output_field=output_field))
+            .values_list('period').annotate(total=Count('id'))
+        )
+    return list(rows.order_by('period'))
+
+
+def grid_counts(queryset, cell):
+    """
+    [(lat, lon, total)] por celda de `cell` grados (esquina suroeste) de las alertas
+    geolocalizadas. TooManyCells si la grilla supera MAX_GRID_CELLS celdas con datos.
+    """
+    size = Value(cell)
+    rows = list(
+        queryset.filter(latitude__isnull=False, longitude__isnull=False).order_by()
+        .annotate(row=Floor(F('latitude') / size), col=Floor(F('longitude') / size))
+        .values_list('row', 'col').annotate(total=Count('id'))
+        .order_by('row', 'col')[:MAX_GRID_CELLS + 1]
+    )
+    if len(rows) > MAX_GRID_CELLS:
+        raise TooManyCells(f'La grilla supera {MAX_GRID_CELLS} celdas; use una celda mayor')
+    return [(round(row * cell, 6), round(col * cell, 6), total) for row, col, total in rows]
+
+
+def analytics(queryset, filters, bucket, cell=None):
+    """Payload de /api/analytics/: serie por periodo y, si se pide `cell`, la grilla."""
+    serie = time_series(queryset, bucket, filters)
+    data = {
+        'bucket': bucket,
+        'origen': 'resumen_diario' if uses_rollup(bucket, filters) else 'alertas',
+        'total': sum(total for _, total in serie),
+        'serie': [{'periodo': period, 'total': total} for period, total in serie],
+    }
+    if cell is not None:
+        data['celda'] = cell
+        data['grilla'] = [{'lat': lat, 'lon': lon, 'total': total} for lat, lon, total in grid_counts(queryset, cell)]
+    return data
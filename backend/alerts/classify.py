@@ -0,0 +1,59 @@
+"""
+Clasificación en bloque de puntos GPS: zona que los contiene y alertas activas que los cubren.
+Ambos índices viven en memoria y se reconstruyen solo cuando cambian zonas o alertas.
+"""
+import numpy as np
+
+from . import versions
+from .geo import CircleIndex
+from .models import Alert, Zone
+from .zones import resolve_zone_ids
+
+ALERT_SUMMARY_FIELDS = ('id', 'tipo_desastre', 'nivel_riesgo', 'zona_id', 'latitude', 'longitude', 'radio_impacto')
+
+_alert_index = None
+_alert_rows = None
+_alert_index_signature = None
+
+
+def get_active_alert_index():
+    """
+    (CircleIndex, filas resumen) de las alertas activas geolocalizadas, cacheado por la
+    versión de los datos (una lectura por clave primaria en vez de un agregado por llamada).
+    La versión se lee antes que las filas: si cambia entre medias, la próxima llamada reconstruye.
+    """
+    global _alert_index, _alert_rows, _alert_index_signature
+    signature = versions.current_version()
+    if _alert_index is None or signature != _alert_index_signature:
+        qs = Alert.objects.filter(activa=True, latitude__isnull=False, longitude__isnull=False)
+        rows = list(qs.order_by().values(*ALERT_SUMMARY_FIELDS))
+        _alert_index = CircleIndex(
+            [r['latitude'] for r in rows],
+            [r['longitude'] for r in rows],
+            [r['radio_impacto'] for r in rows],
+        )
+        _alert_rows = rows
+        _alert_index_signature = signature
+    return _alert_index, _alert_rows
+
+
+def classify_points(lats, lons):
+    """
+    Clasifica puntos en bloque.
+
+    Devuelve (zone_ids, alert_ids, zonas, alertas): por punto el id de zona y la
+    lista de ids de alertas que lo cubren, más los nombres de zona y el resumen de
+    cada alerta referenciada (para no repetirlos en cada punto).
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    zone_ids = resolve_zone_ids(lats, lons)
+    index, rows = get_active_alert_index()
+    covering = index.covering(lats, lons)
+    alert_ids = [[rows[p]['id'] for p in positions] for positions in covering]
+
+    used_alerts = {p for positions in covering for p in positions}
+    alertas = {rows[p]['id']: rows[p] for p in used_alerts}
+    used_zones = {z for z in zone_ids if z is not None}
+    zonas = dict(Zone.objects.filter(pk__in=used_zones).values_list('id', 'nombre')) if used_zones else {}
+    return zone_ids, alert_ids, zonas, alertas
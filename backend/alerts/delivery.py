@@ -0,0 +1,360 @@
+"""
+Motor de envío de correos de alerta.
+Reutiliza un cliente MailerSend y una conexión SMTP autenticada por hilo del pool,
+agrupa destinatarios en solicitudes bulk-email y envía en paralelo con un
+ThreadPoolExecutor de concurrencia acotada.
+"""
+import json
+import logging
+import os
+import re
+import smtplib
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from mailersend import MailerSendClient, EmailBuilder
+from mailersend.exceptions import RateLimitExceeded
+from requests.adapters import HTTPAdapter
+
+from .emails import get_rendered_email
+from .ratelimit import classify_error, get_bucket, provider_rate, retry_delay
+
+DEFAULT_SENDER = 'info@trial-z3m5yelyy9oldpyo.mlsender.net'
+# Máximo de correos por solicitud al endpoint bulk-email de MailerSend
+MAILERSEND_BULK_LIMIT = 500
+# Posición del mensaje en las claves de validation_errors/suppressed_recipients ("message.<n>...")
+BULK_MESSAGE_KEY = re.compile(r'^message\.(\d+)')
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryEngine:
+    """
+    Envío de correos con clientes reutilizados.
+
+    Cada hilo del pool guarda su propio MailerSendClient (sesión HTTP con keep-alive)
+    y, si hace falta el fallback, su propia sesión SMTP ya con STARTTLS y login;
+    se reconecta solo cuando el servidor la cierra.
+    """
+
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency or getattr(settings, 'EMAIL_DELIVERY_CONCURRENCY', 8)
+        self.api_key = getattr(settings, 'MAILERSEND_API_KEY', None)
+        self.sender_email = getattr(settings, 'MAILERSEND_SENDER', DEFAULT_SENDER)
+        self.base_url = getattr(settings, 'MAILERSEND_BASE_URL', None)
+        self.bulk_size = min(getattr(settings, 'MAILERSEND_BULK_BATCH_SIZE', MAILERSEND_BULK_LIMIT), MAILERSEND_BULK_LIMIT)
+        self.smtp_host = os.environ.get('SMTP_HOST')
+        self.smtp_port = int(os.environ.get('SMTP_PORT') or 587)
+        self.smtp_user = os.environ.get('SMTP_USER')
+        self.smtp_password = os.environ.get('SMTP_PASSWORD')
+        self.smtp_starttls = os.environ.get('SMTP_STARTTLS', 'true').lower() != 'false'
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._smtp_connections = []
+        self._executor = None
+
+    # -- clientes por hilo -------------------------------------------------
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            kwargs = {'base_url': self.base_url} if self.base_url else {}
+            client = MailerSendClient(self.api_key, **kwargs)
+            # Sin reintentos inmediatos del cliente (su Retry de urllib3 convierte 429/5xx en
+            # errores de red sin Retry-After): los reprograma la outbox con backoff
+            adapter = HTTPAdapter(max_retries=0, pool_maxsize=self.concurrency)
+            client.session.mount('https://', adapter)
+            client.session.mount('http://', adapter)
+            self._local.client = client
+        return client
+
+    def _smtp(self, reconnect=False):
+        server = getattr(self._local, 'smtp', None)
+        if server is not None and not reconnect:
+            return server
+        if server is not None:
+            self._drop_smtp(server)
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=10)
+        if self.smtp_starttls:
+            server.starttls()
+        server.login(self.smtp_user, self.smtp_password)
+        self._local.smtp = server
+        with self._lock:
+            self._smtp_connections.append(server)
+        return server
+
+    def _drop_smtp(self, server):
+        self._local.smtp = None
+        with self._lock:
+            if server in self._smtp_connections:
+                self._smtp_connections.remove(server)
+        try:
+            server.quit()
+        except Exception:
+            pass
+
+    # -- envío ---------------------------------------------------------------
+
+    @staticmethod
+    def _failure(provider, error):
+        """Resultado fallido; marca si conviene reintentar y pausa el bucket ante un 429."""
+        retryable, retry_after = classify_error(error)
+        if isinstance(error, RateLimitExceeded):
+            get_bucket('mailersend').pause(retry_after or retry_delay(1))
+        return {
+            'ok': False, 'provider': provider, 'provider_id': None, 'response': str(error),
+            'retryable': retryable, 'retry_after': retry_after,
+        }
+
+    def sendable_within(self, seconds):
+        """Mensajes que el límite de tasa permite enviar en `seconds` (para dimensionar lotes)."""
+        if self.api_key and not getattr(settings, 'MAILERSEND_SIMULATE', False):
+            return max(1, int(provider_rate('mailersend') * seconds * self.bulk_size))
+        return None
+
+    def send(self, alert, recipient_email, rendered=None):
+        """Envía un correo; mismo formato de resultado que `_send_alert_email`."""
+        if not self.api_key:
+            return False
+        rendered = rendered or get_rendered_email(alert, self.sender_email)
+        subject, html_content, text_content = rendered.personalize(recipient_email)
+
+        try:
+            if getattr(settings, 'MAILERSEND_SIMULATE', False):
+                return {'ok': True, 'provider': 'simulate', 'provider_id': None, 'response': 'simulated'}
+
+            email = self._build_email(recipient_email, subject, html_content, text_content)
+            get_bucket('mailersend').acquire()
+            resp = self._client().emails.send(email)
+            provider_id = None
+            try:
+                provider_id = resp.headers.get('x-message-id') or (resp.data or {}).get('id')
+            except Exception:
+                provider_id = None
+            return {'ok': True, 'provider': 'mailersend_api', 'provider_id': provider_id, 'response': str(resp)}
+        except Exception as e:
+            logger.warning("Error enviando correo via API MailerSend: %s", e)
+            failure = self._failure('mailersend_api', e)
+
+            # Fallback: envío por SMTP si hay credenciales en env
+            if self._smtp_configured():
+                return self._send_smtp(recipient_email, rendered)
+
+            return failure
+
+    def _build_email(self, recipient_email, subject, html_content, text_content):
+        return (
+            EmailBuilder()
+            .from_email(self.sender_email, "SAT - Alerta Temprana")
+            .to_many([{"email": recipient_email, "name": "Usuario de Riesgo"}])
+            .subject(subject)
+            .html(html_content)
+            .text(text_content)
+            .build()
+        )
+
+    def _smtp_configured(self):
+        return bool(self.smtp_host and self.smtp_user and self.smtp_password)
+
+    def _bulk_payload(self, recipients, rendered):
+        """
+        Cuerpo JSON de bulk-email. El correo se valida con EmailBuilder una sola vez y
+        se copia por destinatario cambiando `to` y los tokens: validar cada dirección
+        con pydantic costaba más CPU que el propio envío.
+        """
+        subject, html_content, text_content = rendered.personalize(recipients[0])
+        base = self._build_email(recipients[0], subject, html_content, text_content).model_dump(
+            by_alias=True, exclude_none=True
+        )
+        payload = []
+        for recipient in recipients:
+            subject, html_content, text_content = rendered.personalize(recipient)
+            payload.append({
+                **base,
+                'to': [{'email': recipient, 'name': 'Usuario de Riesgo'}],
+                'html': html_content,
+                'text': text_content,
+            })
+        return payload
+
+    def _send_bulk_chunk(self, recipients, rendered):
+        """
+        Un solo POST bulk-email para hasta `bulk_size` destinatarios del mismo contenido.
+        El 202 solo significa que MailerSend encoló el bulk: cada destinatario queda
+        `accepted` con el id del bulk y su posición, y el resultado real se concilia
+        después con `bulk_status` (ver `outbox.reconcile_accepted`).
+        """
+        if getattr(settings, 'MAILERSEND_SIMULATE', False):
+            return [{'ok': True, 'provider': 'simulate', 'provider_id': None, 'response': 'simulated'}
+                    for _ in recipients]
+        try:
+            payload = self._bulk_payload(recipients, rendered)
+            get_bucket('mailersend').acquire()
+            resp = self._client().request(method='POST', path='bulk-email', body=payload)
+            try:
+                data = resp.json() if resp.content else {}
+            except ValueError:
+                data = {}
+            bulk_id = data.get('bulk_email_id')
+            response = str(data or resp)
+            if not bulk_id:
+                # Sin id no hay estado que consultar: se da por enviado, como una respuesta de email
+                logger.warning("Respuesta de bulk-email sin bulk_email_id: %s", response)
+                return [{'ok': True, 'provider': 'mailersend_bulk', 'provider_id': None, 'response': response}
+                        for _ in recipients]
+            return [
+                {'ok': True, 'accepted': True, 'provider': 'mailersend_bulk', 'provider_id': bulk_id,
+                 'bulk_index': n, 'response': response}
+                for n in range(len(recipients))
+            ]
+        except Exception as e:
+            logger.warning("Error enviando lote via API MailerSend (%d destinatarios): %s", len(recipients), e)
+            failure = self._failure('mailersend_bulk', e)
+            if self._smtp_configured():
+                return [self._send_smtp(r, rendered) for r in recipients]
+            return [dict(failure) for _ in recipients]
+
+    def bulk_status(self, bulk_id):
+        """`data` de GET bulk-email/{id} (estado, errores de validación, ids de mensajes)."""
+        get_bucket('mailersend').acquire()
+        resp = self._client().request(method='GET', path=f'bulk-email/{bulk_id}')
+        return (resp.json() if resp.content else {}).get('data') or {}
+
+    def send_bulk(self, jobs):
+        """
+        Envía (alert, email) agrupando destinatarios de la misma alerta en solicitudes
+        bulk-email de hasta `bulk_size`; los lotes se envían en paralelo.
+        Devuelve los resultados por destinatario en el mismo orden que `jobs`.
+        """
+        if not self.api_key:
+            return [False] * len(jobs)
+        by_alert = {}
+        for position, (alert, email) in enumerate(jobs):
+            by_alert.setdefault(alert.pk, (alert, []))[1].append((position, email))
+
+        chunks = []
+        for alert, items in by_alert.values():
+            rendered = get_rendered_email(alert, self.sender_email)
+            for start in range(0, len(items), self.bulk_size):
+                chunks.append((items[start:start + self.bulk_size], rendered))
+
+        results = [None] * len(jobs)
+        chunk_results = self._pool().map(
+            lambda chunk: self._send_bulk_chunk([email for _, email in chunk[0]], chunk[1]), chunks
+        )
+        for (items, _), outcome in zip(chunks, chunk_results):
+            for (position, _), result in zip(items, outcome):
+                results[position] = result
+        return results
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='sat-mail')
+        return self._executor
+
+    def _send_smtp(self, recipient_email, rendered):
+        # MIME ya codificado en la caché; solo se sustituyen cabecera To y tokens
+        msg = rendered.mime_for(recipient_email)
+        get_bucket('smtp').acquire()
+        try:
+            try:
+                self._smtp().sendmail(self.sender_email, [recipient_email], msg)
+            except smtplib.SMTPServerDisconnected:
+                # La sesión persistente expiró: reconectar una vez
+                self._smtp(reconnect=True).sendmail(self.sender_email, [recipient_email], msg)
+            return {'ok': True, 'provider': 'smtp', 'provider_id': None, 'response': 'smtp_ok'}
+        except Exception as se:
+            logger.warning("Error enviando correo via SMTP fallback: %s", se)
+            server = getattr(self._local, 'smtp', None)
+            if server is not None:
+                self._drop_smtp(server)
+            return self._failure('smtp', se)
+
+    def send_many(self, jobs):
+        """
+        Envía en paralelo una lista de (alert, email); devuelve los resultados en el mismo orden.
+        El contenido se toma de la caché de correos renderizados (uno por alerta).
+        """
+        rendered = {}
+        for alert, _ in jobs:
+            if alert.pk not in rendered:
+                rendered[alert.pk] = get_rendered_email(alert, self.sender_email)
+        return list(self._pool().map(lambda job: self.send(job[0], job[1], rendered[job[0].pk]), jobs))
+
+    def close(self):
+        """Cierra el pool de hilos y las sesiones SMTP abiertas."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            connections = list(self._smtp_connections)
+            self._smtp_connections.clear()
+        for server in connections:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+
+def bulk_results(data, positions):
+    """
+    Resultado de cada posición de `positions` (orden del cuerpo enviado) según `data` de
+    GET bulk-email/{id}, o None mientras MailerSend aún procesa el bulk.
+
+    Las posiciones con `validation_errors` o en `suppressed_recipients` fallan sin
+    reintento; `messages_id` trae, en orden, los ids de los mensajes restantes. Un bulk
+    en estado `failed` se reintenta completo.
+    """
+    bulk_id = data.get('id') or ''
+    state = data.get('state')
+    if state == 'failed':
+        return [
+            {'ok': False, 'provider': 'mailersend_bulk', 'provider_id': None,
+             'response': f'bulk-email {bulk_id} failed', 'retryable': True, 'retry_after': None}
+            for _ in positions
+        ]
+    if state != 'completed':
+        return None
+    errors = {}
+    for field in ('validation_errors', 'suppressed_recipients'):
+        for key, detail in (data.get(field) or {}).items():
+            match = BULK_MESSAGE_KEY.match(key)
+            if match:
+                errors.setdefault(int(match.group(1)), []).append(f'{field} {key}: {json.dumps(detail)}')
+    message_ids = data.get('messages_id') or []
+    rejected = sorted(errors)
+    results = []
+    for position in positions:
+        if position in errors:
+            results.append({'ok': False, 'provider': 'mailersend_bulk', 'provider_id': None,
+                            'response': '; '.join(errors[position]), 'retryable': False})
+            continue
+        # Los ids solo cubren los mensajes aceptados: descontar los rechazados anteriores
+        offset = position - bisect_left(rejected, position)
+        message_id = message_ids[offset] if offset < len(message_ids) else bulk_id
+        results.append({'ok': True, 'provider': 'mailersend_bulk', 'provider_id': message_id,
+                        'response': f'bulk-email {bulk_id} completed'})
+    return results
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Motor compartido del proceso (conexiones reutilizadas entre llamadas)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = DeliveryEngine()
+        return _engine
+
+
+def set_engine(engine):
+    """Reemplaza el motor compartido (p. ej. uno apuntando a proveedores locales); devuelve el anterior."""
+    global _engine
+    with _engine_lock:
+        previous, _engine = _engine, engine
+        return previous
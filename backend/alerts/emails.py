@@ -0,0 +1,112 @@
+"""
+Correos de alerta pre-renderizados.
+El contenido depende solo de la alerta: se renderiza una vez con las plantillas
+`alerts/email/alert.{html,txt}` y se guarda, junto con el MIME ya codificado para
+SMTP, en una caché LRU por (id, updated_at). Por destinatario solo se sustituyen
+los tokens de personalización.
+"""
+import html
+import quopri
+import threading
+from collections import OrderedDict
+from email.message import EmailMessage
+from email.policy import SMTP
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+# Alertas con correo renderizado en memoria por proceso
+RENDERED_CACHE_SIZE = 256
+
+
+def _token(name, kind='text'):
+    """Token de personalización tal como queda en el texto renderizado; `:html` se sustituye escapado."""
+    return f'[[{name}:html]]' if kind == 'html' else f'[[{name}]]'
+
+
+def _qp(value):
+    return quopri.encodestring(value.encode('utf-8')).replace(b'\n', b'\r\n')
+
+
+class RenderedEmail:
+    """Asunto, cuerpos y MIME codificado de una alerta, con tokens sin sustituir."""
+
+    def __init__(self, subject, html_content, text_content, sender_email):
+        self.subject = subject
+        self.html = html_content
+        self.text = text_content
+
+        msg = EmailMessage()
+        msg['Subject'] = subject
+        msg['From'] = sender_email
+        # quoted-printable deja los tokens ASCII intactos en el MIME codificado
+        msg.set_content(text_content, cte='quoted-printable')
+        msg.add_alternative(html_content, subtype='html', cte='quoted-printable')
+        self.mime = msg.as_bytes(policy=SMTP)
+
+    @staticmethod
+    def _values(recipient_email):
+        return {'email': recipient_email}
+
+    def personalize(self, recipient_email):
+        """(asunto, html, texto) para un destinatario."""
+        html_content, text_content = self.html, self.text
+        for name, value in self._values(recipient_email).items():
+            html_content = html_content.replace(_token(name, 'html'), html.escape(value))
+            text_content = text_content.replace(_token(name), value)
+        return self.subject, html_content, text_content
+
+    def mime_for(self, recipient_email):
+        """Mensaje SMTP listo para `sendmail`: cabecera To + MIME cacheado con tokens sustituidos."""
+        data = self.mime
+        for name, value in self._values(recipient_email).items():
+            data = data.replace(_token(name, 'html').encode(), _qp(html.escape(value)))
+            data = data.replace(_token(name).encode(), _qp(value))
+        return b'To: ' + recipient_email.encode('utf-8') + b'\r\n' + data
+
+
+def render_alert_email(alert, sender_email=None):
+    """Renderiza las plantillas de la alerta (sin caché)."""
+    tipo = alert.get_tipo_desastre_display()
+    nivel = alert.get_nivel_riesgo_display()
+    context = {'alert': alert, 'tipo': tipo, 'nivel': nivel}
+    html_content = render_to_string(
+        'alerts/email/alert.html', {**context, 'destinatario': _token('email', 'html')}
+    )
+    text_content = render_to_string(
+        'alerts/email/alert.txt', {**context, 'destinatario': _token('email')}
+    ).strip() + '\n'
+    sender_email = sender_email or getattr(settings, 'MAILERSEND_SENDER', '')
+    return RenderedEmail(f"⚠️ ALERTA: {tipo} - {nivel}", html_content, text_content, sender_email)
+
+
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
+
+
+def get_rendered_email(alert, sender_email=None):
+    """
+    Correo renderizado de la alerta desde la caché.
+    Si la alerta cambió (otro updated_at) o la entrada fue desalojada, se vuelve a renderizar.
+    """
+    key = alert.pk
+    version = (alert.updated_at, sender_email)
+    with _rendered_lock:
+        entry = _rendered.get(key)
+        if entry is not None and entry[0] == version:
+            _rendered.move_to_end(key)
+            return entry[1]
+    rendered = render_alert_email(alert, sender_email)
+    if key is None:
+        return rendered
+    with _rendered_lock:
+        _rendered[key] = (version, rendered)
+        _rendered.move_to_end(key)
+        while len(_rendered) > RENDERED_CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return rendered
+
+
+def forget_rendered_email(alert_id):
+    with _rendered_lock:
+        _rendered.pop(alert_id, None)
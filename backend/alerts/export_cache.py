@@ -0,0 +1,119 @@
+"""
+Caché en disco de exportaciones de alertas.
+La clave combina formato, filtros normalizados y la versión de los datos
+(`versions.current_version()`, que toda alta, edición o baja de alertas y zonas
+incrementa), así cualquier cambio genera otra clave. La misma clave sirve de ETag: una
+descarga repetida cuesta leer una fila por clave primaria y un stat, o un 304 si el
+cliente ya tiene el archivo. Los archivos se escriben
+mientras se envía la primera respuesta y se descartan por LRU cuando el total supera
+EXPORT_CACHE_MAX_BYTES.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.http import FileResponse
+
+from .exports import EXPORT_CONTENT_TYPES
+
+# Archivos a medio escribir más viejos que esto se consideran abandonados
+STALE_PART_SECONDS = 60 * 60
+
+
+def cache_dir():
+    return getattr(settings, 'EXPORT_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'exports'))
+
+
+def cache_max_bytes():
+    """Tamaño máximo de la caché (0 = no guardar archivos, solo ETag)."""
+    return getattr(settings, 'EXPORT_CACHE_MAX_BYTES', 500 * 1024 * 1024)
+
+
+def export_key(fmt, filters, version):
+    """Clave estable: formato + filtros sin valores vacíos (orden fijo) + versión de los datos."""
+    normalized = {name: str(value) for name, value in sorted(filters.items()) if value not in (None, '')}
+    payload = json.dumps([fmt, normalized, version], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def etag_for(key):
+    return f'"{key[:32]}"'
+
+
+def _path(key, fmt):
+    return os.path.join(cache_dir(), f'{key}.{fmt}')
+
+
+def cached_response(key, fmt):
+    """FileResponse del archivo cacheado, o None. Marca el archivo como usado (LRU)."""
+    path = _path(key, fmt)
+    try:
+        os.utime(path)
+        output = open(path, 'rb')
+    except OSError:
+        return None
+    return FileResponse(output, as_attachment=True, filename=f'alertas.{fmt}',
+                        content_type=EXPORT_CONTENT_TYPES[fmt])
+
+
+def _tee(content, key, fmt):
+    """Reenvía los bloques de la respuesta y los guarda; el archivo solo aparece completo."""
+    os.makedirs(cache_dir(), exist_ok=True)
+    part = os.path.join(cache_dir(), f'{key}.{uuid.uuid4().hex}.part')
+    complete = False
+    try:
+        with open(part, 'wb') as output:
+            for chunk in content:
+                output.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        if complete:
+            os.replace(part, _path(key, fmt))
+            evict()
+        elif os.path.exists(part):
+            # Cliente desconectado o error a mitad: no dejar un archivo incompleto
+            os.remove(part)
+
+
+def store_response(response, key, fmt):
+    """Envuelve la respuesta recién generada para que quede en caché al terminar de enviarse."""
+    if cache_max_bytes() > 0:
+        response.streaming_content = _tee(response.streaming_content, key, fmt)
+    return response
+
+
+def evict():
+    """Borra los archivos menos usados hasta que la caché quepa en EXPORT_CACHE_MAX_BYTES."""
+    limit = cache_max_bytes()
+    now = time.time()
+    entries = []
+    total = 0
+    with os.scandir(cache_dir()) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.name.endswith('.part'):
+                if now - stat.st_mtime > STALE_PART_SECONDS:
+                    _remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        # Ya borrado por otro proceso, o abierto por una descarga en curso (Windows)
+        pass
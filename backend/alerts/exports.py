@@ -0,0 +1,350 @@
+"""
+Exportación de alertas en streaming.
+Las filas se leen con `.values_list().iterator()` (sin instanciar modelos) y se escriben
+a medida que llegan: CSV, NDJSON, GeoJSON y Arrow (IPC stream) directo a la respuesta.
+XLSX y Parquet también: el ZIP se escribe sin retroceder (descriptores de datos) y el
+Parquet agrega un row group por lote y el pie al final, así que ninguno pasa por disco.
+"""
+import csv
+import io
+import json
+import math
+import re
+import zipfile
+from datetime import datetime, timedelta
+from itertools import islice
+from string import ascii_uppercase
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import DISASTER_TYPES, RISK_LEVELS
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Columnas de la exportación: (encabezado, campo)
+EXPORT_COLUMNS = [
+    ('ID', 'id'),
+    ('Tipo', 'tipo_desastre'),
+    ('Nivel riesgo', 'nivel_riesgo'),
+    ('Zona', 'zona__nombre'),
+    ('Fecha y hora', 'fecha_hora'),
+    ('Descripción', 'descripcion'),
+    ('Latitud', 'latitude'),
+    ('Longitud', 'longitude'),
+    ('Radio (m)', 'radio_impacto'),
+    ('Activa', 'activa'),
+]
+EXPORT_HEADERS = [header for header, _ in EXPORT_COLUMNS]
+EXPORT_FIELDS = [field for _, field in EXPORT_COLUMNS]
+
+_TIPO_DISPLAY = dict(DISASTER_TYPES)
+_NIVEL_DISPLAY = dict(RISK_LEVELS)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Formato → tipo de contenido (el archivo se llama alertas.<formato>)
+EXPORT_CONTENT_TYPES = {
+    'xlsx': XLSX_CONTENT_TYPE,
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'geojson': 'application/geo+json; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Exportaciones para análisis: valores crudos y tipados (códigos, fecha UTC, bool)
+RAW_FIELDS = [
+    'id', 'tipo_desastre', 'nivel_riesgo', 'zona_id', 'zona__nombre', 'fecha_hora',
+    'descripcion', 'latitude', 'longitude', 'radio_impacto', 'activa',
+]
+RAW_COLUMNS = [
+    'id', 'tipo_desastre', 'nivel_riesgo', 'zona_id', 'zona', 'fecha_hora',
+    'descripcion', 'latitude', 'longitude', 'radio_impacto', 'activa',
+]
+
+
+def export_rows(queryset):
+    """Filas ya formateadas (mismos valores que la exportación Excel original)."""
+    for (pk, tipo, nivel, zona, fecha_hora, descripcion,
+         latitude, longitude, radio, activa) in queryset.values_list(*EXPORT_FIELDS).iterator(
+            chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            pk,
+            _TIPO_DISPLAY.get(tipo, tipo),
+            _NIVEL_DISPLAY.get(nivel, nivel),
+            zona or '',
+            timezone.localtime(fecha_hora).replace(tzinfo=None),
+            descripcion or '',
+            latitude,
+            longitude,
+            radio,
+            'Sí' if activa else 'No',
+        ]
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(queryset, filename='alertas.csv'):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        # BOM para que Excel detecte UTF-8
+        yield '\ufeff' + writer.writerow(EXPORT_HEADERS)
+        for row in export_rows(queryset):
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type=EXPORT_CONTENT_TYPES['csv'])
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Destino sin seek para zipfile/pyarrow: guarda lo escrito hasta que se recoge."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_OFFICE_RELS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+# Partes fijas del libro (una hoja y un estilo de fecha, el mismo formato que usa openpyxl)
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        f'<Relationships xmlns="{_RELATIONSHIPS_NS}">'
+        f'<Relationship Id="rId1" Type="{_OFFICE_RELS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        f'<workbook xmlns="{_SPREADSHEET_NS}" xmlns:r="{_OFFICE_RELS}">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        f'<Relationships xmlns="{_RELATIONSHIPS_NS}">'
+        f'<Relationship Id="rId1" Type="{_OFFICE_RELS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_OFFICE_RELS}/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        f'<styleSheet xmlns="{_SPREADSHEET_NS}">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd h:mm:ss"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+# Caracteres de control que XML no admite (openpyxl los rechaza)
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(ref, value):
+    if value is None or (isinstance(value, float) and not math.isfinite(value)):
+        return ''
+    if isinstance(value, datetime):
+        serial = (value - _EXCEL_EPOCH) / timedelta(days=1)
+        return f'<c r="{ref}" s="1"><v>{serial!r}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(number, values):
+    cells = ''.join(_xlsx_cell(f'{column}{number}', value) for column, value in zip(ascii_uppercase, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+def xlsx_response(queryset, filename='alertas.xlsx'):
+    """
+    XLSX en streaming: las partes fijas y luego la hoja (texto en línea, sin tabla de
+    strings compartidos) se comprimen en un ZIP escrito hacia adelante; cada bloque de
+    EXPORT_CHUNK_SIZE filas sale en cuanto se lee de la BD.
+    """
+    def chunks():
+        buffer = _ChunkBuffer()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, xml in XLSX_PARTS.items():
+                archive.writestr(name, _XML_HEAD + xml)
+            yield buffer.take()
+            with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+                sheet.write(f'{_XML_HEAD}<worksheet xmlns="{_SPREADSHEET_NS}"><sheetData>'.encode())
+                sheet.write(_xlsx_row(1, EXPORT_HEADERS).encode())
+                rows = enumerate(export_rows(queryset), start=2)
+                while batch := list(islice(rows, EXPORT_CHUNK_SIZE)):
+                    sheet.write(''.join(_xlsx_row(number, row) for number, row in batch).encode())
+                    yield buffer.take()
+                sheet.write(b'</sheetData></worksheet>')
+        yield buffer.take()
+
+    response = StreamingHttpResponse(chunks(), content_type=EXPORT_CONTENT_TYPES['xlsx'])
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def _raw_batches(queryset):
+    """Listas de tuplas crudas de hasta EXPORT_CHUNK_SIZE filas."""
+    rows = queryset.values_list(*RAW_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while True:
+        batch = list(islice(rows, EXPORT_CHUNK_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def _raw_record(row):
+    record = dict(zip(RAW_COLUMNS, row))
+    record['fecha_hora'] = record['fecha_hora'].isoformat()
+    return record
+
+
+def ndjson_response(queryset, filename='alertas.ndjson'):
+    def lines():
+        for batch in _raw_batches(queryset):
+            yield ''.join(json.dumps(_raw_record(row), ensure_ascii=False) + '\n' for row in batch)
+
+    response = StreamingHttpResponse(lines(), content_type=EXPORT_CONTENT_TYPES['ndjson'])
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def geojson_response(queryset, filename='alertas.geojson'):
+    """FeatureCollection emitida feature a feature (Point [lon, lat] o geometría nula)."""
+    def chunks():
+        yield '{"type": "FeatureCollection", "features": ['
+        separator = ''
+        for batch in _raw_batches(queryset):
+            parts = []
+            for row in batch:
+                properties = _raw_record(row)
+                lat, lon = properties['latitude'], properties['longitude']
+                geometry = (
+                    {'type': 'Point', 'coordinates': [lon, lat]}
+                    if lat is not None and lon is not None else None
+                )
+                feature = {'type': 'Feature', 'id': properties['id'], 'geometry': geometry,
+                           'properties': properties}
+                parts.append(separator + json.dumps(feature, ensure_ascii=False))
+                separator = ','
+            yield ''.join(parts)
+        yield ']}'
+
+    response = StreamingHttpResponse(chunks(), content_type=EXPORT_CONTENT_TYPES['geojson'])
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def _arrow_schema(pa):
+    return pa.schema([
+        ('id', pa.int64()),
+        ('tipo_desastre', pa.string()),
+        ('nivel_riesgo', pa.string()),
+        ('zona_id', pa.int64()),
+        ('zona', pa.string()),
+        ('fecha_hora', pa.timestamp('us', tz='UTC')),
+        ('descripcion', pa.string()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('radio_impacto', pa.float64()),
+        ('activa', pa.bool_()),
+    ])
+
+
+def _arrow_batches(pa, schema, queryset):
+    """RecordBatch por lote de filas: columnas armadas directamente desde las tuplas."""
+    for batch in _raw_batches(queryset):
+        columns = list(zip(*batch))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+
+def arrow_response(queryset, filename='alertas.arrow'):
+    """Arrow IPC en formato stream: cada lote sale en cuanto se lee de la BD."""
+    import pyarrow as pa
+
+    schema = _arrow_schema(pa)
+
+    def chunks():
+        buffer = io.BytesIO()
+        with pa.ipc.new_stream(buffer, schema) as writer:
+            for record_batch in _arrow_batches(pa, schema, queryset):
+                writer.write_batch(record_batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    response = StreamingHttpResponse(chunks(), content_type=EXPORT_CONTENT_TYPES['arrow'])
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def parquet_response(queryset, filename='alertas.parquet'):
+    """Parquet con un row group por lote: cada uno sale al escribirse y el pie al cerrar."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa)
+
+    def chunks():
+        buffer = _ChunkBuffer()
+        with pq.ParquetWriter(pa.PythonFile(buffer, mode='w'), schema, compression='zstd') as writer:
+            for record_batch in _arrow_batches(pa, schema, queryset):
+                writer.write_batch(record_batch)
+                yield buffer.take()
+        yield buffer.take()
+
+    response = StreamingHttpResponse(chunks(), content_type=EXPORT_CONTENT_TYPES['parquet'])
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+# Formato → función que arma la respuesta
+EXPORT_FORMATS = {
+    'xlsx': xlsx_response,
+    'csv': csv_response,
+    'ndjson': ndjson_response,
+    'geojson': geojson_response,
+    'arrow': arrow_response,
+    'parquet': parquet_response,
+}
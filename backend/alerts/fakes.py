@@ -0,0 +1,212 @@
+"""
+Proveedores de correo locales para pruebas de carga.
+`FakeMailerSendServer` imita los endpoints email, bulk-email y el estado de un bulk
+(GET bulk-email/{id}, siempre `completed`) de la API de MailerSend y
+`FakeSMTPServer` un servidor SMTP con AUTH (sin TLS). Ambos permiten configurar latencia,
+tasa de errores y límite de solicitudes por segundo, y guardan estadísticas de lo recibido.
+"""
+import json
+import random
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ProviderStats:
+    """Contadores y latencias de servicio de un proveedor falso (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.messages = 0
+        self.errors = 0
+        self.throttled = 0
+        self.latencies = []
+
+    def record(self, outcome, messages=0, latency=0.0):
+        with self._lock:
+            self.requests += 1
+            if outcome == 'ok':
+                self.messages += messages
+                self.latencies.append(latency)
+            elif outcome == 'error':
+                self.errors += 1
+            else:
+                self.throttled += 1
+
+
+class _Behaviour:
+    """Latencia (segundos, ± jitter), tasa de errores [0, 1] y límite de solicitudes/seg (0 = sin límite)."""
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._window = 0
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    def throttled(self):
+        """Ventana fija de un segundo: por encima de `rate_limit` solicitudes se rechaza."""
+        if not self.rate_limit:
+            return False
+        with self._lock:
+            window = int(time.monotonic())
+            if window != self._window:
+                self._window, self._window_count = window, 0
+            self._window_count += 1
+            return self._window_count > self.rate_limit
+
+    def wait(self):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def fails(self):
+        return self.error_rate and random.random() < self.error_rate
+
+
+class _MailerSendHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, code, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        path = self.path.rstrip('/').rsplit('/', 1)[-1]
+        if path not in ('email', 'bulk-email'):
+            return self._reply(404, {'message': 'Not found'})
+        if server.behaviour.throttled():
+            server.stats.record('throttled')
+            return self._reply(429, {'message': 'Too Many Attempts.'}, {'Retry-After': '1'})
+        latency = server.behaviour.wait()
+        if server.behaviour.fails():
+            server.stats.record('error')
+            return self._reply(500, {'message': 'Server Error'})
+        if path == 'bulk-email':
+            messages = len(json.loads(body or b'[]'))
+            server.stats.record('ok', messages, latency)
+            bulk_id = uuid.uuid4().hex
+            server.bulks[bulk_id] = messages
+            return self._reply(202, {'message': 'The bulk email is being processed.', 'bulk_email_id': bulk_id})
+        server.stats.record('ok', 1, latency)
+        return self._reply(202, None, {'X-Message-Id': uuid.uuid4().hex})
+
+
+    def do_GET(self):
+        # Estado de un bulk-email: no cuenta en las estadísticas de envío
+        parts = self.path.rstrip('/').split('/')
+        if len(parts) < 2 or parts[-2] != 'bulk-email' or parts[-1] not in self.server.bulks:
+            return self._reply(404, {'message': 'Not found'})
+        bulk_id = parts[-1]
+        count = self.server.bulks[bulk_id]
+        return self._reply(200, {'data': {
+            'id': bulk_id, 'state': 'completed', 'total_recipients_count': count,
+            'validation_errors_count': 0, 'validation_errors': None,
+            'suppressed_recipients_count': 0, 'suppressed_recipients': None,
+            'messages_id': [uuid.uuid4().hex for _ in range(count)],
+        }})
+
+
+class _ThreadedServerMixin:
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeMailerSendServer(_ThreadedServerMixin, ThreadingHTTPServer):
+    """API MailerSend local: `base_url` se pasa como MAILERSEND_BASE_URL."""
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, **behaviour):
+        super().__init__((host, port), _MailerSendHandler)
+        self.behaviour = _Behaviour(**behaviour)
+        self.stats = ProviderStats()
+        # bulk_email_id -> mensajes recibidos
+        self.bulks = {}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1/'
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Diálogo SMTP mínimo: EHLO/HELO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    def _send(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        self._send('220 fake-smtp ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self._send('250-fake-smtp')
+                self._send('250-AUTH PLAIN LOGIN')
+                self._send('250 8BITMIME')
+            elif verb == 'HELO':
+                self._send('250 fake-smtp')
+            elif verb == 'AUTH':
+                self._send('235 2.7.0 Authentication successful')
+            elif verb in ('MAIL', 'RSET', 'NOOP'):
+                self._send('250 OK')
+            elif verb == 'RCPT':
+                if server.behaviour.throttled():
+                    server.stats.record('throttled')
+                    self._send('451 4.7.1 Rate limit exceeded')
+                else:
+                    self._send('250 OK')
+            elif verb == 'DATA':
+                self._send('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                latency = server.behaviour.wait()
+                if server.behaviour.fails():
+                    server.stats.record('error')
+                    self._send('451 4.3.0 Temporary failure')
+                else:
+                    server.stats.record('ok', 1, latency)
+                    self._send('250 OK queued')
+            elif verb == 'QUIT':
+                self._send('221 Bye')
+                return
+            else:
+                self._send('502 Command not implemented')
+
+
+class FakeSMTPServer(_ThreadedServerMixin, socketserver.ThreadingTCPServer):
+    """SMTP local sin TLS (usar con SMTP_STARTTLS=false)."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, **behaviour):
+        super().__init__((host, port), _SMTPHandler)
+        self.behaviour = _Behaviour(**behaviour)
+        self.stats = ProviderStats()
@@ -1,13 +1,35 @@
 """
 Filtros para el listado de alertas (fecha, zona, tipo, nivel).
 """
+from datetime import datetime, time, timedelta
+
 import django_filters
+from django.utils import timezone
+
 from .models import Alert
 
 
+def day_start(value):
+    """Medianoche local (con zona horaria) del día `value`."""
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def filter_day_range(queryset, desde=None, hasta=None):
+    """
+    Alertas de los días [desde, hasta] en hora local, como rango semiabierto
+    [desde 00:00, hasta + 1 día 00:00): compara fecha_hora sin convertirla, así la
+    consulta puede recorrer el índice en vez de calcular la fecha de cada fila.
+    """
+    if desde:
+        queryset = queryset.filter(fecha_hora__gte=day_start(desde))
+    if hasta:
+        queryset = queryset.filter(fecha_hora__lt=day_start(hasta + timedelta(days=1)))
+    return queryset
+
+
 class AlertFilter(django_filters.FilterSet):
-    desde = django_filters.DateFilter(field_name='fecha_hora', lookup_expr='date__gte')
-    hasta = django_filters.DateFilter(field_name='fecha_hora', lookup_expr='date__lte')
+    desde = django_filters.DateFilter(method='filter_desde')
+    hasta = django_filters.DateFilter(method='filter_hasta')
     zona = django_filters.NumberFilter(field_name='zona_id')
     tipo_desastre = django_filters.CharFilter(field_name='tipo_desastre')
     nivel_riesgo = django_filters.CharFilter(field_name='nivel_riesgo')
@@ -16,3 +38,9 @@ class AlertFilter(django_filters.FilterSet):
     class Meta:
         model = Alert
         fields = ['desde', 'hasta', 'zona', 'tipo_desastre', 'nivel_riesgo', 'activas']
+
+    def filter_desde(self, queryset, name, value):
+        return filter_day_range(queryset, desde=value)
+
+    def filter_hasta(self, queryset, name, value):
+        return filter_day_range(queryset, hasta=value)
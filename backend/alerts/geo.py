@@ -0,0 +1,431 @@
+"""
+Utilidades geoespaciales sin GDAL/GEOS.
+Geohash para el índice de proximidad de alertas, distancia haversine vectorizada
+y geometrías de zona compiladas a NumPy (punto-en-polígono vectorizado).
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_MAX_PRECISION = 9
+
+# Celda usada cuando el círculo de impacto es más grande que cualquier celda geohash
+GLOBAL_CELL = '*'
+
+# Tolerancia (metros) sumada al radio de impacto al comprobar proximidad
+PROXIMITY_TOLERANCE_M = 50.0
+
+
+def geohash_encode(lat, lon, precision):
+    """Codifica (lat, lon) como geohash de `precision` caracteres."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch = ch << 1
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_BASE32[ch])
+            bit = 0
+            ch = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """Tamaño (alto_lat, ancho_lon) en grados de una celda geohash."""
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_neighbors(lat, lon, precision):
+    """Celda del punto y sus 8 vecinas a la precisión indicada."""
+    height, width = geohash_cell_size(precision)
+    cells = set()
+    for dlat in (-height, 0.0, height):
+        nlat = lat + dlat
+        if nlat < -90.0 or nlat >= 90.0:
+            continue
+        for dlon in (-width, 0.0, width):
+            nlon = (lon + dlon + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(nlat, nlon, precision))
+    return cells
+
+
+def alert_geo_cell(lat, lon, radius_m):
+    """
+    Celda de índice para una alerta.
+
+    Se elige el geohash más fino cuya celda cubre el radio de impacto (más la
+    tolerancia) en ambos ejes; así cualquier punto dentro del círculo cae en la
+    celda de la alerta o en una de sus 8 vecinas a esa misma precisión.
+    """
+    if lat is None or lon is None:
+        return ''
+    reach = (radius_m or 0.0) + PROXIMITY_TOLERANCE_M
+    extreme_lat = min(abs(lat) + reach / METERS_PER_DEGREE, 89.9)
+    cos_lat = max(math.cos(math.radians(extreme_lat)), 1e-6)
+    for precision in range(GEOHASH_MAX_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        if height * METERS_PER_DEGREE >= reach and width * METERS_PER_DEGREE * cos_lat >= reach:
+            return geohash_encode(lat, lon, precision)
+    return GLOBAL_CELL
+
+
+def proximity_cells(lat, lon):
+    """Todas las celdas que pueden contener alertas cuyo círculo cubra (lat, lon)."""
+    cells = {GLOBAL_CELL}
+    for precision in range(1, GEOHASH_MAX_PRECISION + 1):
+        cells |= geohash_neighbors(lat, lon, precision)
+    return cells
+
+
+def haversine_m(lat, lon, lats, lons):
+    """Distancia en metros desde (lat, lon) a cada punto de los arreglos lats/lons."""
+    lat1 = np.radians(lat)
+    lats2 = np.radians(np.asarray(lats, dtype=float))
+    dlat = lats2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=float) - lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lats2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def covering_mask(lat, lon, lats, lons, radii):
+    """
+    Máscara de los círculos (lats, lons, radii) que cubren el punto, y sus distancias.
+    Radios nulos se tratan como 0 (solo la tolerancia).
+    """
+    radii = np.nan_to_num(np.asarray(radii, dtype=float), nan=0.0)
+    distances = haversine_m(lat, lon, lats, lons)
+    return distances <= radii + PROXIMITY_TOLERANCE_M, distances
+
+
+# Máximo de celdas punto×arista evaluadas a la vez en contains_many (acota memoria)
+_RAYCAST_CHUNK_CELLS = 2_000_000
+
+
+class CompiledGeometry:
+    """
+    Polygon/MultiPolygon compilado a arreglos NumPy.
+
+    Todas las aristas (anillos exteriores y huecos de todos los polígonos) se guardan
+    juntas: con la regla par-impar del ray-casting los huecos y las partes de un
+    MultiPolygon se resuelven solos. X = longitud, Y = latitud.
+    """
+    __slots__ = ('x1', 'y1', 'x2', 'y2', 'bbox', 'centroid', 'area_km2')
+
+    def __init__(self, rings_by_polygon):
+        edges = []
+        signed_area = 0.0
+        cx = cy = 0.0
+        for rings in rings_by_polygon:
+            for index, ring in enumerate(rings):
+                a, ring_cx, ring_cy = _ring_area_centroid(ring)
+                # El exterior suma y los huecos restan, sin importar la orientación
+                sign = 1.0 if index == 0 else -1.0
+                signed_area += sign * abs(a)
+                cx += sign * abs(a) * ring_cx
+                cy += sign * abs(a) * ring_cy
+                edges.append(np.column_stack([ring[:-1], ring[1:]]))
+        e = np.concatenate(edges)
+        self.x1, self.y1, self.x2, self.y2 = e[:, 0], e[:, 1], e[:, 2], e[:, 3]
+        xs = np.concatenate([self.x1, self.x2])
+        ys = np.concatenate([self.y1, self.y2])
+        # bbox como (min_lon, min_lat, max_lon, max_lat)
+        self.bbox = (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+        if signed_area > 0:
+            self.centroid = (float(cy / signed_area), float(cx / signed_area))
+        else:
+            self.centroid = ((self.bbox[1] + self.bbox[3]) / 2, (self.bbox[0] + self.bbox[2]) / 2)
+        km_per_degree = METERS_PER_DEGREE / 1000.0
+        self.area_km2 = float(signed_area * km_per_degree ** 2 * math.cos(math.radians(self.centroid[0])))
+
+    def bbox_contains(self, lat, lon):
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        return min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+
+    def contains(self, lat, lon):
+        """True si (lat, lon) está dentro (bbox primero, luego ray-casting sobre todas las aristas)."""
+        if not self.bbox_contains(lat, lon):
+            return False
+        return bool(self._crossings(np.array([lat]), np.array([lon]))[0] % 2)
+
+    def contains_many(self, lats, lons):
+        """Versión en bloque de `contains` para arreglos de puntos; devuelve máscara booleana."""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        result = np.zeros(lats.shape, dtype=bool)
+        candidates = np.nonzero((lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat))[0]
+        step = max(1, _RAYCAST_CHUNK_CELLS // len(self.x1))
+        for start in range(0, len(candidates), step):
+            idx = candidates[start:start + step]
+            result[idx] = self._crossings(lats[idx], lons[idx]) % 2 == 1
+        return result
+
+    def _crossings(self, lats, lons):
+        y = lats[:, None]
+        x = lons[:, None]
+        straddles = (self.y1 > y) != (self.y2 > y)
+        dy = np.where(self.y2 == self.y1, 1.0, self.y2 - self.y1)
+        x_cross = (self.x2 - self.x1) * (y - self.y1) / dy + self.x1
+        return np.count_nonzero(straddles & (x < x_cross), axis=1)
+
+
+def _ring_area_centroid(ring):
+    """Área con signo (shoelace) y centroide de un anillo cerrado en grados."""
+    x0, y0 = ring[:-1, 0], ring[:-1, 1]
+    x1, y1 = ring[1:, 0], ring[1:, 1]
+    cross = x0 * y1 - x1 * y0
+    area = cross.sum() / 2.0
+    if area == 0:
+        return 0.0, float(ring[:, 0].mean()), float(ring[:, 1].mean())
+    cx = ((x0 + x1) * cross).sum() / (6.0 * area)
+    cy = ((y0 + y1) * cross).sum() / (6.0 * area)
+    return float(area), float(cx), float(cy)
+
+
+def _as_ring(coords):
+    ring = np.asarray(coords, dtype=float)
+    if ring.ndim != 2 or ring.shape[0] < 3 or ring.shape[1] < 2:
+        raise ValueError('Anillo inválido')
+    ring = ring[:, :2]
+    if not np.array_equal(ring[0], ring[-1]):
+        ring = np.vstack([ring, ring[:1]])
+    return ring
+
+
+def compile_geometry(geojson):
+    """
+    Compila un GeoJSON Polygon/MultiPolygon (o Feature que lo contenga).
+    Devuelve None si la geometría falta, no es poligonal o es inválida.
+    """
+    if isinstance(geojson, dict) and geojson.get('type') == 'Feature':
+        geojson = geojson.get('geometry')
+    if not isinstance(geojson, dict):
+        return None
+    try:
+        if geojson.get('type') == 'Polygon':
+            polygons = [geojson['coordinates']]
+        elif geojson.get('type') == 'MultiPolygon':
+            polygons = geojson['coordinates']
+        else:
+            return None
+        rings_by_polygon = [[_as_ring(r) for r in polygon] for polygon in polygons if polygon]
+        if not rings_by_polygon:
+            return None
+        return CompiledGeometry(rings_by_polygon)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def group_by_cell(lats, lons, cell_deg):
+    """
+    Agrupa puntos por celda de rejilla de `cell_deg` grados.
+    Genera ((ix, iy), índices) por celda ocupada; ignora puntos con NaN.
+    """
+    valid = np.nonzero(~(np.isnan(lats) | np.isnan(lons)))[0]
+    if not len(valid):
+        return
+    keys = np.stack([
+        np.floor(lons[valid] / cell_deg).astype(np.int64),
+        np.floor(lats[valid] / cell_deg).astype(np.int64),
+    ], axis=1)
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(unique_keys) + 1))
+    for k, (ix, iy) in enumerate(unique_keys):
+        yield (int(ix), int(iy)), valid[order[bounds[k]:bounds[k + 1]]]
+
+
+# Círculos que tocarían más celdas que esto se prueban contra todos los puntos
+_MAX_CELLS_PER_CIRCLE = 4096
+
+
+class CircleIndex:
+    """
+    Índice de rejilla en memoria para círculos de impacto (lat, lon, radio en metros).
+
+    Cada círculo se registra en las celdas que toca su bbox (radio + tolerancia);
+    los círculos muy grandes o que cruzan el antimeridiano van a una lista común.
+    """
+
+    def __init__(self, lats, lons, radii):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.radii = np.nan_to_num(np.asarray(radii, dtype=float), nan=0.0)
+        reach = self.radii + PROXIMITY_TOLERANCE_M
+        dlat = reach / METERS_PER_DEGREE
+        cos_lat = np.maximum(np.cos(np.radians(np.minimum(np.abs(self.lats) + dlat, 89.9))), 1e-6)
+        dlon = dlat / cos_lat
+        self.cell_deg = max(float(np.median(2 * dlat)), 0.01) if len(reach) else 1.0
+        self.cells = {}
+        self.wide = []
+        for i in range(len(self.lats)):
+            min_lon, max_lon = self.lons[i] - dlon[i], self.lons[i] + dlon[i]
+            ix0, ix1 = int(math.floor(min_lon / self.cell_deg)), int(math.floor(max_lon / self.cell_deg))
+            iy0 = int(math.floor((self.lats[i] - dlat[i]) / self.cell_deg))
+            iy1 = int(math.floor((self.lats[i] + dlat[i]) / self.cell_deg))
+            if (min_lon < -180 or max_lon > 180
+                    or (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > _MAX_CELLS_PER_CIRCLE):
+                self.wide.append(i)
+                continue
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    self.cells.setdefault((ix, iy), []).append(i)
+
+    def covering(self, lats, lons):
+        """Para cada punto, lista de posiciones de los círculos que lo cubren."""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = [[] for _ in range(len(lats))]
+        if not len(self.lats):
+            return result
+        # Pares (punto, círculo candidato) de todas las celdas y una sola haversine en bloque
+        point_parts = []
+        circle_parts = []
+        wide = np.array(self.wide, dtype=np.int64)
+        for cell, idx in group_by_cell(lats, lons, self.cell_deg):
+            candidates = self.cells.get(cell)
+            candidates = np.concatenate([candidates, wide]) if candidates else wide
+            if not len(candidates):
+                continue
+            point_parts.append(np.repeat(idx, len(candidates)))
+            circle_parts.append(np.tile(candidates, len(idx)))
+        if not point_parts:
+            return result
+        points = np.concatenate(point_parts)
+        circles = np.concatenate(circle_parts).astype(np.int64)
+        distances = haversine_m(lats[points], lons[points], self.lats[circles], self.lons[circles])
+        hits = distances <= self.radii[circles] + PROXIMITY_TOLERANCE_M
+        for point, circle in zip(points[hits].tolist(), circles[hits].tolist()):
+            result[point].append(circle)
+        return result
+
+
+# Niveles de detalle precalculados para zonas (tolerancia Douglas–Peucker en grados)
+ZONE_LOD_TOLERANCES = (0.0001, 0.0005, 0.002, 0.01, 0.05)
+
+
+def _douglas_peucker(points, tolerance):
+    """Máscara de puntos conservados por Douglas–Peucker (iterativo, distancias vectorizadas)."""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        segment = points[start + 1:end]
+        ab = b - a
+        length_sq = float(ab @ ab)
+        if length_sq == 0:
+            distances = np.hypot(*(segment - a).T)
+        else:
+            t = np.clip(((segment - a) @ ab) / length_sq, 0.0, 1.0)
+            distances = np.hypot(*(segment - (a + t[:, None] * ab)).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def _simplify_ring(ring, tolerance, decimals):
+    """Anillo simplificado y cuantizado, o None si colapsa (menos de 4 puntos)."""
+    ring = _as_ring(ring)
+    # Partir el anillo en el punto más lejano al inicio para que DP no lo colapse a una línea
+    far = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+    keep = np.concatenate([
+        _douglas_peucker(ring[:far + 1], tolerance)[:-1],
+        _douglas_peucker(ring[far:], tolerance),
+    ])
+    simplified = np.round(ring[keep], decimals)
+    # La cuantización puede repetir puntos consecutivos
+    distinct = np.concatenate([[True], np.any(simplified[1:] != simplified[:-1], axis=1)])
+    simplified = simplified[distinct]
+    if len(simplified) < 4:
+        return None
+    return simplified.tolist()
+
+
+def simplify_geometry(geojson, tolerance):
+    """
+    Polygon/MultiPolygon simplificado (Douglas–Peucker) con coordenadas cuantizadas
+    a la precisión útil para la tolerancia. Partes que colapsan se descartan;
+    devuelve None si no queda ninguna o la geometría no es poligonal.
+    """
+    if isinstance(geojson, dict) and geojson.get('type') == 'Feature':
+        geojson = geojson.get('geometry')
+    if not isinstance(geojson, dict) or geojson.get('type') not in ('Polygon', 'MultiPolygon'):
+        return None
+    decimals = max(0, int(math.ceil(-math.log10(tolerance))) + 1)
+    polygons = [geojson['coordinates']] if geojson['type'] == 'Polygon' else geojson['coordinates']
+    try:
+        result = []
+        for polygon in polygons:
+            if not polygon:
+                continue
+            outer = _simplify_ring(polygon[0], tolerance, decimals)
+            if outer is None:
+                continue
+            holes = [h for h in (_simplify_ring(r, tolerance, decimals) for r in polygon[1:]) if h is not None]
+            result.append([outer] + holes)
+    except (TypeError, ValueError):
+        return None
+    if not result:
+        return None
+    if geojson['type'] == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': result[0]}
+    return {'type': 'MultiPolygon', 'coordinates': result}
+
+
+def build_geometry_lods(geojson):
+    """
+    {tolerancia: geometría} para cada nivel de ZONE_LOD_TOLERANCES.
+    Si un nivel grueso colapsa por completo se reutiliza el nivel anterior.
+    """
+    lods = {}
+    previous = None
+    for tolerance in ZONE_LOD_TOLERANCES:
+        simplified = simplify_geometry(geojson, tolerance) or previous
+        if simplified is None:
+            break
+        lods[str(tolerance)] = simplified
+        previous = simplified
+    return lods
+
+
+def tolerance_for_zoom(zoom):
+    """Tamaño de un píxel (grados) en el nivel de zoom web-mercator dado (teselas de 256 px)."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def pick_lod(lods, tolerance):
+    """Geometría del nivel más simplificado cuya tolerancia no supera la pedida (None = usar original)."""
+    best = None
+    for key, geometry in (lods or {}).items():
+        level = float(key)
+        if level <= tolerance and (best is None or level > best[0]):
+            best = (level, geometry)
+    return best[1] if best else None
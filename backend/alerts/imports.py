@@ -0,0 +1,395 @@
+"""
+Importación masiva de alertas desde Excel o CSV.
+Las columnas se validan y normalizan en bloque con pandas (sin recorrer filas), las
+filas válidas se insertan con `bulk_create` por lotes en una sola transacción y las
+notificaciones se encolan como un único NotificationJob que expande el worker.
+
+Los archivos grandes se importan como ImportJob: el archivo se guarda en disco y
+`import_worker` lo lee por lotes (openpyxl read-only / CSV por tramos), confirmando
+cada lote junto con el checkpoint para poder retomar tras una caída.
+"""
+import os
+import time
+import uuid
+from datetime import timedelta
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import rollup, versions
+from .geo import alert_geo_cell
+from .models import DISASTER_TYPES, RISK_LEVELS, Alert, ImportJob, NotificationJob
+from .tiles import alert_bbox, invalidate_bboxes_on_commit
+from .zones import resolve_zone_ids
+
+IMPORT_BATCH_SIZE = 2000
+# Una importación EN_CURSO sin avance en este tiempo se considera abandonada (worker caído)
+IMPORT_LOCK_TIMEOUT = timedelta(minutes=5)
+# Errores por fila que se guardan en el ImportJob (el resto solo se cuenta)
+MAX_STORED_ERRORS = 1000
+REQUIRED_COLUMNS = ['Tipo', 'Nivel', 'Descripcion', 'Latitud', 'Longitud']
+# Radio de impacto cuando la columna Radio falta o viene vacía (1 km)
+DEFAULT_RADIO = 1000.0
+# Valores por defecto para tipos/niveles no reconocidos
+DEFAULT_TIPO = 'OTROS'
+DEFAULT_NIVEL = 'BAJO'
+
+
+def _choice_lookup(choices):
+    """Acepta la clave o la etiqueta (sin distinguir mayúsculas): 'Sismos' -> 'SISMO'."""
+    lookup = {}
+    for key, label in choices:
+        lookup[key.upper()] = key
+        lookup[label.upper()] = key
+    return lookup
+
+
+_TIPO_LOOKUP = _choice_lookup(DISASTER_TYPES)
+_NIVEL_LOOKUP = _choice_lookup(RISK_LEVELS)
+
+
+def missing_columns(df):
+    return [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+
+def _normalize_choice(series, lookup, default):
+    return series.astype(str).str.strip().str.upper().map(lookup).fillna(default)
+
+
+def normalize_alert_frame(df, first_row=2):
+    """
+    Valida y normaliza el DataFrame columna por columna.
+    Devuelve (filas válidas normalizadas, errores por fila); `first_row` es el número
+    de fila de Excel del primer registro (la 1 es el encabezado).
+    """
+    import pandas as pd
+
+    latitud = pd.to_numeric(df['Latitud'], errors='coerce')
+    longitud = pd.to_numeric(df['Longitud'], errors='coerce')
+    if 'Radio' in df.columns:
+        radio = pd.to_numeric(df['Radio'], errors='coerce')
+        radio_invalido = df['Radio'].notna() & (radio.isna() | (radio < 0))
+        radio = radio.fillna(DEFAULT_RADIO)
+    else:
+        radio = pd.Series(DEFAULT_RADIO, index=df.index)
+        radio_invalido = pd.Series(False, index=df.index)
+
+    checks = [
+        (latitud.isna() | (latitud.abs() > 90), 'Latitud inválida'),
+        (longitud.isna() | (longitud.abs() > 180), 'Longitud inválida'),
+        (radio_invalido, 'Radio inválido'),
+    ]
+    invalid = np.zeros(len(df), dtype=bool)
+    errors_by_row = {}
+    for mask, message in checks:
+        mask = mask.to_numpy()
+        invalid |= mask
+        for position in np.nonzero(mask)[0]:
+            errors_by_row.setdefault(position, []).append(message)
+    errors = [
+        f"Fila {position + first_row}: {', '.join(messages)}"
+        for position, messages in sorted(errors_by_row.items())
+    ]
+
+    valid = ~invalid
+    rows = pd.DataFrame({
+        'tipo_desastre': _normalize_choice(df['Tipo'], _TIPO_LOOKUP, DEFAULT_TIPO)[valid],
+        'nivel_riesgo': _normalize_choice(df['Nivel'], _NIVEL_LOOKUP, DEFAULT_NIVEL)[valid],
+        'descripcion': df['Descripcion'].fillna('').astype(str).str.strip()[valid],
+        'latitude': latitud[valid].astype(float),
+        'longitude': longitud[valid].astype(float),
+        'radio_impacto': radio[valid].astype(float),
+    })
+    return rows, errors
+
+
+def create_alerts(rows):
+    """
+    Inserta las filas normalizadas con bulk_create (sin señales por fila) y devuelve
+    los ids creados. Llamar dentro de una transacción.
+    """
+    lats = rows['latitude'].to_numpy()
+    lons = rows['longitude'].to_numpy()
+    radios = rows['radio_impacto'].to_numpy()
+    zone_ids = resolve_zone_ids(lats, lons)
+    now = timezone.now()
+    alerts = [
+        Alert(
+            tipo_desastre=tipo,
+            nivel_riesgo=nivel,
+            descripcion=descripcion,
+            latitude=lat,
+            longitude=lon,
+            radio_impacto=radio,
+            # bulk_create no llama a save(): la celda del índice se calcula aquí
+            geo_cell=alert_geo_cell(lat, lon, radio),
+            zona_id=zona_id,
+            fecha_hora=now,
+            activa=True,  # Por defecto activas al importar
+        )
+        for tipo, nivel, descripcion, lat, lon, radio, zona_id in zip(
+            rows['tipo_desastre'].tolist(), rows['nivel_riesgo'].tolist(), rows['descripcion'].tolist(),
+            lats.tolist(), lons.tolist(), radios.tolist(), zone_ids,
+        )
+    ]
+    created = Alert.objects.bulk_create(alerts, batch_size=IMPORT_BATCH_SIZE)
+    # bulk_create no dispara señales: el resumen diario, la versión de los datos y las teselas se ajustan aquí
+    rollup.add_alerts(created)
+    versions.bump_version()
+    invalidate_bboxes_on_commit(alert_bbox(a.latitude, a.longitude, a.radio_impacto) for a in created)
+    return [alert.pk for alert in created]
+
+
+def import_alerts(df, user=None):
+    """
+    Importa un DataFrame ya leído. Las filas inválidas se informan y se omiten; las
+    válidas se crean todas o ninguna. Las notificaciones quedan en un solo trabajo
+    (las alertas importadas) que el worker expande a la outbox.
+    Devuelve (ids creados, errores, trabajo de notificación o None).
+    """
+    rows, errors = normalize_alert_frame(df)
+    if rows.empty:
+        return [], errors, None
+    with transaction.atomic():
+        alert_ids = create_alerts(rows)
+        job = NotificationJob.objects.create(created_by=user, alert_ids=alert_ids)
+    return alert_ids, errors, job
+
+
+def upload_format(filename):
+    """'xlsx' o 'csv' según la extensión, o None si no se admite."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    return {'.xlsx': 'xlsx', '.csv': 'csv'}.get(extension)
+
+
+def read_upload(file, fmt):
+    """DataFrame completo de un archivo subido (importación síncrona)."""
+    import pandas as pd
+
+    if fmt == 'csv':
+        return pd.read_csv(file, encoding='utf-8-sig')
+    return pd.read_excel(file)
+
+
+def store_upload(file):
+    """Copia el archivo subido a IMPORT_UPLOAD_DIR por bloques y devuelve la ruta."""
+    directory = getattr(settings, 'IMPORT_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'uploads', 'imports'))
+    os.makedirs(directory, exist_ok=True)
+    extension = os.path.splitext(file.name)[1].lower()
+    path = os.path.join(directory, f'{uuid.uuid4().hex}{extension}')
+    try:
+        with open(path, 'wb') as output:
+            for block in file.chunks():
+                output.write(block)
+    except BaseException:
+        _remove_upload(path)
+        raise
+    return path
+
+
+def _remove_upload(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _xlsx_rows(path):
+    """(libro, encabezado, iterador de filas) en modo read-only: la hoja no se carga en memoria."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    header = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+    return workbook, header, rows
+
+
+def read_header(path, fmt):
+    """Nombres de columna del archivo (solo lee la primera fila)."""
+    import pandas as pd
+
+    if fmt == 'csv':
+        return [str(col).strip() for col in pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns]
+    workbook, header, _ = _xlsx_rows(path)
+    workbook.close()
+    return header
+
+
+def count_rows(path, fmt):
+    """Filas de datos estimadas (sin el encabezado); None si no se puede saber barato."""
+    if fmt == 'csv':
+        lines = 0
+        last = b'\n'
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                lines += block.count(b'\n')
+                last = block[-1:]
+        if last != b'\n':
+            lines += 1
+        return max(0, lines - 1)
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        max_row = workbook.active.max_row
+    finally:
+        workbook.close()
+    return max(0, max_row - 1) if max_row else None
+
+
+def read_chunks(path, fmt, skip_rows=0, chunk_size=None):
+    """DataFrames de hasta `chunk_size` filas a partir de la fila de datos `skip_rows`."""
+    import pandas as pd
+
+    chunk_size = chunk_size or getattr(settings, 'IMPORT_CHUNK_SIZE', 5000)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, chunksize=chunk_size, skiprows=range(1, skip_rows + 1),
+                               encoding='utf-8-sig')
+        return
+    workbook, header, rows = _xlsx_rows(path)
+    try:
+        next(islice(rows, skip_rows, skip_rows), None)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            width = len(header)
+            yield pd.DataFrame([(row + (None,) * width)[:width] for row in chunk], columns=header)
+    finally:
+        workbook.close()
+
+
+class InvalidImportFile(Exception):
+    """El archivo subido no tiene las columnas requeridas."""
+
+
+def create_import_job(file, fmt, user=None):
+    """
+    Guarda el archivo, valida el encabezado y cuenta las filas; solo entonces crea el
+    ImportJob PENDIENTE que procesará `import_worker`, así ningún worker toma un archivo
+    inválido. Si algo falla el archivo se borra y la excepción se propaga
+    (InvalidImportFile si faltan columnas).
+    """
+    path = store_upload(file)
+    try:
+        header = read_header(path, fmt)
+        if any(col not in header for col in REQUIRED_COLUMNS):
+            raise InvalidImportFile(f'Formato inválido. Columnas requeridas: {", ".join(REQUIRED_COLUMNS)}')
+        return ImportJob.objects.create(
+            created_by=user, filename=file.name, path=path, format=fmt, total_rows=count_rows(path, fmt),
+        )
+    except BaseException:
+        _remove_upload(path)
+        raise
+
+
+class ImportCheckpointLost(Exception):
+    """Otro worker retomó la importación: este debe dejar de escribir."""
+
+
+def claim_import_job():
+    """
+    Reclama la próxima importación PENDIENTE, o una EN_CURSO sin avance desde hace
+    IMPORT_LOCK_TIMEOUT (su worker cayó). SKIP LOCKED: varios workers no se pisan.
+    """
+    with transaction.atomic():
+        job = (
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='PENDIENTE') | Q(status='EN_CURSO', updated_at__lt=timezone.now() - IMPORT_LOCK_TIMEOUT))
+            .order_by('id').first()
+        )
+        if job is None:
+            return None
+        job.status = 'EN_CURSO'
+        job.started_at = job.started_at or timezone.now()
+        job.save(update_fields=['status', 'started_at', 'updated_at'])
+    return job
+
+
+def _commit_chunk(job, df):
+    """
+    Inserta un lote y avanza el checkpoint en la misma transacción: tras una caída el
+    lote está entero o no está. Si el checkpoint en la BD no coincide, otro worker
+    retomó el trabajo y este lote se descarta.
+    """
+    with transaction.atomic():
+        current = ImportJob.objects.select_for_update().values_list('status', 'rows_processed').get(pk=job.pk)
+        if current != ('EN_CURSO', job.rows_processed):
+            raise ImportCheckpointLost(job.pk)
+        rows, errors = normalize_alert_frame(df, first_row=job.rows_processed + 2)
+        if not rows.empty:
+            alert_ids = create_alerts(rows)
+            NotificationJob.objects.create(created_by_id=job.created_by_id, alert_ids=alert_ids, import_job=job)
+            job.alerts_created += len(alert_ids)
+        job.rows_processed += len(df)
+        job.rows_invalid += len(errors)
+        job.row_errors = (job.row_errors + errors)[:MAX_STORED_ERRORS]
+        job.save(update_fields=['rows_processed', 'alerts_created', 'rows_invalid', 'row_errors', 'updated_at'])
+
+
+def run_import_job(job, chunk_size=None, stdout=None):
+    """
+    Procesa la importación desde su último checkpoint hasta el final del archivo.
+    Al terminar borra el archivo guardado; si falla queda FALLIDO con el error y
+    conserva archivo y checkpoint (volver a ponerlo PENDIENTE lo retoma).
+    """
+    try:
+        for df in read_chunks(job.path, job.format, job.rows_processed, chunk_size):
+            _commit_chunk(job, df)
+            if stdout is not None:
+                stdout.write(f'Importación {job.pk}: {job.rows_processed} filas, {job.alerts_created} alertas')
+    except ImportCheckpointLost:
+        return job
+    except Exception as e:
+        job.status = 'FALLIDO'
+        job.error = str(e)
+    else:
+        job.status = 'COMPLETADO'
+        if os.path.exists(job.path):
+            os.remove(job.path)
+    job.finished_at = timezone.now()
+    ImportJob.objects.filter(pk=job.pk, status='EN_CURSO').update(
+        status=job.status, error=job.error, finished_at=job.finished_at, updated_at=job.finished_at
+    )
+    return job
+
+
+def run_import_worker(poll_interval=5.0, once=False, chunk_size=None, stdout=None):
+    """Bucle del worker de importaciones: reclama y procesa trabajos uno a la vez."""
+    while True:
+        job = claim_import_job()
+        if job is not None:
+            if stdout is not None:
+                stdout.write(f'Importación {job.pk} ({job.filename}) desde la fila {job.rows_processed}')
+            run_import_job(job, chunk_size, stdout)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+def import_progress(job):
+    """Estado de la importación para el endpoint de seguimiento."""
+    percent = None
+    if job.total_rows:
+        percent = round(min(100.0, 100.0 * job.rows_processed / job.total_rows), 1)
+    if job.status == 'COMPLETADO':
+        percent = 100.0
+    return {
+        'job_id': job.pk,
+        'status': job.status,
+        'filename': job.filename,
+        'total_rows': job.total_rows,
+        'rows_processed': job.rows_processed,
+        'percent': percent,
+        'created': job.alerts_created,
+        'invalid': job.rows_invalid,
+        'errors': job.row_errors,
+        'error': job.error,
+        'notification_jobs': list(job.notification_jobs.order_by('id').values_list('id', flat=True)),
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
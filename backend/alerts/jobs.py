@@ -0,0 +1,145 @@
+"""
+Trabajos de notificación asíncronos.
+`notifications/simulate/` solo crea un NotificationJob; el worker lo expande a mensajes
+de la outbox y el progreso/resultados se consultan paginados o desde un cursor.
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Alert, NotificationJob
+from .outbox import enqueue_alert
+from .recipients import alert_recipients
+
+FINAL_STATUSES = ('ENVIADO', 'FALLIDO')
+# Correo de ejemplo cuando una alerta no tiene suscriptores ni email en la solicitud
+FALLBACK_RECIPIENT = 'tu_correo@ejemplo.com'
+# Alertas leídas por consulta al expandir un trabajo
+ALERT_CHUNK_SIZE = 500
+
+
+def _job_alerts(job):
+    """Alertas activas del trabajo; `alert_ids` se consulta por tramos para no armar un IN enorme."""
+    alerts = Alert.objects.filter(activa=True).select_related('zona').order_by('id')
+    if job.alert_ids is None:
+        yield from alerts.iterator(chunk_size=ALERT_CHUNK_SIZE)
+        return
+    ids = sorted(job.alert_ids)
+    for start in range(0, len(ids), ALERT_CHUNK_SIZE):
+        yield from alerts.filter(pk__in=ids[start:start + ALERT_CHUNK_SIZE])
+
+
+def expand_job(job):
+    """
+    Encola un mensaje por (alerta activa, destinatario) con referencia al trabajo.
+    Los destinatarios que ya tienen la alerta enviada o en cola se omiten.
+    Devuelve (encolados, omitidos).
+    """
+    total = skipped = 0
+    for alert in _job_alerts(job):
+        # Destinatarios según zona/punto de cada suscriptor (deduplicados)
+        recipients = alert_recipients(alert)
+        if job.email and job.email not in recipients:
+            recipients.append(job.email)
+        if not recipients:
+            # El correo de ejemplo solo aplica a la simulación (todas las alertas)
+            if job.alert_ids is not None:
+                continue
+            recipients = [FALLBACK_RECIPIENT]
+        enqueued, omitted = enqueue_alert(alert, recipients, job=job)
+        total += enqueued
+        skipped += omitted
+    return total, skipped
+
+
+def expand_pending_jobs(stdout=None):
+    """
+    Reclama y expande los trabajos PENDIENTE (uno por transacción, SKIP LOCKED).
+    Si la expansión falla, el trabajo queda FALLIDO y sin mensajes a medias.
+    """
+    expanded = 0
+    while True:
+        with transaction.atomic():
+            job = (
+                NotificationJob.objects.select_for_update(skip_locked=True)
+                .filter(status='PENDIENTE').order_by('id').first()
+            )
+            if job is None:
+                return expanded
+            try:
+                with transaction.atomic():
+                    job.total, job.skipped = expand_job(job)
+                job.status = 'EN_CURSO' if job.total else 'COMPLETADO'
+                job.started_at = timezone.now()
+                job.finished_at = None if job.total else job.started_at
+            except Exception as e:
+                job.status = 'FALLIDO'
+                job.error = str(e)
+                job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'total', 'skipped', 'error', 'started_at', 'finished_at'])
+        expanded += 1
+        if stdout is not None:
+            stdout.write(f'Trabajo {job.pk}: {job.total} mensajes encolados, {job.skipped} omitidos')
+
+
+def job_progress(job):
+    """
+    Conteos por estado de los mensajes del trabajo. Marca el trabajo COMPLETADO
+    cuando ya no le quedan mensajes pendientes.
+    """
+    counts = job.mensajes.aggregate(
+        enviados=Count('id', filter=Q(status='ENVIADO')),
+        fallidos=Count('id', filter=Q(status='FALLIDO')),
+        pendientes=Count('id', filter=~Q(status__in=FINAL_STATUSES)),
+    )
+    if job.status == 'EN_CURSO' and counts['pendientes'] == 0:
+        job.status = 'COMPLETADO'
+        job.finished_at = timezone.now()
+        NotificationJob.objects.filter(pk=job.pk, status='EN_CURSO').update(
+            status=job.status, finished_at=job.finished_at
+        )
+    return {
+        'job_id': job.pk,
+        'status': job.status,
+        'total': job.total,
+        'omitidos': job.skipped,
+        **counts,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+
+
+def job_result(message):
+    """Resultado por destinatario (mismas claves que devolvía la simulación síncrona)."""
+    if message.status == 'ENVIADO':
+        estado = 'Exitoso'
+    elif message.status == 'FALLIDO':
+        estado = 'Fallido'
+    else:
+        estado = 'Pendiente'
+    return {
+        'alert_id': message.alert_id,
+        'zona': message.zona_nombre,
+        'email': message.email,
+        'estado_envio': estado,
+        'intentos': message.attempts,
+        'error': message.last_error,
+        'sent_at': message.sent_at,
+    }
+
+
+def finished_messages_since(job, after_updated_at=None, after_id=0, until=None):
+    """
+    Mensajes ya finalizados del trabajo posteriores al cursor (updated_at, id), en orden.
+    `until` deja fuera lo más reciente para no saltarse filas de transacciones aún abiertas.
+    """
+    qs = job.mensajes.filter(status__in=FINAL_STATUSES)
+    if after_updated_at is not None:
+        qs = qs.filter(
+            Q(updated_at__gt=after_updated_at) | Q(updated_at=after_updated_at, id__gt=after_id)
+        )
+    if until is not None:
+        qs = qs.filter(updated_at__lte=until)
+    return qs.order_by('updated_at', 'id')
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from alerts.geo import CircleIndex, compile_geometry
+from alerts.zones import CompiledZone, ZoneIndex
+from alerts.classify import classify_points
+import numpy as np
+import math
+import time
+
+
+class Command(BaseCommand):
+    help = 'Mide el rendimiento de la clasificación en bloque de puntos (zona + alertas que los cubren)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=100000, help='Total de puntos a clasificar')
+        parser.add_argument('--batch', type=int, default=10000, help='Puntos por lote (como una solicitud)')
+        parser.add_argument('--zones', type=int, default=400, help='Zonas sintéticas')
+        parser.add_argument('--vertices', type=int, default=200, help='Vértices por zona sintética')
+        parser.add_argument('--alerts', type=int, default=5000, help='Alertas activas sintéticas')
+        parser.add_argument('--live', action='store_true', help='Usar las zonas y alertas reales de la base de datos')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        # Área aproximada de Venezuela
+        min_lat, max_lat, min_lon, max_lon = 1.0, 12.0, -73.0, -60.0
+        lats = rng.uniform(min_lat, max_lat, options['points'])
+        lons = rng.uniform(min_lon, max_lon, options['points'])
+
+        if options['live']:
+            classify = lambda la, lo: classify_points(la, lo)
+            self.stdout.write('Usando zonas y alertas de la base de datos')
+        else:
+            zone_index = ZoneIndex(self._synthetic_zones(options['zones'], options['vertices'],
+                                                         min_lat, max_lat, min_lon, max_lon))
+            circle_index = CircleIndex(
+                rng.uniform(min_lat, max_lat, options['alerts']),
+                rng.uniform(min_lon, max_lon, options['alerts']),
+                rng.uniform(100, 20000, options['alerts']),
+            )
+            classify = lambda la, lo: (zone_index.resolve_many(la, lo), circle_index.covering(la, lo))
+            self.stdout.write(
+                f"Sintético: {options['zones']} zonas x {options['vertices']} vértices, "
+                f"{options['alerts']} alertas activas"
+            )
+
+        batch = options['batch']
+        timings = []
+        for start in range(0, len(lats), batch):
+            t0 = time.perf_counter()
+            classify(lats[start:start + batch], lons[start:start + batch])
+            timings.append((time.perf_counter() - t0, len(lats[start:start + batch])))
+
+        total_time = sum(t for t, _ in timings)
+        per_batch = [t * 10000 / n for t, n in timings]
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(lats)} puntos en {total_time:.3f}s -> {len(lats) / total_time:,.0f} puntos/s; "
+            f"por 10k puntos: media {np.mean(per_batch) * 1000:.1f} ms, "
+            f"p95 {np.percentile(per_batch, 95) * 1000:.1f} ms"
+        ))
+
+    def _synthetic_zones(self, count, vertices, min_lat, max_lat, min_lon, max_lon):
+        """Polígonos casi circulares en una rejilla que cubre el área."""
+        side = max(1, int(math.ceil(math.sqrt(count))))
+        dlat = (max_lat - min_lat) / side
+        dlon = (max_lon - min_lon) / side
+        angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+        zones = []
+        for i in range(count):
+            cy = min_lat + (i // side + 0.5) * dlat
+            cx = min_lon + (i % side + 0.5) * dlon
+            ring = np.column_stack([cx + np.cos(angles) * dlon * 0.55, cy + np.sin(angles) * dlat * 0.55])
+            geometry = compile_geometry({'type': 'Polygon', 'coordinates': [ring.tolist()]})
+            zones.append(CompiledZone(i + 1, f'Zona {i + 1}', None, geometry))
+        return zones
@@ -0,0 +1,206 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Min
+from django.test.utils import override_settings
+from django.utils import timezone
+from alerts.models import Alert, NotificationOutbox, Subscriber, Zone
+from alerts.delivery import DeliveryEngine, set_engine
+from alerts.fakes import FakeMailerSendServer, FakeSMTPServer
+from alerts.outbox import process_batch, reconcile_accepted
+from alerts.ratelimit import set_rate_share
+import numpy as np
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DOMAIN = 'benchmark.example.com'
+BENCH_ZONE = 'Benchmark de envío'
+# Punto de las alertas del benchmark: en el Pacífico, lejos de los suscriptores reales
+BENCH_POINT = (0.0, -140.0)
+BENCH_ALERT_RADIO = 10000.0
+
+
+class Command(BaseCommand):
+    help = ('Mide el fan-out completo de notificaciones (alerta → outbox → envío → registro) '
+            'contra proveedores locales falsos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=10000, help='Suscriptores sintéticos (N)')
+        parser.add_argument('--alerts', type=int, default=5, help='Alertas a crear (M)')
+        parser.add_argument('--provider', choices=['api', 'smtp'], default='api',
+                            help='api = MailerSend bulk-email; smtp = la API falla y se usa el fallback SMTP')
+        parser.add_argument('--latency', type=float, default=50, help='Latencia del proveedor (ms)')
+        parser.add_argument('--jitter', type=float, default=10, help='Variación de la latencia (ms)')
+        parser.add_argument('--error-rate', type=float, default=0.01, help='Fracción de solicitudes con error temporal')
+        parser.add_argument('--provider-limit', type=int, default=0,
+                            help='Solicitudes/seg que acepta el proveedor falso (0 = sin límite)')
+        parser.add_argument('--client-rate', type=float, default=50,
+                            help='Solicitudes/seg del token bucket del motor de envío')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=500, help='Mensajes reclamados por lote')
+        parser.add_argument('--bulk-size', type=int, default=100, help='Destinatarios por solicitud bulk-email')
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='Medir el pico de memoria Python con tracemalloc (ralentiza ~3x el envío)')
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos sembrados al terminar')
+
+    def handle(self, *args, **options):
+        behaviour = {
+            'latency': options['latency'] / 1000,
+            'jitter': options['jitter'] / 1000,
+            'rate_limit': options['provider_limit'],
+        }
+        smtp_mode = options['provider'] == 'smtp'
+        api = FakeMailerSendServer(
+            error_rate=1.0 if smtp_mode else options['error_rate'],
+            **({'latency': 0} if smtp_mode else behaviour)
+        ).start()
+        smtp = FakeSMTPServer(error_rate=options['error_rate'], **behaviour).start()
+
+        overrides = override_settings(
+            MAILERSEND_SIMULATE=False,
+            MAILERSEND_API_KEY='benchmark',
+            MAILERSEND_BULK_BATCH_SIZE=options['bulk_size'],
+            EMAIL_MAX_ATTEMPTS=options['max_attempts'],
+            MAILERSEND_BULK_STATUS_INTERVAL=0.1,
+            DELIVERY_RATE_LIMITS={'mailersend': options['client_rate'], 'smtp': options['client_rate']},
+        )
+        overrides.enable()
+        set_rate_share(1.0)
+        engine = DeliveryEngine(concurrency=options['concurrency'])
+        engine.base_url = api.base_url
+        if smtp_mode:
+            engine.smtp_host, engine.smtp_port = smtp.server_address[:2]
+            engine.smtp_user = engine.smtp_password = 'benchmark'
+            engine.smtp_starttls = False
+        previous_engine = set_engine(engine)
+
+        # Activos y dentro de las alertas del benchmark: la mitad en su zona y la mitad
+        # con el punto de residencia dentro del radio de impacto (los dos caminos del fan-out)
+        Subscriber.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').delete()
+        zone = Zone.objects.create(nombre=BENCH_ZONE)
+        lat, lon = BENCH_POINT
+        Subscriber.objects.bulk_create([
+            Subscriber(email=f'sub{i}@{BENCH_DOMAIN}', name='Benchmark')
+            if i % 2 == 0 else
+            Subscriber(email=f'sub{i}@{BENCH_DOMAIN}', name='Benchmark', home_latitude=lat + (i % 100) * 1e-4,
+                       home_longitude=lon - (i % 100) * 1e-4, home_radio=1000.0)
+            for i in range(options['subscribers'])
+        ], batch_size=1000)
+        zone_members = Subscriber.objects.filter(email__endswith=f'@{BENCH_DOMAIN}', home_latitude__isnull=True)
+        Subscriber.zonas.through.objects.bulk_create(
+            [Subscriber.zonas.through(subscriber_id=pk, zone_id=zone.pk)
+             for pk in zone_members.values_list('pk', flat=True)],
+            batch_size=1000,
+        )
+        self.stdout.write(f"{options['subscribers']} suscriptores sembrados; "
+                          f"proveedor={options['provider']} latencia={options['latency']}ms "
+                          f"errores={options['error_rate']:.0%}")
+
+        writes = {'count': 0}
+
+        def count_writes(execute, sql, params, many, context):
+            if sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+                writes['count'] += 1
+            return execute(sql, params, many, context)
+
+        alert_ids = []
+        discarded = 0
+        try:
+            if options['trace_memory']:
+                tracemalloc.start()
+            with connection.execute_wrapper(count_writes):
+                started = time.perf_counter()
+                for i in range(options['alerts']):
+                    with transaction.atomic():
+                        # Alta normal: post_save elige los destinatarios y llena la outbox
+                        # en la misma transacción, como en la API y las importaciones
+                        alert = Alert.objects.create(
+                            tipo_desastre='INUNDACION', nivel_riesgo='ALTO', activa=True, zona=zone,
+                            latitude=lat, longitude=lon, radio_impacto=BENCH_ALERT_RADIO,
+                            descripcion=f'Alerta de benchmark {i + 1}',
+                        )
+                        # Los suscriptores globales reales también entran en el fan-out (su
+                        # costo cuenta), pero sus mensajes se descartan antes de confirmar:
+                        # el worker real nunca los ve
+                        discarded += NotificationOutbox.objects.filter(alert=alert).exclude(
+                            email__endswith=f'@{BENCH_DOMAIN}'
+                        ).delete()[0]
+                    alert_ids.append(alert.pk)
+                enqueued_at = time.perf_counter()
+                self._drain(alert_ids, options['batch_size'])
+                finished = time.perf_counter()
+            peak = None
+            if options['trace_memory']:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            if discarded:
+                self.stdout.write(f'{discarded} mensajes a suscriptores globales reales descartados')
+            self._report(alert_ids, started, enqueued_at, finished, writes['count'], peak,
+                         api if not smtp_mode else smtp)
+        finally:
+            set_engine(previous_engine)
+            engine.close()
+            api.stop()
+            smtp.stop()
+            overrides.disable()
+            set_rate_share(1.0)
+            if not options['keep']:
+                Alert.objects.filter(pk__in=alert_ids).delete()
+                Subscriber.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').delete()
+                zone.delete()
+
+    def _drain(self, alert_ids, batch_size):
+        """
+        Procesa la outbox hasta que no queden mensajes de estas alertas (incluidos reintentos
+        y la conciliación de los bulk-email aceptados). Solo reclama mensajes de las alertas
+        del benchmark: los reales quedan para el worker.
+        """
+        pending = NotificationOutbox.objects.filter(
+            alert_id__in=alert_ids, status__in=['PENDIENTE', 'ENVIANDO', 'ACEPTADO']
+        )
+        while True:
+            if any(process_batch(batch_size, alert_ids=alert_ids)):
+                continue
+            if any(reconcile_accepted(batch_size, alert_ids=alert_ids)):
+                continue
+            next_at = pending.aggregate(next_at=Min('available_at'))['next_at']
+            if next_at is None:
+                return
+            time.sleep(min(5.0, max(0.05, (next_at - timezone.now()).total_seconds())))
+
+    def _report(self, alert_ids, started, enqueued_at, finished, db_writes, peak, provider):
+        messages = NotificationOutbox.objects.filter(alert_id__in=alert_ids)
+        sent = list(messages.filter(status='ENVIADO').values_list('created_at', 'updated_at'))
+        failed = messages.filter(status='FALLIDO').count()
+        retried = messages.filter(attempts__gt=1).count()
+        total = len(sent) + failed
+        elapsed = finished - started
+
+        self.stdout.write(f'Mensajes: {total} ({len(sent)} enviados, {failed} fallidos, '
+                          f'{retried} con reintentos)')
+        self.stdout.write(f'Fan-out a la outbox: {(enqueued_at - started) * 1000:.0f} ms')
+        self.stdout.write(f'Tiempo total: {elapsed:.2f} s -> {len(sent) / elapsed:.0f} mensajes/s')
+        if sent:
+            e2e = np.array([(done - created).total_seconds() * 1000 for created, done in sent])
+            self.stdout.write(f'Latencia alerta→enviado: p50 {np.percentile(e2e, 50):.0f} ms, '
+                              f'p99 {np.percentile(e2e, 99):.0f} ms')
+        if provider.stats.latencies:
+            service = np.array(provider.stats.latencies) * 1000
+            self.stdout.write(f'Latencia del proveedor por solicitud: p50 {np.percentile(service, 50):.0f} ms, '
+                              f'p99 {np.percentile(service, 99):.0f} ms')
+        self.stdout.write(f'Solicitudes al proveedor: {provider.stats.requests} '
+                          f'({provider.stats.errors} errores, {provider.stats.throttled} limitadas)')
+        self.stdout.write(f'Escrituras en BD (sentencias): {db_writes} '
+                          f'({db_writes / max(total, 1):.3f} por mensaje)')
+        memory = []
+        if peak is not None:
+            memory.append(f'Memoria Python pico: {peak / 1e6:.1f} MB')
+        if resource is not None:
+            memory.append(f'RSS máximo del proceso: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB')
+        if memory:
+            self.stdout.write('; '.join(memory))
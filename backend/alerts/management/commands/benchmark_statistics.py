@@ -0,0 +1,104 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from alerts import rollup, versions
+from alerts.models import DISASTER_TYPES, RISK_LEVELS, Alert, NotificationLog, NotificationOutbox, Zone
+from alerts.views import StatisticsView
+
+BENCH_DESCRIPTION = 'Alerta de benchmark (estadísticas)'
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas y latencia de /api/statistics/ (opcionalmente sembrando alertas sintéticas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=0,
+                            help='Alertas sintéticas a sembrar antes de medir (0 = usar los datos actuales)')
+        parser.add_argument('--days', type=int, default=365, help='Días hacia atrás en que se reparten las alertas sembradas')
+        parser.add_argument('--repeat', type=int, default=20, help='Solicitudes medidas')
+        parser.add_argument('--desde', help='Filtro desde (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Filtro hasta (YYYY-MM-DD)')
+        parser.add_argument('--keep', action='store_true', help='No borrar las alertas sembradas al terminar')
+        parser.add_argument('--cached', action='store_true',
+                            help='Medir respuestas desde la caché (por defecto se invalida antes de cada solicitud)')
+
+    def handle(self, *args, **options):
+        if options['alerts']:
+            self._seed(options['alerts'], options['days'])
+        params = {k: options[k] for k in ('desde', 'hasta') if options[k]}
+        factory = APIRequestFactory()
+        view = StatisticsView.as_view()
+        try:
+            self.stdout.write(f'Alertas en la BD: {Alert.objects.count()}; filtros: {params or "ninguno"}')
+            reset_queries()
+            latencies = []
+            queries = 0
+            for _ in range(max(1, options['repeat'])):
+                if not options['cached']:
+                    versions.bump_version()
+                request = factory.get('/api/statistics/', params)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                queries = len(captured)
+            latencies = np.array(latencies)
+            self.stdout.write(f'Consultas por solicitud: {queries}')
+            self.stdout.write(f'Latencia: p50 {np.percentile(latencies, 50):.1f} ms, '
+                              f'p99 {np.percentile(latencies, 99):.1f} ms, máx {latencies.max():.1f} ms')
+            for query in captured.captured_queries:
+                self.stdout.write(f"  {float(query['time']) * 1000:7.1f} ms  {query['sql'][:120]}")
+        finally:
+            if options['alerts'] and not options['keep']:
+                self._cleanup()
+
+    def _seed(self, count, days):
+        """Alertas repartidas entre tipos, niveles, zonas y días (bulk_create + resumen diario)."""
+        rng = np.random.default_rng(0)
+        zone_ids = list(Zone.objects.values_list('id', flat=True)) + [None]
+        tipos = [key for key, _ in DISASTER_TYPES]
+        niveles = [key for key, _ in RISK_LEVELS]
+        now = timezone.now()
+        started = time.perf_counter()
+        for start in range(0, count, 10000):
+            size = min(10000, count - start)
+            offsets = rng.uniform(0, days * 86400, size)
+            created = Alert.objects.bulk_create([
+                Alert(
+                    tipo_desastre=tipos[t], nivel_riesgo=niveles[n], zona_id=zone_ids[z],
+                    fecha_hora=now - timedelta(seconds=float(offset)), activa=bool(a),
+                    descripcion=BENCH_DESCRIPTION,
+                )
+                for t, n, z, a, offset in zip(
+                    rng.integers(len(tipos), size=size), rng.integers(len(niveles), size=size),
+                    rng.integers(len(zone_ids), size=size), rng.integers(2, size=size), offsets,
+                )
+            ], batch_size=2000)
+            rollup.add_alerts(created)
+        versions.bump_version()
+        self.stdout.write(f'{count} alertas sembradas en {time.perf_counter() - started:.1f} s')
+
+    def _cleanup(self):
+        """
+        Borra las alertas sembradas como se sembraron, sin señales por fila: resta sus
+        conteos del resumen, las borra en bloque y sube la versión una sola vez.
+        """
+        seeded = Alert.objects.filter(descripcion=BENCH_DESCRIPTION)
+        started = time.perf_counter()
+        with transaction.atomic():
+            rollup.remove_queryset(seeded)
+            # Las sembradas no tienen coordenadas (ninguna tesela que renovar); las filas que
+            # las referencian no tienen señales y se borran en bloque antes que ellas
+            NotificationOutbox.objects.filter(alert__in=seeded).delete()
+            NotificationLog.objects.filter(alert__in=seeded).delete()
+            deleted = seeded._raw_delete(seeded.db)
+            versions.bump_version()
+        self.stdout.write(f'{deleted} alertas sembradas eliminadas en {time.perf_counter() - started:.1f} s')
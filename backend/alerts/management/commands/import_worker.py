@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from alerts.imports import run_import_worker
+
+
+class Command(BaseCommand):
+    help = 'Procesa las importaciones de alertas en segundo plano (por lotes, retomando desde el último checkpoint)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Filas por lote confirmado (por defecto IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Segundos de espera sin importaciones')
+        parser.add_argument('--once', action='store_true', help='Procesar las importaciones pendientes y terminar')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker de importaciones iniciado')
+        run_import_worker(
+            poll_interval=options['poll_interval'], once=options['once'],
+            chunk_size=options['chunk_size'], stdout=self.stdout,
+        )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from alerts.outbox import run_worker
+from alerts.ratelimit import set_rate_share
+import multiprocessing
+
+
+def _worker_process(batch_size, poll_interval, once, processes):
+    # Proceso hijo: en 'spawn' (Windows/macOS) hay que inicializar Django de nuevo
+    import django
+    django.setup()
+    # El límite de tasa del proveedor se reparte entre los procesos
+    set_rate_share(1 / processes)
+    run_worker(batch_size=batch_size, poll_interval=poll_interval, once=once)
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de notificaciones (outbox) con uno o varios procesos worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Número de procesos worker en paralelo')
+        parser.add_argument('--batch-size', type=int, default=500, help='Mensajes reclamados por lote')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Segundos de espera con la cola vacía')
+        parser.add_argument('--once', action='store_true', help='Vaciar la cola y terminar')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+        once = options['once']
+        processes = max(1, options['processes'])
+
+        if processes == 1:
+            self.stdout.write('Worker de notificaciones iniciado (1 proceso)')
+            run_worker(batch_size=batch_size, poll_interval=poll_interval, once=once, stdout=self.stdout)
+            return
+
+        # No compartir conexiones abiertas con los procesos hijos
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=_worker_process, args=(batch_size, poll_interval, once, processes), daemon=True)
+            for _ in range(processes)
+        ]
+        for w in workers:
+            w.start()
+        self.stdout.write(f'Worker de notificaciones iniciado ({processes} procesos)')
+        try:
+            for w in workers:
+                w.join()
+        except KeyboardInterrupt:
+            for w in workers:
+                w.terminate()
+        self.stdout.write(self.style.SUCCESS('Workers finalizados'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from alerts.rollup import rebuild
+from alerts.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de alertas (AlertDailyStat) desde la tabla de alertas'
+
+    def handle(self, *args, **options):
+        rebuild(stdout=self.stdout)
+        bump_version()
+        self.stdout.write(self.style.SUCCESS('Resumen diario reconstruido'))
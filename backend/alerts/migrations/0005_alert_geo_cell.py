@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:27
+
+from django.db import migrations, models
+
+from alerts.geo import alert_geo_cell
+
+
+def backfill_geo_cell(apps, schema_editor):
+    Alert = apps.get_model('alerts', 'Alert')
+    pending = []
+    for alert in Alert.objects.exclude(latitude=None).exclude(longitude=None).iterator():
+        alert.geo_cell = alert_geo_cell(alert.latitude, alert.longitude, alert.radio_impacto)
+        pending.append(alert)
+    Alert.objects.bulk_update(pending, ['geo_cell'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0004_notificationlog_provider_notificationlog_provider_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='geo_cell',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Celda geohash del índice de proximidad (calculada)', max_length=12),
+        ),
+        migrations.RunPython(backfill_geo_cell, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:10
+
+from django.db import migrations, models
+
+from alerts.geo import build_geometry_lods
+
+
+def backfill_geometry_lod(apps, schema_editor):
+    Zone = apps.get_model('alerts', 'Zone')
+    for zone in Zone.objects.all().iterator():
+        zone.geometry_lod = build_geometry_lods(zone.geometry_json)
+        zone.save(update_fields=['geometry_lod'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0006_zone_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='geometry_lod',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versiones simplificadas de la geometría por tolerancia (calculadas)'),
+        ),
+        migrations.RunPython(backfill_geometry_lod, migrations.RunPython.noop),
+    ]
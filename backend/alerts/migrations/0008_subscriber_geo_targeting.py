@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0007_zone_geometry_lod'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriber',
+            name='home_latitude',
+            field=models.FloatField(blank=True, help_text='Latitud del punto de residencia', null=True),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='home_longitude',
+            field=models.FloatField(blank=True, help_text='Longitud del punto de residencia', null=True),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='home_radio',
+            field=models.FloatField(default=1000.0, help_text='Radio de interés alrededor del punto (metros)'),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='zonas',
+            field=models.ManyToManyField(blank=True, related_name='suscriptores', to='alerts.zone'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriber',
+            index=models.Index(fields=['home_latitude', 'home_longitude'], name='subscriber_home_idx'),
+        ),
+    ]
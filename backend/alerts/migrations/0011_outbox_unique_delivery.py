@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:54
+
+from django.db import migrations, models
+
+
+# Prioridad al conservar duplicados: el mensaje ya enviado, luego el que sigue en curso
+STATUS_PRIORITY = {'ENVIADO': 0, 'ENVIANDO': 1, 'PENDIENTE': 2, 'FALLIDO': 3}
+
+
+def dedupe_outbox(apps, schema_editor):
+    NotificationOutbox = apps.get_model('alerts', 'NotificationOutbox')
+    keep = {}
+    duplicates = []
+    for message in NotificationOutbox.objects.order_by('id').only('id', 'alert_id', 'email', 'status').iterator():
+        key = (message.alert_id, message.email)
+        current = keep.get(key)
+        if current is None:
+            keep[key] = message
+        elif STATUS_PRIORITY.get(message.status, 9) < STATUS_PRIORITY.get(current.status, 9):
+            duplicates.append(current.id)
+            keep[key] = message
+        else:
+            duplicates.append(message.id)
+    for start in range(0, len(duplicates), 1000):
+        NotificationOutbox.objects.filter(id__in=duplicates[start:start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0010_notificationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationjob',
+            name='skipped',
+            field=models.PositiveIntegerField(default=0, help_text='Destinatarios omitidos por tener ya la alerta enviada o en cola'),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='channel',
+            field=models.CharField(choices=[('email', 'Email')], default='email', max_length=20),
+        ),
+        migrations.RunPython(dedupe_outbox, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notificationoutbox',
+            constraint=models.UniqueConstraint(fields=('alert', 'email', 'channel'), name='outbox_unique_delivery'),
+        ),
+    ]
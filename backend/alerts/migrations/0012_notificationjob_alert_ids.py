@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0011_outbox_unique_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationjob',
+            name='alert_ids',
+            field=models.JSONField(blank=True, help_text='Alertas a notificar (vacío = todas las activas)', null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:33
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    Alert = apps.get_model('alerts', 'Alert')
+    AlertDailyStat = apps.get_model('alerts', 'AlertDailyStat')
+    rows = (
+        Alert.objects.order_by()
+        .annotate(day=TruncDate('fecha_hora'), zona_key=Coalesce('zona_id', 0))
+        .values_list('day', 'tipo_desastre', 'nivel_riesgo', 'zona_key', 'activa')
+        .annotate(total=Count('id'))
+    )
+    AlertDailyStat.objects.bulk_create(
+        [
+            AlertDailyStat(day=day, tipo_desastre=tipo, nivel_riesgo=nivel, zona=zona, activa=activa, total=total)
+            for day, tipo, nivel, zona, activa, total in rows.iterator()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0013_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('tipo_desastre', models.CharField(choices=[('SISMO', 'Sismos'), ('INUNDACION', 'Inundaciones'), ('DESLAVE', 'Deslaves'), ('INCENDIO', 'Incendios'), ('OTROS', 'Otros')], max_length=20)),
+                ('nivel_riesgo', models.CharField(choices=[('BAJO', 'Bajo'), ('MEDIO', 'Medio'), ('ALTO', 'Alto'), ('CRITICO', 'Crítico')], max_length=20)),
+                ('zona', models.BigIntegerField(default=0, help_text='Id de la zona (0 = sin zona)')),
+                ('activa', models.BooleanField()),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de alertas',
+                'verbose_name_plural': 'Resúmenes diarios de alertas',
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'tipo_desastre', 'nivel_riesgo', 'zona', 'activa'), name='alert_daily_stat_key')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
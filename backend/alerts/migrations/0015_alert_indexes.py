@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0014_alertdailystat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['-fecha_hora'], name='alert_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['-fecha_hora'], name='alert_activa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['tipo_desastre', '-fecha_hora'], name='alert_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['nivel_riesgo', '-fecha_hora'], name='alert_nivel_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['zona', '-fecha_hora'], name='alert_zona_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0016_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='provider_index',
+            field=models.PositiveIntegerField(blank=True, help_text='Posición del mensaje en el bulk-email', null=True),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='provider_ref',
+            field=models.CharField(blank=True, help_text='Id del bulk-email que aceptó el mensaje (para conciliar su estado)', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='sent_at',
+            field=models.DateTimeField(blank=True, help_text='Momento en que el proveedor lo aceptó', null=True),
+        ),
+        migrations.AlterField(
+            model_name='notificationoutbox',
+            name='status',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIANDO', 'Enviando'), ('ACEPTADO', 'Aceptado por el proveedor'), ('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0017_outbox_bulk_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='zona',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='alertas', to='alerts.zone'),
+        ),
+    ]
@@ -2,16 +2,22 @@
 Modelos para el Sistema de Alerta Temprana.
 Coordenadas y polígonos guardados como campos normales (sin GDAL/GEOS).
 """
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from .geo import alert_geo_cell, build_geometry_lods
+
 
 class Zone(models.Model):
     """Zona geográfica (polígono guardado como GeoJSON en JSON)."""
     nombre = models.CharField(max_length=200)
     codigo = models.CharField(max_length=50, blank=True)
     geometry_json = models.JSONField(null=True, blank=True)
+    geometry_lod = models.JSONField(default=dict, blank=True, editable=False,
+                                    help_text='Versiones simplificadas de la geometría por tolerancia (calculadas)')
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['nombre']
@@ -21,6 +27,15 @@ class Zone(models.Model):
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        # Precalcular niveles de detalle para el mapa al guardar la geometría
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'geometry_json' in update_fields:
+            self.geometry_lod = build_geometry_lods(self.geometry_json)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'geometry_lod'}
+        super().save(*args, **kwargs)
+
 
 # Choices para nivel de riesgo y tipo de desastre
 RISK_LEVELS = [
@@ -43,10 +58,14 @@ class Alert(models.Model):
     """Alerta temprana: tipo, nivel, zona y coordenadas (lat/lon)."""
     tipo_desastre = models.CharField(max_length=20, choices=DISASTER_TYPES)
     nivel_riesgo = models.CharField(max_length=20, choices=RISK_LEVELS)
-    zona = models.ForeignKey(Zone, on_delete=models.SET_NULL, null=True, blank=True, related_name='alertas')
+    # Sin índice propio: alert_zona_fecha_idx (zona, -fecha_hora) ya cubre las búsquedas por zona
+    zona = models.ForeignKey(Zone, on_delete=models.SET_NULL, null=True, blank=True, related_name='alertas',
+                             db_index=False)
     latitude = models.FloatField(null=True, blank=True, help_text='Latitud del evento')
     longitude = models.FloatField(null=True, blank=True, help_text='Longitud del evento')
     radio_impacto = models.FloatField(default=0.0, null=True, blank=True, help_text='Radio de impacto en metros')
+    geo_cell = models.CharField(max_length=12, blank=True, db_index=True, editable=False,
+                                help_text='Celda geohash del índice de proximidad (calculada)')
     fecha_hora = models.DateTimeField(default=timezone.now)
     descripcion = models.TextField(blank=True)
     activa = models.BooleanField(default=True)
@@ -57,10 +76,74 @@ class Alert(models.Model):
         ordering = ['-fecha_hora']
         verbose_name = 'Alerta'
         verbose_name_plural = 'Alertas'
+        # Listado, exportación y recientes filtran por rango de fecha_hora y ordenan por
+        # -fecha_hora; cada filtro de igualdad tiene su índice compuesto con la fecha.
+        # `manage.py check_query_plans` verifica con EXPLAIN que se usen.
+        indexes = [
+            models.Index(fields=['-fecha_hora'], name='alert_fecha_idx'),
+            models.Index(fields=['-fecha_hora'], condition=models.Q(activa=True), name='alert_activa_fecha_idx'),
+            models.Index(fields=['tipo_desastre', '-fecha_hora'], name='alert_tipo_fecha_idx'),
+            models.Index(fields=['nivel_riesgo', '-fecha_hora'], name='alert_nivel_fecha_idx'),
+            models.Index(fields=['zona', '-fecha_hora'], name='alert_zona_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_desastre_display()} - {self.get_nivel_riesgo_display()} ({self.fecha_hora.date()})"
 
+    def save(self, *args, **kwargs):
+        # Mantener la celda del índice de proximidad sincronizada con lat/lon/radio
+        self.geo_cell = alert_geo_cell(self.latitude, self.longitude, self.radio_impacto)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude', 'radio_impacto'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geo_cell'}
+        super().save(*args, **kwargs)
+
+
+class AlertDailyStat(models.Model):
+    """Conteo de alertas por día (fecha local) y combinación de tipo, nivel, zona y estado.
+
+    Se mantiene en las señales de Alert (y en las importaciones masivas); las
+    estadísticas leen de aquí en vez de recorrer las alertas. Reconstruir con
+    `manage.py rebuild_alert_stats`.
+    """
+    day = models.DateField()
+    tipo_desastre = models.CharField(max_length=20, choices=DISASTER_TYPES)
+    nivel_riesgo = models.CharField(max_length=20, choices=RISK_LEVELS)
+    # Id de zona sin FK (0 = sin zona): así la clave única no tiene NULL
+    zona = models.BigIntegerField(default=0, help_text='Id de la zona (0 = sin zona)')
+    activa = models.BooleanField()
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        verbose_name = 'Resumen diario de alertas'
+        verbose_name_plural = 'Resúmenes diarios de alertas'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'tipo_desastre', 'nivel_riesgo', 'zona', 'activa'], name='alert_daily_stat_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.tipo_desastre}/{self.nivel_riesgo} zona {self.zona}: {self.total}"
+
+
+class DataVersion(models.Model):
+    """Versión de los datos de alertas y zonas que usan las cachés (estadísticas, teselas).
+
+    Se incrementa en la misma transacción que cada alta, edición o baja, así todos los
+    procesos (servidor y workers) ven el cambio al confirmarse. Ver `alerts/versions.py`.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Versión de datos'
+        verbose_name_plural = 'Versiones de datos'
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
 
 class NotificationLog(models.Model):
     """Registro de notificaciones simuladas (usuarios en zona de riesgo)."""
@@ -83,19 +166,163 @@ class NotificationLog(models.Model):
 
 
 class Subscriber(models.Model):
-    """Suscriptor global para recibir notificaciones por correo.
+    """Suscriptor para recibir notificaciones por correo.
 
-    Suscripción global (no ligada a zona) tal como pidió el cliente.
+    Sin zonas ni punto de residencia la suscripción es global (todas las alertas).
+    Con zonas y/o punto + radio solo recibe las alertas de esas zonas o cuyo
+    círculo de impacto alcanza su radio.
     """
     email = models.EmailField(unique=True)
     name = models.CharField(max_length=200, blank=True)
     active = models.BooleanField(default=True)
+    zonas = models.ManyToManyField(Zone, blank=True, related_name='suscriptores')
+    home_latitude = models.FloatField(null=True, blank=True, help_text='Latitud del punto de residencia')
+    home_longitude = models.FloatField(null=True, blank=True, help_text='Longitud del punto de residencia')
+    home_radio = models.FloatField(default=1000.0, help_text='Radio de interés alrededor del punto (metros)')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Suscriptor'
         verbose_name_plural = 'Suscriptores'
+        indexes = [
+            models.Index(fields=['home_latitude', 'home_longitude'], name='subscriber_home_idx'),
+        ]
 
     def __str__(self):
         return f"{self.email} ({'activo' if self.active else 'inactivo'})"
+
+
+OUTBOX_STATUS = [
+    ('PENDIENTE', 'Pendiente'),
+    ('ENVIANDO', 'Enviando'),
+    ('ACEPTADO', 'Aceptado por el proveedor'),
+    ('ENVIADO', 'Enviado'),
+    ('FALLIDO', 'Fallido'),
+]
+
+
+CHANNELS = [
+    ('email', 'Email'),
+]
+
+JOB_STATUS = [
+    ('PENDIENTE', 'Pendiente'),
+    ('EN_CURSO', 'En curso'),
+    ('COMPLETADO', 'Completado'),
+    ('FALLIDO', 'Fallido'),
+]
+
+
+IMPORT_FORMATS = [
+    ('xlsx', 'Excel'),
+    ('csv', 'CSV'),
+]
+
+
+class ImportJob(models.Model):
+    """Importación de alertas en segundo plano desde un archivo guardado en disco.
+
+    `manage.py import_worker` lo lee por lotes; cada lote se confirma junto con el avance
+    (`rows_processed`), así tras una caída se retoma desde el último lote confirmado.
+    """
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_jobs'
+    )
+    filename = models.CharField(max_length=255, help_text='Nombre original del archivo')
+    path = models.CharField(max_length=500, help_text='Archivo guardado en IMPORT_UPLOAD_DIR')
+    format = models.CharField(max_length=10, choices=IMPORT_FORMATS)
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='PENDIENTE')
+    total_rows = models.PositiveIntegerField(null=True, blank=True, help_text='Filas de datos (estimado)')
+    rows_processed = models.PositiveIntegerField(default=0, help_text='Filas leídas y confirmadas (checkpoint)')
+    alerts_created = models.PositiveIntegerField(default=0)
+    rows_invalid = models.PositiveIntegerField(default=0)
+    row_errors = models.JSONField(default=list, blank=True, help_text='Primeros errores por fila')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Importación de alertas'
+        verbose_name_plural = 'Importaciones de alertas'
+
+    def __str__(self):
+        return f"Importación {self.pk} {self.filename} ({self.status})"
+
+
+class NotificationJob(models.Model):
+    """Envío de notificaciones de alertas activas: todas (solicitado desde la API) o
+    las indicadas en `alert_ids` (p. ej. las creadas por una importación).
+
+    La petición solo crea el trabajo; el worker calcula los destinatarios, los encola
+    en la outbox (con referencia al trabajo) y el progreso se lee de esos mensajes.
+    """
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='notification_jobs'
+    )
+    email = models.EmailField(blank=True, help_text='Destinatario adicional indicado en la solicitud')
+    alert_ids = models.JSONField(null=True, blank=True, help_text='Alertas a notificar (vacío = todas las activas)')
+    import_job = models.ForeignKey(
+        ImportJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='notification_jobs'
+    )
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='PENDIENTE')
+    total = models.PositiveIntegerField(default=0, help_text='Mensajes encolados')
+    skipped = models.PositiveIntegerField(default=0, help_text='Destinatarios omitidos por tener ya la alerta enviada o en cola')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Trabajo de notificación'
+        verbose_name_plural = 'Trabajos de notificación'
+
+    def __str__(self):
+        return f"Trabajo {self.pk} ({self.status})"
+
+
+class NotificationOutbox(models.Model):
+    """Correo pendiente de envío (outbox transaccional).
+
+    Se llena en la misma transacción que guarda la Alert y lo procesa
+    `manage.py notification_worker` fuera del ciclo de la petición.
+    Hay a lo sumo una fila por (alerta, destinatario, canal): una alerta nunca
+    se envía dos veces a la misma persona. Los mensajes de un bulk-email quedan
+    ACEPTADO hasta que el estado del bulk confirma el envío o el rechazo.
+    """
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='outbox')
+    job = models.ForeignKey(
+        NotificationJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='mensajes'
+    )
+    email = models.CharField(max_length=255)
+    channel = models.CharField(max_length=20, choices=CHANNELS, default='email')
+    zona_nombre = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=20, choices=OUTBOX_STATUS, default='PENDIENTE')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now, help_text='No se procesa antes de esta fecha')
+    locked_at = models.DateTimeField(null=True, blank=True, help_text='Momento en que un worker lo reclamó')
+    last_error = models.TextField(blank=True)
+    provider_ref = models.CharField(max_length=255, blank=True,
+                                    help_text='Id del bulk-email que aceptó el mensaje (para conciliar su estado)')
+    provider_index = models.PositiveIntegerField(null=True, blank=True, help_text='Posición del mensaje en el bulk-email')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True, help_text='Momento en que el proveedor lo aceptó')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Mensaje en cola'
+        verbose_name_plural = 'Cola de notificaciones'
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['alert', 'email', 'channel'], name='outbox_unique_delivery'),
+        ]
+
+    def __str__(self):
+        return f"{self.email} - alerta {self.alert_id} ({self.status})"
@@ -0,0 +1,306 @@
+"""
+Outbox transaccional de notificaciones.
+Las alertas encolan un mensaje por destinatario; los workers los reclaman en lotes
+con SELECT ... FOR UPDATE SKIP LOCKED y los envían fuera de la transacción.
+Los fallos temporales (429, 5xx, red) vuelven a PENDIENTE con `available_at` en el
+futuro (backoff exponencial con jitter): la outbox es también la cola de reintentos.
+Los mensajes que MailerSend acepta en un bulk-email quedan ACEPTADO hasta que el
+estado del bulk (GET bulk-email/{id}) confirma cada destinatario.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .delivery import bulk_results, get_engine
+from .models import NotificationOutbox, NotificationLog
+from .ratelimit import retry_delay
+
+# Un mensaje en ENVIANDO más tiempo que esto se considera abandonado (worker caído)
+LOCK_TIMEOUT = timedelta(minutes=5)
+# Filas por INSERT/UPDATE al registrar resultados
+LOG_BATCH_SIZE = 1000
+# Un bulk-email sin estado final pasado este tiempo se da por fallido
+BULK_STATUS_TIMEOUT = timedelta(hours=24)
+
+logger = logging.getLogger(__name__)
+
+
+def max_attempts():
+    return getattr(settings, 'EMAIL_MAX_ATTEMPTS', 6)
+
+
+def normalize_send_result(result):
+    """(ok, provider, provider_id, response) desde el resultado de _send_alert_email (bool o dict)."""
+    if isinstance(result, dict):
+        return (
+            bool(result.get('ok')),
+            result.get('provider') or '',
+            result.get('provider_id') or '',
+            result.get('response') or '',
+        )
+    return bool(result), '', '', str(result)
+
+
+def bulk_status_interval():
+    """Espera entre consultas del estado de un bulk-email aceptado."""
+    return timedelta(seconds=getattr(settings, 'MAILERSEND_BULK_STATUS_INTERVAL', 15))
+
+
+def is_retryable(result):
+    return isinstance(result, dict) and not result.get('ok') and bool(result.get('retryable'))
+
+
+def queue_backlog():
+    """Mensajes pendientes o en envío en la outbox."""
+    return NotificationOutbox.objects.filter(status__in=['PENDIENTE', 'ENVIANDO']).count()
+
+
+def backlog_exceeded():
+    """
+    Backpressure para productores no urgentes (p. ej. la simulación manual): con la cola
+    por encima de OUTBOX_MAX_BACKLOG no se acepta más trabajo hasta que los workers la drenen.
+    Las alertas nuevas siempre se encolan.
+    """
+    return queue_backlog() >= getattr(settings, 'OUTBOX_MAX_BACKLOG', 50000)
+
+
+def enqueue_alert(alert, recipients, job=None, channel='email'):
+    """
+    Encola un mensaje por destinatario que aún no tenga esta alerta enviada o en cola.
+    Llamar dentro de la transacción que guarda la alerta.
+
+    Los mensajes existentes se leen en una sola consulta por alerta: los FALLIDO se
+    reactivan (pasan al trabajo actual), los demás se omiten. La restricción única
+    (alerta, destinatario, canal) cubre las carreras entre productores concurrentes.
+    Devuelve (encolados, omitidos).
+    """
+    recipients = list(dict.fromkeys(recipients))
+    existing = dict(
+        NotificationOutbox.objects.filter(alert=alert, channel=channel).values_list('email', 'status')
+    )
+    new = [email for email in recipients if email not in existing]
+    failed = [email for email in recipients if existing.get(email) == 'FALLIDO']
+
+    zona_nombre = alert.zona.nombre if alert.zona else 'Sin zona'
+    created = NotificationOutbox.objects.bulk_create(
+        [
+            NotificationOutbox(alert=alert, job=job, email=email, channel=channel, zona_nombre=zona_nombre)
+            for email in new
+        ],
+        batch_size=LOG_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    reactivated = 0
+    for start in range(0, len(failed), LOG_BATCH_SIZE):
+        reactivated += NotificationOutbox.objects.filter(
+            alert=alert, channel=channel, status='FALLIDO', email__in=failed[start:start + LOG_BATCH_SIZE]
+        ).update(
+            status='PENDIENTE', job=job, attempts=0, available_at=timezone.now(),
+            last_error='', locked_at=None, updated_at=timezone.now()
+        )
+    enqueued = len(created) + reactivated
+    return enqueued, len(recipients) - enqueued
+
+
+def claim_batch(batch_size, alert_ids=None):
+    """
+    Reclama hasta `batch_size` mensajes disponibles (o abandonados) para este worker.
+    Las filas bloqueadas por otro worker se saltan, así varios procesos no se pisan.
+    Con `alert_ids` solo se reclaman mensajes de esas alertas (p. ej. el benchmark).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = NotificationOutbox.objects.select_for_update(skip_locked=True)
+        if alert_ids is not None:
+            candidates = candidates.filter(alert_id__in=alert_ids)
+        ids = list(
+            candidates
+            .filter(
+                Q(status='PENDIENTE', available_at__lte=now)
+                | Q(status='ENVIANDO', locked_at__lt=now - LOCK_TIMEOUT)
+            )
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        NotificationOutbox.objects.filter(id__in=ids).update(
+            status='ENVIANDO', locked_at=now, attempts=F('attempts') + 1
+        )
+    return list(NotificationOutbox.objects.filter(id__in=ids).select_related('alert__zona'))
+
+
+def record_results(messages, results):
+    """
+    Registra en NotificationLog el resultado final de cada envío (bulk_create por trozos)
+    y cierra los mensajes de la outbox en bloque. Los fallos temporales con intentos
+    restantes se reprograman sin registro en el log; los aceptados en un bulk-email
+    quedan ACEPTADO hasta conciliar su estado (`reconcile_accepted`).
+    Devuelve (enviados, aceptados, fallidos, reprogramados).
+    """
+    now = timezone.now()
+    logs = []
+    sent_ids = []
+    accepted = []
+    failed = []
+    retries = []
+    for message, result in zip(messages, results):
+        ok, provider, provider_id, provider_response = normalize_send_result(result)
+        if isinstance(result, dict) and result.get('accepted'):
+            message.status = 'ACEPTADO'
+            message.provider_ref = provider_id
+            message.provider_index = result['bulk_index']
+            message.available_at = now + bulk_status_interval()
+            message.sent_at = now
+            message.last_error = ''
+            message.locked_at = None
+            message.updated_at = now
+            accepted.append(message)
+            continue
+        if is_retryable(result) and message.attempts < max_attempts():
+            message.status = 'PENDIENTE'
+            message.available_at = now + timedelta(
+                seconds=retry_delay(message.attempts, result.get('retry_after'))
+            )
+            message.last_error = provider_response
+            message.locked_at = None
+            message.updated_at = now
+            retries.append(message)
+            continue
+        logs.append(NotificationLog(
+            alert_id=message.alert_id,
+            email_simulado=message.email,
+            zona_nombre=message.zona_nombre,
+            enviado_simulado=ok,
+            provider=provider,
+            provider_id=provider_id,
+            provider_response=provider_response
+        ))
+        if ok:
+            sent_ids.append(message.id)
+        else:
+            message.status = 'FALLIDO'
+            message.last_error = provider_response
+            message.locked_at = None
+            message.updated_at = now
+            failed.append(message)
+
+    with transaction.atomic():
+        NotificationLog.objects.bulk_create(logs, batch_size=LOG_BATCH_SIZE)
+        if sent_ids:
+            NotificationOutbox.objects.filter(id__in=sent_ids).update(
+                status='ENVIADO', sent_at=now, last_error='', locked_at=None, updated_at=now
+            )
+        if accepted:
+            NotificationOutbox.objects.bulk_update(
+                accepted,
+                ['status', 'provider_ref', 'provider_index', 'available_at', 'sent_at', 'last_error',
+                 'locked_at', 'updated_at'],
+                batch_size=LOG_BATCH_SIZE,
+            )
+        if failed:
+            NotificationOutbox.objects.bulk_update(
+                failed, ['status', 'last_error', 'locked_at', 'updated_at'], batch_size=LOG_BATCH_SIZE
+            )
+        if retries:
+            NotificationOutbox.objects.bulk_update(
+                retries, ['status', 'available_at', 'last_error', 'locked_at', 'updated_at'], batch_size=LOG_BATCH_SIZE
+            )
+    return len(sent_ids), len(accepted), len(failed), len(retries)
+
+
+def process_batch(batch_size, alert_ids=None):
+    """
+    Reclama un lote y lo envía con el motor compartido: los destinatarios de una misma
+    alerta viajan juntos en solicitudes bulk-email. La base de datos se escribe desde
+    este hilo, en bloque. Devuelve (enviados, aceptados, fallidos, reprogramados).
+
+    El lote se limita a lo que el límite de tasa permite enviar antes de que venza el
+    bloqueo; así un proveedor lento no provoca que otro worker reclame los mismos mensajes.
+    `alert_ids` limita el lote a los mensajes de esas alertas (ver `claim_batch`).
+    """
+    engine = get_engine()
+    sendable = engine.sendable_within(LOCK_TIMEOUT.total_seconds() / 2)
+    messages = claim_batch(min(batch_size, sendable) if sendable else batch_size, alert_ids=alert_ids)
+    if not messages:
+        return 0, 0, 0, 0
+    results = engine.send_bulk([(m.alert, m.email) for m in messages])
+    return record_results(messages, results)
+
+
+def reconcile_accepted(batch_size, alert_ids=None):
+    """
+    Concilia hasta `batch_size` mensajes ACEPTADO cuyo bulk-email toca consultar: un GET
+    por bulk y el resultado de cada destinatario pasa por `record_results` (ENVIADO,
+    FALLIDO o reintento). Mientras MailerSend procesa el bulk se vuelve a consultar tras
+    MAILERSEND_BULK_STATUS_INTERVAL; pasado BULK_STATUS_TIMEOUT se da por fallido.
+    Devuelve (enviados, fallidos, reprogramados).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = NotificationOutbox.objects.select_for_update(skip_locked=True)
+        if alert_ids is not None:
+            candidates = candidates.filter(alert_id__in=alert_ids)
+        ids = list(
+            candidates.filter(status='ACEPTADO', available_at__lte=now)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0, 0, 0
+        # Reserva: otro worker no consulta los mismos bulks mientras dure
+        NotificationOutbox.objects.filter(id__in=ids).update(available_at=now + LOCK_TIMEOUT)
+    by_bulk = {}
+    for message in NotificationOutbox.objects.filter(id__in=ids):
+        by_bulk.setdefault(message.provider_ref, []).append(message)
+
+    engine = get_engine()
+    finished, results, waiting = [], [], []
+    for bulk_id, messages in by_bulk.items():
+        try:
+            outcome = bulk_results(engine.bulk_status(bulk_id), [m.provider_index for m in messages])
+        except Exception as e:
+            logger.warning("Error consultando el estado del bulk-email %s: %s", bulk_id, e)
+            outcome = None
+        if outcome is None and messages[0].sent_at < now - BULK_STATUS_TIMEOUT:
+            outcome = [{'ok': False, 'provider': 'mailersend_bulk', 'provider_id': None, 'retryable': False,
+                        'response': f'bulk-email {bulk_id} sin estado final'} for _ in messages]
+        if outcome is None:
+            waiting.extend(messages)
+            continue
+        finished.extend(messages)
+        results.extend(outcome)
+
+    if waiting:
+        NotificationOutbox.objects.filter(id__in=[m.id for m in waiting]).update(
+            available_at=now + bulk_status_interval()
+        )
+    sent, _, failed, retried = record_results(finished, results)
+    return sent, failed, retried
+
+
+def run_worker(batch_size=500, poll_interval=2.0, once=False, stdout=None):
+    """
+    Bucle de un worker: expande los trabajos de notificación pendientes y procesa lotes
+    hasta vaciar la cola (`once`) o indefinidamente.
+    """
+    # Import diferido: jobs usa enqueue_alert de este módulo
+    from .jobs import expand_pending_jobs
+
+    while True:
+        expand_pending_jobs(stdout=stdout)
+        sent, accepted, failed, retried = process_batch(batch_size)
+        confirmed, rejected, resent = reconcile_accepted(batch_size)
+        sent, failed, retried = sent + confirmed, failed + rejected, retried + resent
+        if sent or accepted or failed or retried:
+            if stdout is not None:
+                stdout.write(f'Lote procesado: {sent} enviados, {accepted} aceptados, {failed} fallidos, '
+                             f'{retried} reprogramados')
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
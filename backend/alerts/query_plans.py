@@ -0,0 +1,91 @@
+"""
+Consultas del listado, las estadísticas y la exportación junto con el índice que debe
+recorrer cada una. Las usan los tests (con datos sembrados) y `check_query_plans`
+para verificar con EXPLAIN que el plan usa ese índice y no otro.
+"""
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from . import rollup
+from .filters import AlertFilter
+from .models import Alert, Zone
+from .statistics import TREND_DAYS, recent_alerts
+from .views import AlertViewSet
+
+PlanCase = namedtuple('PlanCase', ['name', 'queryset', 'index'])
+
+PAGE_SIZE = 20
+# Índices de restricciones únicas: SQLite los crea con nombre propio
+CONSTRAINT_INDEX_NAMES = {
+    'sqlite': {'alert_daily_stat_key': 'sqlite_autoindex_alerts_alertdailystat_1'},
+}
+# Índice esperado por filtro del listado y la exportación
+FILTER_INDEXES = {
+    'sin filtros': 'alert_fecha_idx',
+    'desde': 'alert_fecha_idx',
+    'desde+hasta': 'alert_fecha_idx',
+    'activas': 'alert_activa_fecha_idx',
+    'tipo': 'alert_tipo_fecha_idx',
+    'nivel': 'alert_nivel_fecha_idx',
+    'zona': 'alert_zona_fecha_idx',
+}
+
+
+class InvalidFilters(Exception):
+    """Los filtros de un caso no pasan la validación de AlertFilter."""
+
+
+def _filtered(params, queryset):
+    filterset = AlertFilter(params, queryset=queryset)
+    if not filterset.is_valid():
+        raise InvalidFilters(f'Filtros inválidos {params}: {filterset.errors}')
+    return filterset.qs
+
+
+def plan_cases():
+    """PlanCase de cada consulta: el listado (página y conteo), las estadísticas y la exportación."""
+    today = timezone.localdate()
+    desde = (today - timedelta(days=30)).isoformat()
+    hasta = today.isoformat()
+    zona = Zone.objects.values_list('id', flat=True).first() or 1
+    filters = {
+        'sin filtros': {},
+        'desde': {'desde': desde},
+        'desde+hasta': {'desde': desde, 'hasta': hasta},
+        'activas': {'activas': 'true'},
+        'tipo': {'tipo_desastre': 'SISMO'},
+        'nivel': {'nivel_riesgo': 'CRITICO'},
+        'zona': {'zona': str(zona)},
+    }
+
+    for label, params in filters.items():
+        index = FILTER_INDEXES[label]
+        listing = _filtered(params, AlertViewSet.queryset)
+        yield PlanCase(f'listado {label}', listing[:PAGE_SIZE], index)
+        if params:
+            # Filas del COUNT de la paginación (sin filtros es la tabla entera)
+            yield PlanCase(f'listado {label} (conteo)', listing.order_by().values('pk'), index)
+
+    for label in ('sin filtros', 'desde+hasta'):
+        base_qs = _filtered(filters[label], Alert.objects.all())
+        yield PlanCase(f'estadísticas {label} (recientes)', recent_alerts(base_qs), 'alert_fecha_idx')
+    yield PlanCase('estadísticas (grupos del rango)', rollup.grouped_counts(desde, hasta), 'alert_daily_stat_key')
+    yield PlanCase(f'estadísticas (tendencia {TREND_DAYS} días)', rollup.trend_counts(TREND_DAYS),
+                   'alert_daily_stat_key')
+
+    for label, params in filters.items():
+        if not params:
+            # Exportar todo lee la tabla entera: recorrerla completa es lo correcto
+            continue
+        export = _filtered(params, Alert.objects.order_by('-fecha_hora'))
+        yield PlanCase(f'exportación {label}', export, FILTER_INDEXES[label])
+
+
+def uses_index(plan, index):
+    """El plan (texto de EXPLAIN en PostgreSQL o SQLite) recorre el índice `index`."""
+    name = CONSTRAINT_INDEX_NAMES.get(connection.vendor, {}).get(index, index)
+    return re.search(rf'\b{re.escape(name)}\b', plan) is not None
@@ -0,0 +1,112 @@
+"""
+Limitación de envíos por proveedor y cálculo de reintentos.
+Cada proveedor (API de MailerSend, SMTP) tiene un token bucket por proceso; los hilos
+del motor de envío esperan turno antes de cada solicitud, así el ritmo sostenido no
+supera el límite del proveedor. Si el proveedor responde 429 el bucket se pausa.
+"""
+import random
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from mailersend.exceptions import MailerSendError, RateLimitExceeded, ServerError
+
+# Reintentos con backoff exponencial: 2 s, 4 s, 8 s... hasta RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 600.0
+
+
+class TokenBucket:
+    """`rate` solicitudes por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """Bloquea hasta disponer de `tokens`; False si se agota `timeout` (segundos)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = max(self._paused_until - now, (tokens - self._tokens) / self.rate)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """El proveedor pidió esperar: nadie envía hasta que pase `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_rate_share = 1.0
+
+
+def set_rate_share(share):
+    """Fracción del límite que usa este proceso (p. ej. 1/N con N workers)."""
+    global _rate_share
+    with _buckets_lock:
+        _rate_share = share
+        _buckets.clear()
+
+
+def provider_rate(provider):
+    """Solicitudes por segundo permitidas a este proceso para `provider`."""
+    limits = getattr(settings, 'DELIVERY_RATE_LIMITS', {})
+    return float(limits.get(provider, 1.0)) * _rate_share
+
+
+def get_bucket(provider):
+    with _buckets_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            rate = provider_rate(provider)
+            bucket = _buckets[provider] = TokenBucket(rate, capacity=max(1.0, rate))
+        return bucket
+
+
+def retry_delay(attempts, retry_after=None):
+    """
+    Espera antes del siguiente intento: backoff exponencial con jitter
+    (mitad fija, mitad aleatoria), nunca menor que el Retry-After del proveedor.
+    """
+    base = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** max(0, attempts - 1))
+    delay = base / 2 + random.uniform(0, base / 2)
+    return max(delay, float(retry_after or 0))
+
+
+def classify_error(error):
+    """(reintentable, retry_after) para una excepción del proveedor."""
+    if isinstance(error, RateLimitExceeded):
+        return True, error.retry_after
+    if isinstance(error, ServerError):
+        return True, None
+    if isinstance(error, MailerSendError):
+        # Errores de red del cliente (sin respuesta HTTP): reintentables
+        return error.response is None and str(error).startswith('Request failed'), None
+    if isinstance(error, smtplib.SMTPConnectError):
+        return True, None
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 4xx SMTP = fallo temporal
+        return 400 <= error.smtp_code < 500, None
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values()), None
+    # Desconexiones, timeouts y errores de socket (SMTPException hereda de OSError)
+    return isinstance(error, OSError), None
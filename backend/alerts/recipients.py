@@ -0,0 +1,58 @@
+"""
+Selección de destinatarios por alerta (fan-out geo-dirigido).
+"""
+import math
+
+import numpy as np
+from django.db.models import Exists, OuterRef
+
+from .geo import METERS_PER_DEGREE, haversine_m
+from .models import Subscriber
+
+# Radio máximo aceptado para el punto de residencia de un suscriptor (metros).
+# Acota el margen de la búsqueda por rango lat/lon.
+MAX_HOME_RADIO_M = 50000.0
+
+
+def alert_recipients(alert):
+    """
+    Emails de suscriptores activos que deben recibir la alerta (sin duplicados, ordenados).
+
+    - Globales (sin zonas ni punto de residencia): siempre.
+    - Con zonas: si la zona de la alerta está entre ellas.
+    - Con punto + radio: si su círculo se cruza con el círculo de impacto de la alerta
+      (búsqueda por rango sobre el índice (home_latitude, home_longitude) y haversine en bloque).
+
+    Una alerta sin zona ni coordenadas solo llega a los globales: no hay con qué
+    comparar las zonas ni los puntos de residencia.
+    """
+    active = Subscriber.objects.filter(active=True)
+    has_location = alert.latitude is not None and alert.longitude is not None
+
+    zone_links = Subscriber.zonas.through.objects.filter(subscriber_id=OuterRef('pk'))
+    emails = set(
+        active.filter(home_latitude__isnull=True)
+        .exclude(Exists(zone_links))
+        .values_list('email', flat=True)
+    )
+
+    if alert.zona_id is not None:
+        emails.update(active.filter(zonas=alert.zona_id).values_list('email', flat=True))
+
+    if has_location:
+        reach = (alert.radio_impacto or 0.0) + MAX_HOME_RADIO_M
+        dlat = reach / METERS_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(min(abs(alert.latitude) + dlat, 89.9))), 1e-6)
+        rows = list(
+            active.filter(
+                home_latitude__range=(alert.latitude - dlat, alert.latitude + dlat),
+                home_longitude__range=(alert.longitude - dlon, alert.longitude + dlon),
+            ).values_list('email', 'home_latitude', 'home_longitude', 'home_radio')
+        )
+        if rows:
+            row_emails, lats, lons, radios = zip(*rows)
+            distances = haversine_m(alert.latitude, alert.longitude, lats, lons)
+            limits = np.asarray(radios, dtype=float) + (alert.radio_impacto or 0.0)
+            emails.update(row_emails[i] for i in np.nonzero(distances <= limits)[0])
+
+    return sorted(emails)
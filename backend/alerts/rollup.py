@@ -0,0 +1,144 @@
+"""
+Resumen diario de alertas (AlertDailyStat).
+Cada alerta suma 1 en la fila de su clave (día local de fecha_hora, tipo, nivel, zona,
+activa). Las señales de Alert ajustan las filas al crear, editar o borrar; las altas
+masivas (bulk_create) suman por clave con `add_alerts`. Las consultas del dashboard
+leen estas filas: su costo depende de los días del rango, no de la cantidad de alertas.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Alert, AlertDailyStat
+
+ROLLUP_FIELDS = ('day', 'tipo_desastre', 'nivel_riesgo', 'zona', 'activa')
+REBUILD_BATCH_SIZE = 2000
+
+
+def rollup_key(fecha_hora, tipo_desastre, nivel_riesgo, zona_id, activa):
+    """Clave del resumen: el día es la fecha local, igual que TruncDate en las consultas."""
+    return (timezone.localdate(fecha_hora), tipo_desastre, nivel_riesgo, zona_id or 0, bool(activa))
+
+
+def alert_key(alert):
+    return rollup_key(alert.fecha_hora, alert.tipo_desastre, alert.nivel_riesgo, alert.zona_id, alert.activa)
+
+
+def bump(key, delta):
+    """Suma `delta` a la fila de `key`, creándola si no existe (llamar dentro de la transacción)."""
+    if not delta:
+        return
+    rows = dict(zip(ROLLUP_FIELDS, key))
+    if AlertDailyStat.objects.filter(**rows).update(total=F('total') + delta):
+        return
+    try:
+        with transaction.atomic():
+            AlertDailyStat.objects.create(total=delta, **rows)
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        AlertDailyStat.objects.filter(**rows).update(total=F('total') + delta)
+
+
+def apply_deltas(deltas):
+    """
+    Aplica un Counter {clave: delta}. Con varias claves: crea las filas que falten
+    (ignore_conflicts), las bloquea en orden de pk y las actualiza con bulk_update,
+    así el costo no crece con una sentencia por clave.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if len(deltas) <= 1:
+        for key, delta in deltas.items():
+            bump(key, delta)
+        return
+    with transaction.atomic():
+        AlertDailyStat.objects.bulk_create(
+            [AlertDailyStat(total=0, **dict(zip(ROLLUP_FIELDS, key))) for key in deltas],
+            ignore_conflicts=True, batch_size=REBUILD_BATCH_SIZE,
+        )
+        rows = AlertDailyStat.objects.select_for_update().filter(day__in={key[0] for key in deltas}).order_by('pk')
+        changed = []
+        for row in rows:
+            delta = deltas.get(tuple(getattr(row, field) for field in ROLLUP_FIELDS))
+            if delta:
+                row.total += delta
+                changed.append(row)
+        AlertDailyStat.objects.bulk_update(changed, ['total'], batch_size=REBUILD_BATCH_SIZE)
+
+
+def add_alerts(alerts):
+    """Suma al resumen alertas creadas sin señales (bulk_create)."""
+    apply_deltas(Counter(alert_key(alert) for alert in alerts))
+
+
+def _grouped(queryset):
+    """(clave, conteo) de un queryset de alertas, agrupado en la BD."""
+    return (
+        queryset.order_by()
+        .annotate(day=TruncDate('fecha_hora'), zona_key=Coalesce('zona_id', 0))
+        .values_list('day', 'tipo_desastre', 'nivel_riesgo', 'zona_key', 'activa')
+        .annotate(total=Count('id'))
+    )
+
+
+def remove_queryset(queryset):
+    """Resta del resumen las alertas del queryset (antes de borrarlas sin señales)."""
+    apply_deltas(Counter({tuple(row[:5]): -row[5] for row in _grouped(queryset)}))
+
+
+def merge_zone(zone_id):
+    """La zona se eliminó y sus alertas quedaron sin zona: mover sus conteos a zona 0."""
+    rows = list(AlertDailyStat.objects.filter(zona=zone_id).values_list(*ROLLUP_FIELDS, 'total'))
+    AlertDailyStat.objects.filter(zona=zone_id).delete()
+    apply_deltas(Counter({(day, tipo, nivel, 0, activa): total for day, tipo, nivel, _, activa, total in rows}))
+
+
+def rebuild(stdout=None):
+    """Recalcula el resumen completo desde las alertas (backfill o reparación)."""
+    with transaction.atomic():
+        AlertDailyStat.objects.all().delete()
+        batch = []
+        created = 0
+        for day, tipo, nivel, zona, activa, total in _grouped(Alert.objects.all()).iterator():
+            batch.append(AlertDailyStat(day=day, tipo_desastre=tipo, nivel_riesgo=nivel, zona=zona,
+                                        activa=activa, total=total))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                AlertDailyStat.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        AlertDailyStat.objects.bulk_create(batch)
+        created += len(batch)
+    if stdout is not None:
+        stdout.write(f'{created} filas de resumen')
+    return created
+
+
+def rows_in_range(desde=None, hasta=None):
+    rows = AlertDailyStat.objects.filter(total__gt=0)
+    if desde:
+        rows = rows.filter(day__gte=desde)
+    if hasta:
+        rows = rows.filter(day__lte=hasta)
+    return rows
+
+
+def grouped_counts(desde=None, hasta=None):
+    """(tipo, nivel, zona, activa, total) del rango de días, sumando las filas del resumen."""
+    return (
+        rows_in_range(desde, hasta).order_by()
+        .values_list('tipo_desastre', 'nivel_riesgo', 'zona', 'activa')
+        .annotate(count=Sum('total'))
+    )
+
+
+def trend_counts(days, desde=None, hasta=None):
+    """(día, total) desde el día de hace `days` días (días completos, fecha local)."""
+    since = timezone.localdate(timezone.now() - timedelta(days=days))
+    return (
+        rows_in_range(desde, hasta).filter(day__gte=since).order_by()
+        .values_list('day')
+        .annotate(count=Sum('total'))
+    )
@@ -5,6 +5,8 @@ GeoJSON construido desde lat/lon y JSON (sin GDAL/GEOS).
 from rest_framework import serializers
 from .models import Alert, Zone
 from .models import Subscriber
+from .geo import pick_lod
+from .recipients import MAX_HOME_RADIO_M
 
 
 class ZoneSerializer(serializers.ModelSerializer):
@@ -19,21 +21,52 @@ class ZoneSerializer(serializers.ModelSerializer):
         }
 
     def get_geometry_geojson(self, obj):
+        # Con `tolerancia` en el contexto se sirve el nivel de detalle precalculado
+        tolerance = self.context.get('tolerancia')
+        if tolerance is not None:
+            simplified = pick_lod(obj.geometry_lod, tolerance)
+            if simplified is not None:
+                return simplified
+            if hasattr(obj, 'geometry_fallback'):
+                # Sin niveles precalculados: la original ya vino anotada en el queryset
+                return obj.geometry_fallback
         return obj.geometry_json
 
 class SubscriberSerializer(serializers.ModelSerializer):
+    """Suscriptor; `zonas` y/o `home_latitude`/`home_longitude`/`home_radio` limitan las alertas recibidas."""
+    zonas = serializers.PrimaryKeyRelatedField(many=True, queryset=Zone.objects.all(), required=False)
+
     class Meta:
         model = Subscriber
-        fields = ['id', 'email', 'name', 'active', 'created_at']
+        fields = ['id', 'email', 'name', 'active', 'zonas', 'home_latitude', 'home_longitude', 'home_radio', 'created_at']
         read_only_fields = ['id', 'active', 'created_at']
 
+    def validate(self, attrs):
+        lat = attrs.get('home_latitude')
+        lon = attrs.get('home_longitude')
+        if (lat is None) != (lon is None):
+            raise serializers.ValidationError('home_latitude y home_longitude deben enviarse juntos')
+        if lat is not None and not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise serializers.ValidationError('Coordenadas fuera de rango')
+        radio = attrs.get('home_radio')
+        if radio is not None and not (0 < radio <= MAX_HOME_RADIO_M):
+            raise serializers.ValidationError(f'home_radio debe estar entre 0 y {int(MAX_HOME_RADIO_M)} metros')
+        return attrs
+
     def create(self, validated_data):
         # Crear o reactivar suscriptor por email
         email = validated_data.get('email')
-        obj, created = Subscriber.objects.update_or_create(
-            email=email,
-            defaults={'name': validated_data.get('name', ''), 'active': True}
-        )
+        zonas = validated_data.pop('zonas', [])
+        defaults = {
+            'name': validated_data.get('name', ''),
+            'active': True,
+            'home_latitude': validated_data.get('home_latitude'),
+            'home_longitude': validated_data.get('home_longitude'),
+        }
+        if 'home_radio' in validated_data:
+            defaults['home_radio'] = validated_data['home_radio']
+        obj, created = Subscriber.objects.update_or_create(email=email, defaults=defaults)
+        obj.zonas.set(zonas)
         return obj
 
 
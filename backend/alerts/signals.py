@@ -1,48 +1,106 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Alert, Subscriber, NotificationLog
-from .views import _send_alert_email
+from .models import Alert, Zone
+from .outbox import enqueue_alert
+from .zones import invalidate_zone_geometry, get_compiled_zone
+from .tiles import invalidate_bboxes_on_commit, alert_bbox
+from .geo import compile_geometry
+from .recipients import alert_recipients
+from .emails import forget_rendered_email
+from . import rollup, versions
+
+
+@receiver(pre_save, sender=Zone)
+def zone_pre_save(sender, instance, **kwargs):
+    """Recordar el bbox anterior para invalidar también las teselas que deja de cubrir."""
+    previous = get_compiled_zone(instance.pk) if instance.pk else None
+    instance._previous_tile_bbox = previous.geometry.bbox if previous and previous.geometry else None
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+def zone_changed(sender, instance, **kwargs):
+    """Descarta la geometría compilada y las teselas de la zona editada o eliminada."""
+    invalidate_zone_geometry(instance.pk)
+    current = compile_geometry(instance.geometry_json)
+    invalidate_bboxes_on_commit([getattr(instance, '_previous_tile_bbox', None), current.bbox if current else None])
+
+
+@receiver(post_delete, sender=Zone)
+def zone_deleted(sender, instance, **kwargs):
+    """Sus alertas quedaron sin zona (SET_NULL sin señales): mover sus conteos del resumen."""
+    rollup.merge_zone(instance.pk)
+
+
+@receiver(pre_save, sender=Alert)
+def alert_pre_save(sender, instance, **kwargs):
+    """Recordar la posición y la clave del resumen anteriores (teselas y AlertDailyStat)."""
+    previous = None
+    if instance.pk:
+        previous = Alert.objects.filter(pk=instance.pk).values(
+            'latitude', 'longitude', 'radio_impacto',
+            'fecha_hora', 'tipo_desastre', 'nivel_riesgo', 'zona_id', 'activa',
+        ).first()
+    instance._previous_tile_bbox = (
+        alert_bbox(previous['latitude'], previous['longitude'], previous['radio_impacto']) if previous else None
+    )
+    instance._previous_rollup_key = (
+        rollup.rollup_key(previous['fecha_hora'], previous['tipo_desastre'], previous['nivel_riesgo'],
+                          previous['zona_id'], previous['activa']) if previous else None
+    )
+
+
+@receiver(post_save, sender=Alert)
+def alert_rollup_saved(sender, instance, **kwargs):
+    """Mueve la alerta a la fila del resumen de su clave actual (si cambió)."""
+    previous = getattr(instance, '_previous_rollup_key', None)
+    current = rollup.alert_key(instance)
+    if previous != current:
+        if previous is not None:
+            rollup.bump(previous, -1)
+        rollup.bump(current, 1)
+
+
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def alert_tiles_changed(sender, instance, **kwargs):
+    """Invalida, al confirmarse, las teselas de la posición anterior y actual de la alerta."""
+    invalidate_bboxes_on_commit([
+        getattr(instance, '_previous_tile_bbox', None),
+        alert_bbox(instance.latitude, instance.longitude, instance.radio_impacto),
+    ])
+
+
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+def alert_data_changed(sender, instance, **kwargs):
+    """Nueva versión de los datos (estadísticas y teselas sin caché compartida) en la transacción del cambio."""
+    versions.bump_version()
 
 
 @receiver(post_save, sender=Alert)
 def alert_post_save(sender, instance, created, **kwargs):
-    """Cuando se crea una Alert activa, notificar a suscriptores globales.
+    """Cuando se crea una Alert activa, encolar un correo por suscriptor de su zona/área.
 
-    Este handler envía correos de forma síncrona. En producción recomendamos usar
-    una cola (Celery/RQ) para offload.
+    Los mensajes van a la outbox en la misma transacción que la alerta; el envío
+    lo hace `manage.py notification_worker`, así la petición no espera al proveedor.
     """
     # Solo al crear y si está activa
     if not created or not instance.activa:
         return
 
-    # Recolectar destinatarios activos
-    recipients = list(Subscriber.objects.filter(active=True).values_list('email', flat=True))
+    # Destinatarios activos cuya zona o punto de residencia coincide con la alerta
+    recipients = alert_recipients(instance)
     if not recipients:
         return
 
-    zona_nombre = instance.zona.nombre if instance.zona else 'Sin zona'
-
-    for recipient in recipients:
-        result = _send_alert_email(instance, recipient)
-
-        # Normalize
-        if isinstance(result, dict):
-            ok = bool(result.get('ok'))
-            provider = result.get('provider') or ''
-            provider_id = result.get('provider_id') or ''
-            provider_response = result.get('response') or ''
-        else:
-            ok = bool(result)
-            provider = ''
-            provider_id = ''
-            provider_response = str(result)
-
-        NotificationLog.objects.create(
-            alert=instance,
-            email_simulado=recipient,
-            zona_nombre=zona_nombre,
-            enviado_simulado=ok,
-            provider=provider,
-            provider_id=provider_id,
-            provider_response=provider_response
-        )
+    enqueue_alert(instance, recipients)
+
+
+@receiver(post_delete, sender=Alert)
+def alert_deleted(sender, instance, **kwargs):
+    """Libera el correo renderizado de la alerta eliminada y la resta del resumen."""
+    forget_rendered_email(instance.pk)
+    rollup.bump(rollup.alert_key(instance), -1)
@@ -0,0 +1,71 @@
+"""
+Estadísticas del dashboard.
+Los conteos salen del resumen diario (AlertDailyStat): una consulta agrupa el rango por
+(tipo, nivel, zona, activa) y otra por día para la tendencia; los gráficos y el resumen
+se suman en Python sobre esas pocas filas. El costo depende de los días del rango y no
+de la cantidad de alertas.
+"""
+from collections import Counter
+
+from . import rollup
+from .models import Zone
+from .serializers import AlertSerializer
+
+# Días de la tendencia del dashboard
+TREND_DAYS = 30
+# Zonas en el gráfico por zona
+TOP_ZONES = 10
+# Alertas en el feed de recientes
+RECENT_ALERTS = 5
+
+
+def _ranked(counter, key):
+    """[{key: valor, 'total': n}] de mayor a menor (empates por valor, orden estable)."""
+    return [{key: value, 'total': total} for value, total in sorted(counter.items(), key=lambda i: (-i[1], i[0]))]
+
+
+def summarize(groups, trend, zone_names):
+    """Arma el payload del dashboard (sin `alertas_recientes`) a partir de los grupos."""
+    por_tipo, por_nivel, por_zona = Counter(), Counter(), Counter()
+    total = activas = criticas = 0
+    for tipo, nivel, zona_id, activa, count in groups:
+        total += count
+        por_tipo[tipo] += count
+        por_nivel[nivel] += count
+        if zona_id in zone_names:
+            por_zona[zone_names[zona_id]] += count
+        if activa:
+            activas += count
+            if nivel == 'CRITICO':
+                criticas += count
+    return {
+        'resumen': {
+            'total_alertas': total,
+            'alertas_activas': activas,
+            'alertas_criticas': criticas,
+            'total_zonas': len(zone_names),
+        },
+        'por_tipo': _ranked(por_tipo, 'tipo_desastre'),
+        'por_nivel': _ranked(por_nivel, 'nivel_riesgo'),
+        'por_zona': _ranked(por_zona, 'zona__nombre')[:TOP_ZONES],
+        'tendencia': [{'date': day, 'total': count} for day, count in sorted(trend)],
+    }
+
+
+def recent_alerts(base_qs):
+    """Feed de recientes: recorre el índice de fecha_hora y se detiene en RECENT_ALERTS."""
+    return base_qs.select_related('zona').order_by('-fecha_hora')[:RECENT_ALERTS]
+
+
+def dashboard_statistics(base_qs, desde=None, hasta=None):
+    """
+    Payload completo de StatisticsView en cuatro consultas: grupos y tendencia desde el
+    resumen diario, nombres de zona (también da el total de zonas) y las alertas
+    recientes de `base_qs` con su zona.
+    """
+    zone_names = dict(Zone.objects.values_list('id', 'nombre'))
+    data = summarize(
+        rollup.grouped_counts(desde, hasta), rollup.trend_counts(TREND_DAYS, desde, hasta), zone_names
+    )
+    data['alertas_recientes'] = AlertSerializer(recent_alerts(base_qs), many=True).data
+    return data
@@ -0,0 +1,88 @@
+"""
+Caché de respuestas de /api/statistics/ y /api/analytics/.
+La clave combina los parámetros de la consulta, la fecha local (la tendencia depende
+del día) y la versión de los datos de alertas guardada en la base (`versions.py`), que
+cada alta, edición o baja incrementa en su transacción: un cambio hecho por cualquier
+proceso o worker deja sin uso las entradas anteriores, que vencen solas.
+La clave forma también el ETag, así una revalidación con If-None-Match responde 304
+con una lectura de la versión, sin calcular las estadísticas. Con la caché fría, solo
+una solicitud por clave recalcula (candado con cache.add); las demás esperan su resultado.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .versions import current_version
+
+# Tiempo máximo que se espera a otra solicitud que está recalculando la misma clave
+STATISTICS_LOCK_TIMEOUT = 30
+STATISTICS_POLL_INTERVAL = 0.05
+
+
+def cache_timeout():
+    """Vigencia de una entrada (solo libera memoria: la versión ya invalida las viejas)."""
+    return getattr(settings, 'STATISTICS_CACHE_TIMEOUT', 300)
+
+
+def statistics_key(name, params, version, today):
+    """Clave de la vista `name`: parámetros sin valores vacíos (orden fijo), versión y fecha local."""
+    normalized = {key: str(value) for key, value in sorted(params.items()) if value not in (None, '')}
+    digest = hashlib.sha256(json.dumps([name, normalized], separators=(',', ':')).encode()).hexdigest()
+    return f'statistics:{version}:{today.isoformat()}:{digest[:32]}'
+
+
+def etag_for(key):
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def get_or_compute(key, compute):
+    """
+    Estadísticas cacheadas en `key`, o `compute()` si faltan. Solo quien obtiene el
+    candado calcula; el resto sondea la caché hasta STATISTICS_LOCK_TIMEOUT y luego
+    calcula por su cuenta (quien tenía el candado falló o tardó demasiado).
+    """
+    data = cache.get(key)
+    if data is not None:
+        return data
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + STATISTICS_LOCK_TIMEOUT
+    while True:
+        if cache.add(lock, 1, STATISTICS_LOCK_TIMEOUT):
+            try:
+                data = compute()
+                cache.set(key, data, cache_timeout())
+                return data
+            finally:
+                cache.delete(lock)
+        time.sleep(STATISTICS_POLL_INTERVAL)
+        data = cache.get(key)
+        if data is not None:
+            return data
+        if time.monotonic() > deadline:
+            return compute()
+
+
+def cached_response(request, name, params, compute):
+    """
+    Respuesta de la vista `name` con ETag: 304 si el cliente ya tiene la versión actual,
+    si no los datos cacheados o `compute()`.
+    """
+    key = statistics_key(name, params, current_version(), timezone.localdate())
+    etag = etag_for(key)
+    if_none_match = request.headers.get('If-None-Match', '')
+    if if_none_match.strip() == '*' or etag in parse_etags(if_none_match):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(get_or_compute(key, compute))
+    response['ETag'] = etag
+    # Igual para todos los usuarios: cualquier caché puede guardarla, revalidando con If-None-Match
+    response['Cache-Control'] = 'public, no-cache'
+    return response
@@ -0,0 +1,489 @@
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import rollup
+from .classify import get_active_alert_index
+from .delivery import DeliveryEngine, bulk_results, set_engine
+from .exports import EXPORT_HEADERS, xlsx_response
+from .filters import AlertFilter
+from .imports import import_alerts
+from .models import (
+    DISASTER_TYPES, RISK_LEVELS, Alert, AlertDailyStat, ImportJob, NotificationJob, NotificationLog, NotificationOutbox, Subscriber,
+    Zone,
+)
+from .outbox import process_batch, reconcile_accepted
+from .query_plans import plan_cases, uses_index
+from .recipients import alert_recipients
+from .tiles import _cache_key, get_tile
+
+
+def local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+def rollup_totals():
+    """Filas del resumen diario con total distinto de cero: {clave: total}."""
+    return {tuple(row[:5]): row[5] for row in AlertDailyStat.objects.exclude(total=0)
+            .values_list(*rollup.ROLLUP_FIELDS, 'total')}
+
+
+def rebuilt_totals():
+    """Reconstruye el resumen desde las alertas (`rollup.rebuild()`) y devuelve sus filas."""
+    rollup.rebuild()
+    return rollup_totals()
+
+
+class DayRangeFilterTests(TestCase):
+    """`desde`/`hasta` incluyen el día completo en hora local (rango semiabierto)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.before = cls._alert(local(2023, 12, 31, 23, 59, 59))
+        cls.first = cls._alert(local(2024, 1, 1, 0, 0))
+        cls.last = cls._alert(local(2024, 1, 31, 23, 59, 59))
+        cls.after = cls._alert(local(2024, 2, 1, 0, 0))
+
+    @staticmethod
+    def _alert(fecha_hora):
+        return Alert.objects.create(
+            tipo_desastre='INUNDACION', nivel_riesgo='BAJO', activa=False, fecha_hora=fecha_hora,
+        )
+
+    def _filtered(self, params):
+        filterset = AlertFilter(params, queryset=Alert.objects.all())
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return set(filterset.qs.values_list('id', flat=True))
+
+    def test_hasta_includes_end_of_day(self):
+        ids = self._filtered({'hasta': '2024-01-31'})
+        self.assertIn(self.last.id, ids)
+        self.assertNotIn(self.after.id, ids)
+
+    def test_desde_starts_at_midnight(self):
+        ids = self._filtered({'desde': '2024-01-01'})
+        self.assertIn(self.first.id, ids)
+        self.assertNotIn(self.before.id, ids)
+
+    def test_desde_hasta_same_bounds(self):
+        ids = self._filtered({'desde': '2024-01-01', 'hasta': '2024-01-31'})
+        self.assertEqual(ids, {self.first.id, self.last.id})
+
+
+class AlertRecipientsTests(TestCase):
+    """Fan-out por zona y punto de residencia; los globales reciben todas las alertas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.zona = Zone.objects.create(nombre='Caracas')
+        Subscriber.objects.create(email='global@example.com')
+        Subscriber.objects.create(email='inactivo@example.com', active=False)
+        Subscriber.objects.create(email='zona@example.com').zonas.add(cls.zona)
+        Subscriber.objects.create(email='cerca@example.com', home_latitude=10.5, home_longitude=-66.9,
+                                  home_radio=1000)
+        Subscriber.objects.create(email='lejos@example.com', home_latitude=8.0, home_longitude=-63.0,
+                                  home_radio=1000)
+
+    def _alert(self, **fields):
+        return Alert(tipo_desastre='SISMO', nivel_riesgo='ALTO', **fields)
+
+    def test_unlocated_alert_reaches_global_subscribers(self):
+        self.assertEqual(alert_recipients(self._alert()), ['global@example.com'])
+
+    def test_zone_alert(self):
+        self.assertEqual(alert_recipients(self._alert(zona=self.zona)), ['global@example.com', 'zona@example.com'])
+
+    def test_point_alert_uses_impact_radius(self):
+        alert = self._alert(latitude=10.51, longitude=-66.9, radio_impacto=500)
+        self.assertEqual(alert_recipients(alert), ['cerca@example.com', 'global@example.com'])
+        alert.radio_impacto = 0
+        alert.latitude = 10.6
+        self.assertEqual(alert_recipients(alert), ['global@example.com'])
+
+
+class ActiveAlertIndexTests(TestCase):
+    """El índice de alertas activas se reutiliza mientras no cambie la versión de los datos."""
+
+    def _ids(self):
+        return {row['id'] for row in get_active_alert_index()[1]}
+
+    def test_reused_until_data_changes(self):
+        alert = Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', latitude=10.0, longitude=-66.0)
+        self.assertEqual(self._ids(), {alert.id})
+        with self.assertNumQueries(1):
+            get_active_alert_index()
+
+        alert.activa = False
+        alert.save()
+        self.assertEqual(self._ids(), set())
+
+
+class ZoneLodTests(TestCase):
+    """Con `?zoom=` las zonas sin niveles precalculados sirven la original sin consultas extra."""
+
+    @staticmethod
+    def _square(size):
+        return {'type': 'Polygon', 'coordinates': [[[0, 0], [size, 0], [size, size], [0, size], [0, 0]]]}
+
+    def test_lod_fallback_in_same_query(self):
+        tiny = Zone.objects.create(nombre='Diminuta', geometry_json=self._square(0.00003))
+        Zone.objects.create(nombre='Grande', geometry_json=self._square(1))
+        self.assertEqual(tiny.geometry_lod, {})
+        client = APIClient()
+        url = reverse('zone-list')
+        with self.assertNumQueries(2):
+            response = client.get(url, {'zoom': 5})
+        geometries = {zone['nombre']: zone['geometry_geojson'] for zone in response.data['results']}
+        self.assertEqual(geometries['Diminuta'], tiny.geometry_json)
+        self.assertIsNotNone(geometries['Grande'])
+
+        # Más zonas sin niveles no agregan consultas (antes, una por zona)
+        Zone.objects.create(nombre='Otra diminuta', geometry_json=self._square(0.00002))
+        with self.assertNumQueries(2):
+            client.get(url, {'zoom': 5})
+
+
+class TileCacheTests(TestCase):
+    """Con caché compartida, un cambio solo renueva las teselas que toca su bbox."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name,
+        }})
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    def _alert_ids(self, z, x, y):
+        features = json.loads(get_tile(z, x, y, 'geojson'))['features']
+        return {f['properties']['id'] for f in features if f['properties']['layer'] == 'alertas'}
+
+    def test_change_renews_only_touched_tiles(self):
+        first = Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', latitude=10.0, longitude=-66.0)
+        self.assertEqual(self._alert_ids(4, 5, 7), {first.id})
+        far_key = _cache_key('geojson', 4, 0, 0)
+        get_tile(4, 0, 0, 'geojson')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', latitude=10.0, longitude=-66.0)
+        self.assertEqual(self._alert_ids(4, 5, 7), {first.id, second.id})
+        self.assertEqual(_cache_key('geojson', 4, 0, 0), far_key)
+
+        # Mover la alerta renueva también las teselas de su posición anterior
+        with self.captureOnCommitCallbacks(execute=True):
+            second.latitude, second.longitude = -30.0, 120.0
+            second.save()
+        self.assertEqual(self._alert_ids(4, 5, 7), {first.id})
+
+
+class XlsxExportTests(TestCase):
+    """El XLSX sale en streaming (partes fijas primero) y se lee igual que uno de openpyxl."""
+
+    def test_streamed_workbook_round_trips(self):
+        from openpyxl import load_workbook
+
+        zona = Zone.objects.create(nombre='Zona <norte> & "sur"')
+        fecha_hora = local(2024, 3, 1, 8, 30)
+        Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', activa=False, zona=zona,
+                             fecha_hora=fecha_hora, descripcion='con\x01control', latitude=10.5, longitude=-66.9)
+        chunks = list(xlsx_response(Alert.objects.all()).streaming_content)
+        self.assertGreater(len(chunks), 1)
+
+        rows = list(load_workbook(io.BytesIO(b''.join(chunks))).active.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), EXPORT_HEADERS)
+        _, tipo, _, zona_nombre, exported_at, descripcion, latitude, _, _, activa = rows[1]
+        self.assertEqual((tipo, zona_nombre, descripcion, latitude, activa),
+                         ('Sismos', zona.nombre, 'concontrol', 10.5, 'No'))
+        self.assertEqual(exported_at, timezone.localtime(fecha_hora).replace(tzinfo=None))
+
+
+@override_settings(MAILERSEND_API_KEY='test', MAILERSEND_SIMULATE=True)
+class AlertOutboxTests(TestCase):
+    """Alta y edición por la API: outbox, resumen y versión se confirman junto con la alerta."""
+
+    def setUp(self):
+        previous = set_engine(DeliveryEngine())
+        self.addCleanup(set_engine, previous)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('admin'))
+        Subscriber.objects.create(email='global@example.com')
+
+    def test_created_alert_is_enqueued_and_delivered(self):
+        response = self.client.post(reverse('alert-list'), {'tipo_desastre': 'SISMO', 'nivel_riesgo': 'ALTO',
+                                                              'activa': True}, format='json')
+        self.assertEqual(response.status_code, 201)
+        message = NotificationOutbox.objects.get(alert_id=response.data['id'])
+        self.assertEqual((message.email, message.status), ('global@example.com', 'PENDIENTE'))
+
+        self.assertEqual(process_batch(100), (1, 0, 0, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'ENVIADO')
+        self.assertTrue(NotificationLog.objects.filter(alert_id=message.alert_id, email_simulado='global@example.com')
+                        .exists())
+
+    def test_failed_update_rolls_back_alert_and_rollup(self):
+        alert = Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', activa=False)
+        with mock.patch('alerts.signals.versions.bump_version', side_effect=RuntimeError('sin versión')):
+            with self.assertRaises(RuntimeError):
+                self.client.patch(reverse('alert-detail', args=[alert.pk]), {'nivel_riesgo': 'BAJO'}, format='json')
+        alert.refresh_from_db()
+        self.assertEqual(alert.nivel_riesgo, 'ALTO')
+        maintained = rollup_totals()
+        self.assertEqual(maintained, rebuilt_totals())
+
+
+class _BulkStatusEngine:
+    """Motor de prueba: solo responde el estado de los bulk-email."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def bulk_status(self, bulk_id):
+        return self.statuses[bulk_id]
+
+
+class BulkReconciliationTests(TestCase):
+    """Un 202 de bulk-email no es un envío: el estado del bulk decide cada destinatario."""
+
+    def test_bulk_results_maps_rejections_and_message_ids(self):
+        data = {
+            'id': 'b1', 'state': 'completed',
+            'validation_errors': {'message.1.to.0.email': ['The email must be valid.']},
+            'messages_id': ['m0', 'm2'],
+        }
+        first, second, third = bulk_results(data, [0, 1, 2])
+        self.assertEqual((first['ok'], first['provider_id']), (True, 'm0'))
+        self.assertEqual((second['ok'], second['retryable']), (False, False))
+        self.assertEqual((third['ok'], third['provider_id']), (True, 'm2'))
+        self.assertIsNone(bulk_results({'id': 'b1', 'state': 'sending'}, [0]))
+
+    def test_reconcile_accepted(self):
+        alert = Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', activa=False)
+        for n, email in enumerate(['a@example.com', 'b@example.com']):
+            NotificationOutbox.objects.create(alert=alert, email=email, status='ACEPTADO', provider_ref='b1',
+                                              provider_index=n, sent_at=timezone.now())
+        NotificationOutbox.objects.create(alert=alert, email='c@example.com', status='ACEPTADO',
+                                          provider_ref='b2', provider_index=0, sent_at=timezone.now())
+        engine = _BulkStatusEngine({
+            'b1': {'id': 'b1', 'state': 'completed', 'messages_id': ['m1'],
+                   'suppressed_recipients': {'message.0': {'to': [{'email': 'a@example.com'}]}}},
+            'b2': {'id': 'b2', 'state': 'sending'},
+        })
+        previous = set_engine(engine)
+        self.addCleanup(set_engine, previous)
+
+        self.assertEqual(reconcile_accepted(100), (1, 1, 0))
+        statuses = dict(NotificationOutbox.objects.values_list('email', 'status'))
+        self.assertEqual(statuses, {'a@example.com': 'FALLIDO', 'b@example.com': 'ENVIADO', 'c@example.com': 'ACEPTADO'})
+        self.assertEqual(NotificationLog.objects.get(email_simulado='b@example.com').provider_id, 'm1')
+        # El bulk aún en proceso no se vuelve a consultar antes del intervalo
+        self.assertEqual(reconcile_accepted(100), (0, 0, 0))
+
+
+class NotificationJobPollingTests(TestCase):
+    """El progreso se consulta por polling: `Retry-After` mientras corre y cursor incremental."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('operador'))
+        alert = Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', activa=False)
+        self.job = NotificationJob.objects.create(status='EN_CURSO', total=2)
+        self.first, self.second = (
+            NotificationOutbox.objects.create(alert=alert, job=self.job, email=email)
+            for email in ('a@example.com', 'b@example.com')
+        )
+
+    def _finish(self, message):
+        # Finalizado hace más que el margen con que la vista espera a las transacciones abiertas
+        NotificationOutbox.objects.filter(pk=message.pk).update(
+            status='ENVIADO', updated_at=timezone.now() - timedelta(minutes=1),
+        )
+
+    def _get(self, **params):
+        return self.client.get(reverse('notifications-job', args=[self.job.pk]), params)
+
+    def test_poll_with_cursor_until_done(self):
+        self._finish(self.first)
+        response = self._get(cursor='')
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual([r['email'] for r in response.data['results']], ['a@example.com'])
+        cursor = response.data['cursor']
+        self.assertEqual(self._get(cursor=cursor).data['results'], [])
+
+        self._finish(self.second)
+        response = self._get(cursor=cursor)
+        self.assertEqual(response.data['status'], 'COMPLETADO')
+        self.assertNotIn('Retry-After', response)
+        self.assertEqual([r['email'] for r in response.data['results']], ['b@example.com'])
+        self.assertEqual(self._get(cursor='x').status_code, 400)
+
+
+class RollupMaintenanceTests(TestCase):
+    """Cada camino de escritura deja AlertDailyStat igual que `rollup.rebuild()`."""
+
+    def setUp(self):
+        self.norte = Zone.objects.create(nombre='Norte')
+        self.sur = Zone.objects.create(nombre='Sur')
+
+    def assertMatchesRebuild(self):
+        maintained = rollup_totals()
+        self.assertEqual(maintained, rebuilt_totals())
+
+    def test_create_edit_and_delete(self):
+        alert = Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', zona=self.norte, activa=False,
+                                     fecha_hora=local(2024, 1, 1, 23, 30))
+        Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', zona=self.norte, activa=False,
+                             fecha_hora=local(2024, 1, 1, 8, 0))
+        self.assertMatchesRebuild()
+        edits = [
+            ('día (cruza medianoche local)', {'fecha_hora': local(2024, 1, 2, 0, 30)}),
+            ('zona', {'zona': self.sur}),
+            ('sin zona', {'zona': None}),
+            ('activa', {'activa': True}),
+            ('tipo y nivel', {'tipo_desastre': 'INUNDACION', 'nivel_riesgo': 'BAJO'}),
+        ]
+        for label, fields in edits:
+            with self.subTest(label):
+                for name, value in fields.items():
+                    setattr(alert, name, value)
+                alert.save()
+                self.assertMatchesRebuild()
+        alert.delete()
+        self.assertMatchesRebuild()
+
+    def test_bulk_import(self):
+        import pandas as pd
+
+        Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', activa=False)
+        df = pd.DataFrame({
+            'Tipo': ['SISMO', 'INUNDACION', 'SISMO'], 'Nivel': ['ALTO', 'BAJO', 'ALTO'],
+            'Descripcion': ['a', 'b', 'c'], 'Latitud': [10.0, 11.0, 12.0], 'Longitud': [-66.0, -67.0, -68.0],
+        })
+        alert_ids, errors, _ = import_alerts(df)
+        self.assertEqual((len(alert_ids), errors), (3, []))
+        self.assertMatchesRebuild()
+
+    def test_zone_delete_moves_counts_to_no_zone(self):
+        for zona in (self.norte, self.norte, self.sur, None):
+            Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', zona=zona, activa=False,
+                                 fecha_hora=local(2024, 5, 1, 12, 0))
+        self.norte.delete()
+        self.assertEqual(Alert.objects.filter(zona__isnull=True).count(), 3)
+        self.assertMatchesRebuild()
+
+
+class ExportCacheTests(TestCase):
+    """La exportación se cachea por filtros y versión de los datos; cualquier cambio la renueva."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache_dir = override_settings(EXPORT_CACHE_DIR=directory.name)
+        cache_dir.enable()
+        self.addCleanup(cache_dir.disable)
+        self.client = APIClient()
+        Alert.objects.create(tipo_desastre='SISMO', nivel_riesgo='ALTO', activa=False, descripcion='primera')
+
+    def _export(self, **headers):
+        response = self.client.get(reverse('alerts-export'), {'format': 'csv', 'tipo_desastre': 'SISMO'}, **headers)
+        content = b''.join(response.streaming_content) if response.status_code == 200 else b''
+        return response, content
+
+    def test_hit_costs_one_query_until_data_changes(self):
+        first, content = self._export()
+        etag = first['ETag']
+        # Acierto: solo se lee la versión de los datos y se sirve el archivo guardado
+        with self.assertNumQueries(1):
+            cached, cached_content = self._export()
+        self.assertEqual((cached['ETag'], cached_content), (etag, content))
+        self.assertEqual(self._export(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+
+        # Una edición (no solo un alta) cambia la versión y con ella la clave
+        alert = Alert.objects.get()
+        alert.descripcion = 'editada'
+        alert.save()
+        changed, changed_content = self._export(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertIn(b'editada', changed_content)
+
+
+class ImportJobUploadTests(TestCase):
+    """El ImportJob solo se crea con un archivo válido; si no, no queda archivo ni trabajo."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.upload_dir = directory.name
+        uploads = override_settings(IMPORT_UPLOAD_DIR=self.upload_dir)
+        uploads.enable()
+        self.addCleanup(uploads.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('importador'))
+
+    def _post(self, name, content):
+        return self.client.post(reverse('alerts-import-jobs'), {'file': SimpleUploadedFile(name, content)},
+                                format='multipart')
+
+    def test_valid_file_creates_pending_job(self):
+        response = self._post('alertas.csv', b'Tipo,Nivel,Descripcion,Latitud,Longitud\nSISMO,ALTO,x,10,-66\n')
+        self.assertEqual(response.status_code, 202)
+        job = ImportJob.objects.get(pk=response.data['job_id'])
+        self.assertEqual((job.status, job.total_rows), ('PENDIENTE', 1))
+        self.assertTrue(os.path.exists(job.path))
+
+    def test_invalid_files_leave_no_job_or_file(self):
+        for name, content in (('faltan.csv', b'Tipo,Nivel\nSISMO,ALTO\n'), ('roto.xlsx', b'no es un xlsx')):
+            with self.subTest(name=name):
+                self.assertEqual(self._post(name, content).status_code, 400)
+                self.assertFalse(ImportJob.objects.exists())
+                self.assertEqual(os.listdir(self.upload_dir), [])
+
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN del listado, las estadísticas y la exportación sobre una tabla sembrada (con
+    estadísticas del planificador): cada consulta debe recorrer su índice, no otro.
+    """
+    SEED_ALERTS = 20000
+    SEED_DAYS = 730
+
+    @classmethod
+    def setUpTestData(cls):
+        # Los valores que filtran los casos (SISMO, CRITICO, la primera zona, activas, el
+        # último mes) son ~2-5 % de las filas, como en producción: así el índice conviene
+        zones = [Zone.objects.create(nombre=f'Zona {n}') for n in range(20)]
+        tipos = [key for key, _ in DISASTER_TYPES if key != 'SISMO']
+        niveles = [key for key, _ in RISK_LEVELS if key != 'CRITICO']
+        now = timezone.now()
+        Alert.objects.bulk_create([
+            Alert(
+                tipo_desastre='SISMO' if n % 50 == 0 else tipos[n % len(tipos)],
+                nivel_riesgo='CRITICO' if n % 50 == 1 else niveles[n % len(niveles)],
+                zona=zones[0] if n % 50 == 2 else zones[1 + n % (len(zones) - 1)],
+                activa=n % 20 == 0,
+                fecha_hora=now - timedelta(minutes=n * cls.SEED_DAYS * 1440 // cls.SEED_ALERTS),
+            )
+            for n in range(cls.SEED_ALERTS)
+        ], batch_size=2000)
+        rollup.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_queries_use_their_index(self):
+        for case in plan_cases():
+            with self.subTest(case.name):
+                plan = case.queryset.explain()
+                self.assertTrue(uses_index(plan, case.index), f'{case.name}: no usa {case.index}\n{plan}')
@@ -0,0 +1,347 @@
+"""
+Teselas web-mercator (z/x/y) con alertas, círculos de impacto y zonas recortadas.
+Las teselas renderizadas se guardan en la caché de Django. Con una caché compartida
+(Redis) cada tesela tiene su propia versión en la caché y un cambio de una Alert o Zone
+renueva solo las teselas que tocan su bbox anterior y el nuevo, al confirmarse. Con la
+caché de cada proceso la clave lleva la versión global de los datos (`versions.py`,
+guardada en la base): así un cambio hecho en otro proceso también se ve.
+"""
+import json
+import math
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from .geo import (
+    METERS_PER_DEGREE, PROXIMITY_TOLERANCE_M, ZONE_LOD_TOLERANCES, haversine_m, pick_lod, tolerance_for_zoom,
+)
+from .models import Alert, Zone
+from .versions import current_version
+from .zones import get_compiled_zones, with_lod_fallback
+
+MAX_ZOOM = 22
+# Solo se cachean teselas hasta este zoom (las de zoom mayor son muchas y se piden poco)
+TILE_CACHE_MAX_ZOOM = 14
+TILE_FORMATS = ('geojson', 'mvt')
+MVT_EXTENT = 4096
+# Margen de recorte alrededor de la tesela (fracción del ancho) para evitar costuras
+TILE_BUFFER = 1 / 64
+MERCATOR_MAX_LAT = 85.0511287798
+EARTH_HALF_CIRCUMFERENCE_M = 20037508.342789244
+CIRCLE_SEGMENTS = 32
+# Generación de la caché compartida: forma parte de cada clave, cambiarla invalida todas
+TILE_GENERATION_KEY = 'tiles:generation'
+# Por encima de estas teselas, una invalidación cambia de generación en vez de versionar cada una
+TILE_INVALIDATE_MAX_TILES = 20000
+# Backends cuyo contenido no ven los demás procesos
+LOCAL_CACHE_BACKENDS = ('LocMemCache', 'DummyCache')
+
+
+def tile_bounds(z, x, y):
+    """(min_lon, min_lat, max_lon, max_lat) de la tesela z/x/y."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def tile_range(bbox, z):
+    """Rango (x0, x1, y0, y1) de teselas en el zoom z que toca el bbox."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    n = 2 ** z
+
+    def col(lon):
+        return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+    def row(lat):
+        lat = max(-MERCATOR_MAX_LAT, min(MERCATOR_MAX_LAT, lat))
+        r = math.radians(lat)
+        return min(n - 1, max(0, int((1 - math.asinh(math.tan(r)) / math.pi) / 2 * n)))
+
+    return col(min_lon), col(max_lon), row(max_lat), row(min_lat)
+
+
+def alert_bbox(lat, lon, radius_m):
+    """bbox del círculo de impacto de una alerta (None si no está geolocalizada)."""
+    if lat is None or lon is None:
+        return None
+    reach = (radius_m or 0.0) + PROXIMITY_TOLERANCE_M
+    dlat = reach / METERS_PER_DEGREE
+    dlon = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+
+def shared_cache():
+    """La caché por defecto la comparten todos los procesos (p. ej. Redis)."""
+    return not settings.CACHES['default']['BACKEND'].endswith(LOCAL_CACHE_BACKENDS)
+
+
+def _tile_version_key(z, x, y):
+    return f'tiles:version:{z}:{x}:{y}'
+
+
+def _tile_versions(z, x, y):
+    """
+    (generación, versión de la tesela) en la caché compartida. Si una falta (nunca
+    se invalidó o se desalojó) se crea con un valor nuevo: nunca reaparece una vieja.
+    """
+    keys = [TILE_GENERATION_KEY, _tile_version_key(z, x, y)]
+    found = cache.get_many(keys)
+    return tuple(found[key] if key in found else cache.get_or_set(key, time.time_ns, None) for key in keys)
+
+
+def _cache_key(fmt, z, x, y):
+    if shared_cache():
+        generation, version = _tile_versions(z, x, y)
+        return f'tiles:{generation}:{version}:{fmt}:{z}:{x}:{y}'
+    return f'tiles:{current_version()}:{fmt}:{z}:{x}:{y}'
+
+
+def invalidate_bboxes(bboxes):
+    """
+    Renueva la versión de las teselas (zooms cacheados) que tocan los bbox. Si son más
+    de TILE_INVALIDATE_MAX_TILES (p. ej. una importación masiva o una zona enorme) se
+    cambia de generación: todas quedan obsoletas de una vez y las viejas vencen solas.
+    Sin caché compartida no hace falta: las claves llevan la versión global de los datos.
+    """
+    if not shared_cache():
+        return
+    tiles = set()
+    for bbox in bboxes:
+        if bbox is None:
+            continue
+        for z in range(TILE_CACHE_MAX_ZOOM + 1):
+            x0, x1, y0, y1 = tile_range(bbox, z)
+            if len(tiles) + (x1 - x0 + 1) * (y1 - y0 + 1) > TILE_INVALIDATE_MAX_TILES:
+                cache.set(TILE_GENERATION_KEY, time.time_ns(), None)
+                return
+            tiles.update((z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    if tiles:
+        version = time.time_ns()
+        cache.set_many({_tile_version_key(*tile): version for tile in tiles}, None)
+
+
+def invalidate_bboxes_on_commit(bboxes):
+    """
+    Invalida las teselas de los bbox cuando confirma la transacción en curso: antes, una
+    solicitud concurrente volvería a cachear los datos viejos con la versión nueva.
+    """
+    bboxes = [bbox for bbox in bboxes if bbox is not None]
+    if bboxes:
+        transaction.on_commit(lambda: invalidate_bboxes(bboxes))
+
+
+def _bbox_intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _clip_ring(ring, bbox):
+    """Recorte Sutherland–Hodgman de un anillo contra el rectángulo bbox."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    edges = (
+        (lambda p: p[0] >= min_lon, lambda a, b: _cross_x(a, b, min_lon)),
+        (lambda p: p[0] <= max_lon, lambda a, b: _cross_x(a, b, max_lon)),
+        (lambda p: p[1] >= min_lat, lambda a, b: _cross_y(a, b, min_lat)),
+        (lambda p: p[1] <= max_lat, lambda a, b: _cross_y(a, b, max_lat)),
+    )
+    points = [tuple(p[:2]) for p in ring[:-1]] if ring and ring[0] == ring[-1] else [tuple(p[:2]) for p in ring]
+    for inside, cross in edges:
+        if not points:
+            break
+        output = []
+        prev = points[-1]
+        for cur in points:
+            if inside(cur):
+                if not inside(prev):
+                    output.append(cross(prev, cur))
+                output.append(cur)
+            elif inside(prev):
+                output.append(cross(prev, cur))
+            prev = cur
+        points = output
+    if len(points) < 3:
+        return None
+    return [list(p) for p in points] + [list(points[0])]
+
+
+def _cross_x(a, b, x):
+    t = (x - a[0]) / (b[0] - a[0])
+    return x, a[1] + t * (b[1] - a[1])
+
+
+def _cross_y(a, b, y):
+    t = (y - a[1]) / (b[1] - a[1])
+    return a[0] + t * (b[0] - a[0]), y
+
+
+def _clip_geometry(geojson, bbox):
+    """Polygon/MultiPolygon recortado al bbox (None si queda vacío)."""
+    if not isinstance(geojson, dict) or geojson.get('type') not in ('Polygon', 'MultiPolygon'):
+        return None
+    polygons = [geojson['coordinates']] if geojson['type'] == 'Polygon' else geojson['coordinates']
+    clipped = []
+    for polygon in polygons:
+        if not polygon:
+            continue
+        outer = _clip_ring(polygon[0], bbox)
+        if outer is None:
+            continue
+        holes = [h for h in (_clip_ring(r, bbox) for r in polygon[1:]) if h is not None]
+        clipped.append([outer] + holes)
+    if not clipped:
+        return None
+    if len(clipped) == 1:
+        return {'type': 'Polygon', 'coordinates': clipped[0]}
+    return {'type': 'MultiPolygon', 'coordinates': clipped}
+
+
+def _circle_ring(lat, lon, radius_m):
+    angles = np.linspace(0, 2 * np.pi, CIRCLE_SEGMENTS, endpoint=False)
+    dlat = radius_m / METERS_PER_DEGREE
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    ring = np.column_stack([lon + np.cos(angles) * dlon, lat + np.sin(angles) * dlat]).tolist()
+    return ring + [ring[0]]
+
+
+def render_tile(z, x, y):
+    """Capas {'zonas', 'alertas', 'impactos'} (listas de features GeoJSON) de la tesela."""
+    bounds = tile_bounds(z, x, y)
+    pad_lon = (bounds[2] - bounds[0]) * TILE_BUFFER
+    pad_lat = (bounds[3] - bounds[1]) * TILE_BUFFER
+    clip_box = (bounds[0] - pad_lon, bounds[1] - pad_lat, bounds[2] + pad_lon, bounds[3] + pad_lat)
+
+    # Zonas: prefiltro por bbox compilado y geometría del nivel de detalle del zoom
+    zone_ids = [zc.id for zc in get_compiled_zones()
+                if zc.geometry is not None and _bbox_intersects(zc.geometry.bbox, clip_box)]
+    zonas = []
+    if zone_ids:
+        tolerance = tolerance_for_zoom(z)
+        use_lod = tolerance >= min(ZONE_LOD_TOLERANCES)
+        zones = Zone.objects.filter(pk__in=zone_ids)
+        if use_lod:
+            # Las zonas sin niveles precalculados traen la original en la misma consulta
+            zones = with_lod_fallback(zones.only('id', 'nombre', 'codigo', 'geometry_lod'))
+        else:
+            zones = zones.only('id', 'nombre', 'codigo', 'geometry_json')
+        for zone in zones:
+            geometry = (
+                pick_lod(zone.geometry_lod, tolerance) or zone.geometry_fallback if use_lod else zone.geometry_json
+            )
+            geometry = _clip_geometry(geometry, clip_box)
+            if geometry is not None:
+                zonas.append({
+                    'type': 'Feature',
+                    'geometry': geometry,
+                    'properties': {'id': zone.id, 'nombre': zone.nombre, 'codigo': zone.codigo},
+                })
+
+    # Alertas activas: candidatas por rango lat/lon ampliado con el radio máximo
+    alertas = []
+    impactos = []
+    active = Alert.objects.filter(activa=True, latitude__isnull=False, longitude__isnull=False)
+    max_radius = active.aggregate(m=Max('radio_impacto'))['m'] or 0.0
+    pad_lat = (max_radius + PROXIMITY_TOLERANCE_M) / METERS_PER_DEGREE
+    edge_lat = min(max(abs(bounds[1]), abs(bounds[3])) + pad_lat, 89.9)
+    pad_lon = pad_lat / max(math.cos(math.radians(edge_lat)), 1e-6)
+    rows = list(
+        active.filter(
+            latitude__range=(bounds[1] - pad_lat, bounds[3] + pad_lat),
+            longitude__range=(bounds[0] - pad_lon, bounds[2] + pad_lon),
+        ).order_by().values('id', 'tipo_desastre', 'nivel_riesgo', 'zona_id', 'latitude', 'longitude', 'radio_impacto')
+    )
+    if rows:
+        lats = np.array([r['latitude'] for r in rows])
+        lons = np.array([r['longitude'] for r in rows])
+        radii = np.nan_to_num(np.array([r['radio_impacto'] for r in rows], dtype=float), nan=0.0)
+        # Distancia del centro al punto más cercano de la tesela
+        near_lat = np.clip(lats, bounds[1], bounds[3])
+        near_lon = np.clip(lons, bounds[0], bounds[2])
+        distances = haversine_m(lats, lons, near_lat, near_lon)
+        for i in np.nonzero(distances <= radii + PROXIMITY_TOLERANCE_M)[0]:
+            r = rows[i]
+            properties = {
+                'id': r['id'], 'tipo_desastre': r['tipo_desastre'], 'nivel_riesgo': r['nivel_riesgo'],
+                'zona_id': r['zona_id'], 'radio_impacto': float(radii[i]),
+            }
+            if bounds[0] <= r['longitude'] <= bounds[2] and bounds[1] <= r['latitude'] <= bounds[3]:
+                alertas.append({
+                    'type': 'Feature',
+                    'geometry': {'type': 'Point', 'coordinates': [r['longitude'], r['latitude']]},
+                    'properties': properties,
+                })
+            if radii[i] > 0:
+                circle = _clip_geometry(
+                    {'type': 'Polygon', 'coordinates': [_circle_ring(r['latitude'], r['longitude'], radii[i])]},
+                    clip_box,
+                )
+                if circle is not None:
+                    impactos.append({'type': 'Feature', 'geometry': circle, 'properties': properties})
+
+    return {'zonas': zonas, 'alertas': alertas, 'impactos': impactos}
+
+
+def _encode_geojson(layers):
+    features = []
+    for name, layer in layers.items():
+        for feature in layer:
+            features.append({**feature, 'properties': {**feature['properties'], 'layer': name}})
+    return json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':')).encode()
+
+
+def _to_mercator(coords):
+    """Proyecta recursivamente coordenadas lon/lat a metros web-mercator."""
+    if coords and isinstance(coords[0], (int, float)):
+        lon, lat = coords[0], max(-MERCATOR_MAX_LAT, min(MERCATOR_MAX_LAT, coords[1]))
+        return [
+            lon * EARTH_HALF_CIRCUMFERENCE_M / 180.0,
+            math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) * EARTH_HALF_CIRCUMFERENCE_M / math.pi,
+        ]
+    return [_to_mercator(c) for c in coords]
+
+
+def _encode_mvt(layers, z, x, y):
+    import mapbox_vector_tile
+    from shapely.geometry import shape
+
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+    (west, south), (east, north) = _to_mercator([[min_lon, min_lat], [max_lon, max_lat]])
+    encoded_layers = [
+        {
+            'name': name,
+            'features': [
+                {
+                    'geometry': shape({'type': f['geometry']['type'],
+                                       'coordinates': _to_mercator(f['geometry']['coordinates'])}),
+                    'properties': {k: v for k, v in f['properties'].items() if v is not None},
+                }
+                for f in layer
+            ],
+        }
+        for name, layer in layers.items()
+    ]
+    return mapbox_vector_tile.encode(
+        encoded_layers,
+        default_options={'quantize_bounds': (west, south, east, north), 'extents': MVT_EXTENT},
+    )
+
+
+def get_tile(z, x, y, fmt):
+    """Bytes de la tesela en el formato pedido, desde la caché si está disponible."""
+    cacheable = z <= TILE_CACHE_MAX_ZOOM
+    if cacheable:
+        key = _cache_key(fmt, z, x, y)
+        data = cache.get(key)
+        if data is not None:
+            return data
+    layers = render_tile(z, x, y)
+    data = _encode_mvt(layers, z, x, y) if fmt == 'mvt' else _encode_geojson(layers)
+    if cacheable:
+        # Las versiones viejas quedan sin uso; el vencimiento solo libera memoria
+        cache.set(key, data, getattr(settings, 'TILE_CACHE_TIMEOUT', 60 * 60 * 24))
+    return data
@@ -15,9 +15,15 @@ router.register(r'subscribers', views.SubscriberViewSet, basename='subscriber')
 urlpatterns = [
     path('alerts/export/', views.AlertExportView.as_view(), name='alerts-export'),
     path('alerts/import/', views.AlertImportView.as_view(), name='alerts-import'),
+    path('alerts/import/jobs/', views.AlertImportJobView.as_view(), name='alerts-import-jobs'),
+    path('alerts/import/jobs/<int:pk>/', views.AlertImportJobStatusView.as_view(), name='alerts-import-job'),
+    path('tiles/<int:z>/<int:x>/<int:y>.<str:fmt>', views.TileView.as_view(), name='tiles'),
+    path('points/classify/', views.PointClassifyView.as_view(), name='points-classify'),
     path('statistics/', views.StatisticsView.as_view(), name='statistics'),
+    path('analytics/', views.AnalyticsView.as_view(), name='analytics'),
     path('weather/', views.WeatherProxyView.as_view(), name='weather'),
     path('notifications/simulate/', views.SimulateNotificationsView.as_view(), name='notifications-simulate'),
+    path('notifications/jobs/<int:pk>/', views.NotificationJobView.as_view(), name='notifications-job'),
     path('api-token-auth/', obtain_auth_token, name='api_token_auth'),
     path('', include(router.urls)),
 ]
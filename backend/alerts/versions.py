@@ -0,0 +1,29 @@
+"""
+Versión de los datos de alertas y zonas, guardada en la base (DataVersion).
+Las cachés por proceso (estadísticas, teselas) la incluyen en sus claves: un cambio
+hecho por cualquier proceso o worker la incrementa en su propia transacción, y al
+confirmarse todas las claves anteriores quedan sin uso en todos los procesos.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+ALERT_DATA = 'alertas'
+
+
+def current_version(name=ALERT_DATA):
+    """Versión confirmada actual (una lectura por clave primaria)."""
+    return DataVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+def bump_version(name=ALERT_DATA):
+    """Incrementa la versión dentro de la transacción en curso (llamar junto al cambio)."""
+    if DataVersion.objects.filter(name=name).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(name=name, version=1)
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        DataVersion.objects.filter(name=name).update(version=F('version') + 1)
@@ -8,112 +8,45 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import ValidationError
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import MultiPartParser, JSONParser
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.reverse import reverse
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
 from django.http import HttpResponse
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
-import io
+from django.utils.http import parse_etags
+from datetime import datetime, timedelta, timezone as dt_timezone
 import requests
-import json
 
-from .models import Alert, Zone, NotificationLog
+from .models import Alert, Zone, ImportJob, NotificationJob
 from .serializers import AlertSerializer, ZoneSerializer, SubscriberSerializer
 from .models import Subscriber
 from .filters import AlertFilter
-from django.conf import settings
-from mailersend import MailerSendClient, EmailBuilder
-import smtplib
-from email.message import EmailMessage
-import os
+from .geo import proximity_cells, covering_mask, tolerance_for_zoom, ZONE_LOD_TOLERANCES
+from .zones import get_compiled_zone, resolve_zone_id, with_lod_fallback
+from .classify import classify_points
+from .parsers import NDJSONParser
+from .tiles import get_tile, MAX_ZOOM
+from .delivery import get_engine
+from .outbox import backlog_exceeded
+from .jobs import finished_messages_since, job_progress, job_result
+from .exports import EXPORT_FORMATS
+from .statistics import dashboard_statistics
+from . import statistics_cache, versions
+from .analytics import BUCKETS, MAX_CELL_DEGREES, MIN_CELL_DEGREES, TooManyCells, analytics
+from .export_cache import cached_response, etag_for, export_key, store_response
+from .imports import (
+    REQUIRED_COLUMNS, InvalidImportFile, create_import_job, import_alerts, import_progress, missing_columns,
+    read_upload, upload_format,
+)
 
 def _send_alert_email(alert, recipient_email):
-    """Envía un correo real usando MailerSend."""
-    api_key = getattr(settings, 'MAILERSEND_API_KEY', None)
-    sender_email = getattr(settings, 'MAILERSEND_SENDER', 'info@trial-z3m5yelyy9oldpyo.mlsender.net')
-    
-    if not api_key:
-        return False
-    subject = f"⚠️ ALERTA: {alert.get_tipo_desastre_display()} - {alert.get_nivel_riesgo_display()}"
-
-    html_content = f"""
-    <div style="font-family: sans-serif; border: 1px solid #eee; padding: 20px; border-radius: 10px;">
-        <h2 style="color: #e11d48;">Aviso de Emergencia</h2>
-        <p>Se ha detectado un evento de <strong>{alert.get_tipo_desastre_display()}</strong> en su zona.</p>
-        <p><strong>Nivel de Riesgo:</strong> {alert.get_nivel_riesgo_display()}</p>
-        <p><strong>Descripción:</strong> {alert.descripcion or 'Sin descripción disponible'}</p>
-        <hr style="border: 0; border-top: 1px solid #eee; margin: 20px 0;">
-        <p style="font-size: 12px; color: #666;">Por favor, siga los protocolos de defensa civil y manténgase a resguardo.</p>
-    </div>
-    """
-
-    text_content = f"ALERTA: {alert.get_tipo_desastre_display()} - {alert.get_nivel_riesgo_display()}\n\n{alert.descripcion or ''}"
-
-    # Support simulation mode
-    try:
-        if getattr(settings, 'MAILERSEND_SIMULATE', False):
-            # Simulate sending
-            info = {
-                'ok': True,
-                'provider': 'simulate',
-                'provider_id': None,
-                'response': 'simulated'
-            }
-            return info
-
-        ms = MailerSendClient(api_key)
-        email = (
-            EmailBuilder()
-            .from_email(sender_email, "SAT - Alerta Temprana")
-            .to_many([{"email": recipient_email, "name": "Usuario de Riesgo"}])
-            .subject(subject)
-            .html(html_content)
-            .text(text_content)
-            .build()
-        )
-        resp = ms.emails.send(email)
-        # Try to extract an id if present
-        provider_id = None
-        try:
-            if isinstance(resp, dict):
-                provider_id = resp.get('data') or resp.get('message_id') or resp.get('id')
-        except Exception:
-            provider_id = None
-
-        return {'ok': True, 'provider': 'mailersend_api', 'provider_id': provider_id, 'response': str(resp)}
-    except Exception as e:
-        err_str = str(e)
-        print(f"Error enviando correo via API MailerSend: {err_str}")
-
-        # Fallback: intentar envío por SMTP si hay credenciales en env
-        smtp_host = os.environ.get('SMTP_HOST')
-        smtp_port = int(os.environ.get('SMTP_PORT', '587')) if os.environ.get('SMTP_PORT') else None
-        smtp_user = os.environ.get('SMTP_USER')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
-
-        if smtp_host and smtp_user and smtp_password:
-            try:
-                msg = EmailMessage()
-                msg['Subject'] = subject
-                msg['From'] = sender_email
-                msg['To'] = recipient_email
-                msg.set_content(text_content)
-                msg.add_alternative(html_content, subtype='html')
-
-                # Conexión TLS
-                smtp_port = smtp_port or 587
-                with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
-                    server.starttls()
-                    server.login(smtp_user, smtp_password)
-                    server.send_message(msg)
-                return {'ok': True, 'provider': 'smtp', 'provider_id': None, 'response': 'smtp_ok'}
-            except Exception as se:
-                print(f"Error enviando correo via SMTP fallback: {se}")
-                return {'ok': False, 'provider': 'smtp', 'provider_id': None, 'response': str(se)}
-
-        return {'ok': False, 'provider': 'mailersend_api', 'provider_id': None, 'response': err_str}
+    """Envía un correo real usando MailerSend (fallback SMTP) con el motor compartido."""
+    return get_engine().send(alert, recipient_email)
 
 
 def _lat_lon_from_request(data):
@@ -128,37 +61,6 @@ def _lat_lon_from_request(data):
     return None, None
 
 
-def _is_point_in_polygon(lat, lon, polygon_geojson):
-    """
-    Algoritmo de ray-casting estándar (Horizontal Ray Casting).
-    Determina si el punto (lat, lon) está dentro del polígono.
-    """
-    if not polygon_geojson or polygon_geojson.get('type') != 'Polygon':
-        return True
-    
-    try:
-        coords = polygon_geojson['coordinates'][0]
-        n = len(coords)
-        inside = False
-
-        # El algoritmo usa X como Longitud e Y como Latitud
-        x, y = lon, lat
-        
-        for i in range(n):
-            p1x, p1y = coords[i]
-            p2x, p2y = coords[(i + 1) % n]
-            
-            # Verificar si el rayo horizontal cruza el segmento
-            # p1y > y != p2y > y asegura que el punto Y esté entre p1y y p2y
-            if ((p1y > y) != (p2y > y)) and \
-               (x < (p2x - p1x) * (y - p1y) / (p2y - p1y) + p1x):
-                inside = not inside
-                
-        return inside
-    except Exception:
-        return True
-
-
 class AlertViewSet(viewsets.ModelViewSet):
     """CRUD de alertas. Listado público; create/update/delete requieren autenticación."""
     queryset = Alert.objects.select_related('zona').all()
@@ -167,7 +69,7 @@ class AlertViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
 
     def get_permissions(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'nearby'):
             return [AllowAny()]
         return [IsAuthenticated()]
 
@@ -181,39 +83,51 @@ class AlertViewSet(viewsets.ModelViewSet):
         if not zona_id or zona_id == '':
             return
         try:
-            zona = Zone.objects.get(pk=zona_id)
-            if zona.geometry_json:
-                if not _is_point_in_polygon(lat, lon, zona.geometry_json):
-                    raise ValidationError({
-                        'non_field_errors': [f"Las coordenadas ({lat}, {lon}) están fuera de los límites de la zona '{zona.nombre}'."]
-                    })
-        except (Zone.DoesNotExist, ValueError):
-            pass
+            zona = get_compiled_zone(int(zona_id))
+        except (TypeError, ValueError):
+            return
+        # Sin geometría válida (o zona inexistente) no hay límites contra los que validar
+        if zona is None or zona.geometry is None:
+            return
+        if not zona.geometry.contains(lat, lon):
+            raise ValidationError({
+                'non_field_errors': [f"Las coordenadas ({lat}, {lon}) están fuera de los límites de la zona '{zona.nombre}'."]
+            })
 
+    def _auto_zone(self, lat, lon):
+        """Zona que contiene el punto según el índice de zonas (None si ninguna)."""
+        zone_id = resolve_zone_id(lat, lon)
+        return Zone.objects.filter(pk=zone_id).first() if zone_id else None
+
+    @transaction.atomic
     def perform_create(self, serializer):
+        # Alerta y outbox de notificaciones (signal) se guardan en la misma transacción
         # Extraer lat/lon del request para validación
         lat, lon = _lat_lon_from_request(self.request.data)
         if lat is None: lat = self.request.data.get('latitude')
         if lon is None: lon = self.request.data.get('longitude')
         
         zona_id = self.request.data.get('zona')
+        save_kwargs = {}
         
-        # Si se proporcionan coordenadas, validar contra la zona
+        # Si se proporcionan coordenadas, validar contra la zona elegida o asignarla por ubicación
         if lat is not None and lon is not None:
             try:
-                self._validate_zone_bounds(float(lat), float(lon), zona_id)
+                # Coordenadas (también si vinieron como GeoJSON 'point') en el mismo save():
+                # post_save elige los destinatarios por ubicación y save() calcula geo_cell
+                save_kwargs['latitude'], save_kwargs['longitude'] = float(lat), float(lon)
+                if zona_id:
+                    self._validate_zone_bounds(float(lat), float(lon), zona_id)
+                else:
+                    save_kwargs['zona'] = self._auto_zone(float(lat), float(lon))
             except (TypeError, ValueError):
                 pass
         
-        instance = serializer.save()
-        
-        # Asegurar que si vino por GeoJSON 'point', se guarden en los campos Float
-        if lat is not None and lon is not None:
-            instance.latitude = float(lat)
-            instance.longitude = float(lon)
-            instance.save(update_fields=['latitude', 'longitude'])
+        serializer.save(**save_kwargs)
 
+    @transaction.atomic
     def perform_update(self, serializer):
+        # Alerta, resumen diario y versión de los datos (signals) en la misma transacción
         # Intentar extraer nuevas coordenadas del request
         lat, lon = _lat_lon_from_request(self.request.data)
         if lat is None: lat = self.request.data.get('latitude')
@@ -225,29 +139,77 @@ class AlertViewSet(viewsets.ModelViewSet):
         
         # Obtener zona (nueva del request o actual)
         zona_id = self.request.data.get('zona', serializer.instance.zona_id)
+        save_kwargs = {}
         
         if lat is not None and lon is not None:
             try:
-                self._validate_zone_bounds(float(lat), float(lon), zona_id)
+                if 'zona' in self.request.data and zona_id:
+                    self._validate_zone_bounds(float(lat), float(lon), zona_id)
+                else:
+                    # Conservar la zona actual si aún contiene el punto; si no, reasignar
+                    current = get_compiled_zone(int(zona_id)) if zona_id else None
+                    if current is None or (current.geometry is not None
+                                            and not current.geometry.contains(float(lat), float(lon))):
+                        save_kwargs['zona'] = self._auto_zone(float(lat), float(lon))
             except (TypeError, ValueError):
                 pass
 
-        instance = serializer.save()
-        
-        # Si se envió un nuevo 'point', actualizar campos Float
+        # Si se envió un nuevo 'point', guardar sus coordenadas en el mismo save()
         if 'point' in self.request.data or 'latitude' in self.request.data:
             new_lat, new_lon = _lat_lon_from_request(self.request.data)
             if new_lat is None: new_lat = self.request.data.get('latitude')
             if new_lon is None: new_lon = self.request.data.get('longitude')
             
             if new_lat is not None and new_lon is not None:
-                instance.latitude = float(new_lat)
-                instance.longitude = float(new_lon)
-                instance.save(update_fields=['latitude', 'longitude'])
+                try:
+                    save_kwargs['latitude'], save_kwargs['longitude'] = float(new_lat), float(new_lon)
+                except (TypeError, ValueError):
+                    pass
+
+        serializer.save(**save_kwargs)
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Alertas activas cuyo círculo de impacto cubre el punto (lat, lon).
+
+        Candidatas por celdas geohash (índice `geo_cell`) y luego haversine en bloque.
+        Query params: ?lat=10.2&lon=-67.6
+        """
+        try:
+            lat = float(request.query_params.get('lat'))
+            lon = float(request.query_params.get('lon'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Parámetros lat y lon requeridos'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return Response({'error': 'Coordenadas fuera de rango'}, status=status.HTTP_400_BAD_REQUEST)
+
+        candidates = list(
+            Alert.objects.filter(activa=True, geo_cell__in=proximity_cells(lat, lon))
+            .values_list('id', 'latitude', 'longitude', 'radio_impacto')
+        )
+        if not candidates:
+            return Response([])
+
+        ids, lats, lons, radii = zip(*candidates)
+        mask, distances = covering_mask(lat, lon, lats, lons, radii)
+        distance_by_id = {ids[i]: float(distances[i]) for i in mask.nonzero()[0]}
+
+        alerts = sorted(
+            Alert.objects.select_related('zona').filter(id__in=distance_by_id.keys()),
+            key=lambda a: distance_by_id[a.id]
+        )
+        data = self.get_serializer(alerts, many=True).data
+        for item in data:
+            item['distancia_m'] = round(distance_by_id[item['id']], 1)
+        return Response(data)
 
 
 class ZoneViewSet(viewsets.ModelViewSet):
-    """CRUD completo de zonas. Solo lectura para anónimos, CRUD para admin."""
+    """CRUD completo de zonas. Solo lectura para anónimos, CRUD para admin.
+
+    `list`/`retrieve` aceptan `?zoom=<0-22>` o `?tolerancia=<grados>` para recibir
+    la geometría simplificada precalculada en lugar de la resolución completa.
+    """
     queryset = Zone.objects.all()
     serializer_class = ZoneSerializer
 
@@ -256,6 +218,37 @@ class ZoneViewSet(viewsets.ModelViewSet):
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    def _lod_tolerance(self):
+        """Tolerancia pedida, o None si no se pidió o es más fina que el nivel más detallado."""
+        if self.action not in ('list', 'retrieve'):
+            return None
+        params = self.request.query_params
+        try:
+            if params.get('tolerancia') not in (None, ''):
+                tolerance = float(params['tolerancia'])
+            elif params.get('zoom') not in (None, ''):
+                tolerance = tolerance_for_zoom(min(max(int(params['zoom']), 0), 22))
+            else:
+                return None
+        except ValueError:
+            raise ValidationError({'error': 'zoom/tolerancia inválidos'})
+        return tolerance if tolerance >= min(ZONE_LOD_TOLERANCES) else None
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        # Leer (y parsear) solo la versión de la geometría que se va a servir; la original
+        # viene en la misma consulta solo para las zonas sin niveles precalculados
+        if self._lod_tolerance() is not None:
+            qs = with_lod_fallback(qs.defer('geometry_json'))
+        elif self.action in ('list', 'retrieve'):
+            qs = qs.defer('geometry_lod')
+        return qs
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['tolerancia'] = self._lod_tolerance()
+        return context
+
 
 class SubscriberViewSet(viewsets.ModelViewSet):
     """ViewSet para gestionar suscriptores globales.
@@ -289,102 +282,201 @@ class SubscriberViewSet(viewsets.ModelViewSet):
             return Response({'error': 'suscriptor no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class AlertExportView(APIView):
-    """Exportar alertas a Excel (.xlsx). Público."""
+class PointClassifyView(APIView):
+    """Clasificación en bloque de puntos GPS: zona y alertas activas que cubren cada punto. Público.
+
+    Body JSON: [{"id": "fix-1", "lat": 10.2, "lon": -67.6}, ...] (o {"points": [...]}),
+    o NDJSON (Content-Type: application/x-ndjson) con un punto por línea.
+    """
     permission_classes = [AllowAny]
+    parser_classes = [JSONParser, NDJSONParser]
+    MAX_POINTS = 50000
 
-    def get(self, request):
+    def post(self, request):
+        points = request.data.get('points') if isinstance(request.data, dict) else request.data
+        if not isinstance(points, list):
+            return Response({'error': 'Se esperaba una lista de puntos'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(points) > self.MAX_POINTS:
+            return Response(
+                {'error': f'Máximo {self.MAX_POINTS} puntos por solicitud'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        lats = []
+        lons = []
+        errors = {}
+        for i, p in enumerate(points):
+            try:
+                lat, lon = float(p['lat']), float(p['lon'])
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    raise ValueError
+            except (KeyError, TypeError, ValueError):
+                lat = lon = float('nan')
+                errors[i] = 'lat/lon inválidos'
+            lats.append(lat)
+            lons.append(lon)
+
+        zone_ids, alert_ids, zonas, alertas = classify_points(lats, lons)
+
+        results = []
+        for i, p in enumerate(points):
+            point_id = p.get('id', i) if isinstance(p, dict) else i
+            if i in errors:
+                results.append({'id': point_id, 'error': errors[i]})
+                continue
+            results.append({
+                'id': point_id,
+                'lat': lats[i],
+                'lon': lons[i],
+                'zona': zone_ids[i],
+                'alertas': alert_ids[i],
+            })
+
+        return Response({
+            'total': len(results),
+            'results': results,
+            'zonas': zonas,
+            'alertas': alertas,
+        })
+
+
+class TileView(APIView):
+    """Tesela web-mercator z/x/y con zonas recortadas, alertas activas y círculos de impacto. Público.
+
+    Formatos: `.geojson` (FeatureCollection con propiedad `layer`) o `.mvt`/`.pbf`
+    (Mapbox Vector Tile; requiere mapbox-vector-tile instalado).
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, z, x, y, fmt):
+        fmt = 'mvt' if fmt in ('mvt', 'pbf') else fmt
+        if fmt not in ('geojson', 'mvt'):
+            return Response({'error': 'Formato no soportado (geojson, mvt)'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return Response({'error': 'Tesela fuera de rango'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            import pandas as pd
+            data = get_tile(z, x, y, fmt)
         except ImportError:
             return Response(
-                {'error': 'pandas no instalado'},
+                {'error': 'mapbox-vector-tile no instalado'},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
-        queryset = Alert.objects.select_related('zona').all().order_by('-fecha_hora')
-        # Aplicar filtros opcionales
-        desde = request.query_params.get('desde')
-        hasta = request.query_params.get('hasta')
-        if desde:
-            queryset = queryset.filter(fecha_hora__date__gte=desde)
-        if hasta:
-            queryset = queryset.filter(fecha_hora__date__lte=hasta)
-        data = []
-        for a in queryset:
-            data.append({
-                'ID': a.id,
-                'Tipo': a.get_tipo_desastre_display(),
-                'Nivel riesgo': a.get_nivel_riesgo_display(),
-                'Zona': a.zona.nombre if a.zona else '',
-                'Fecha y hora': timezone.localtime(a.fecha_hora).replace(tzinfo=None),
-                'Descripción': a.descripcion or '',
-                'Latitud': a.latitude,
-                'Longitud': a.longitude,
-                'Radio (m)': a.radio_impacto,
-                'Activa': 'Sí' if a.activa else 'No',
-            })
-        df = pd.DataFrame(data)
-        output = io.BytesIO()
-        df.to_excel(output, index=False, engine='openpyxl')
-        output.seek(0)
-        response = HttpResponse(
-            output.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename=alertas.xlsx'
+        content_type = 'application/vnd.mapbox-vector-tile' if fmt == 'mvt' else 'application/geo+json'
+        return HttpResponse(data, content_type=content_type)
+
+
+class AlertExportView(APIView):
+    """
+    Exportar alertas en streaming. Público.
+    ?format=xlsx (por defecto) | csv | ndjson | geojson | arrow | parquet
+    Admite los mismos filtros que el listado (desde, hasta, zona, tipo_desastre, nivel_riesgo, activas).
+    Los archivos se cachean en disco por filtros y versión de los datos; responde con
+    ETag y 304 si coincide con If-None-Match.
+    """
+    permission_classes = [AllowAny]
+
+    def perform_content_negotiation(self, request, force=False):
+        # `format` elige el archivo a generar, no un renderer de DRF
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        fmt = request.query_params.get('format', 'xlsx').lower()
+        build_response = EXPORT_FORMATS.get(fmt)
+        if build_response is None:
+            return Response(
+                {'error': f"Formato no soportado. Opciones: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        filterset = AlertFilter(request.query_params, queryset=Alert.objects.order_by('-fecha_hora'))
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        key = export_key(fmt, filterset.form.cleaned_data, versions.current_version())
+        etag = etag_for(key)
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match.strip() == '*' or etag in parse_etags(if_none_match):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = cached_response(key, fmt)
+            if response is None:
+                try:
+                    response = store_response(build_response(filterset.qs), key, fmt)
+                except ImportError as e:
+                    return Response(
+                        {'error': f'{e.name or "dependencia"} no instalado'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE
+                    )
+        response['ETag'] = etag
+        # El cliente puede guardar el archivo pero debe revalidarlo con If-None-Match
+        response['Cache-Control'] = 'no-cache'
         return response
 
 
 class StatisticsView(APIView):
-    """Estadísticas para el dashboard: por tipo, por nivel, por zona, tendencia temporal."""
+    """
+    Estadísticas para el dashboard: por tipo, por nivel, por zona, tendencia temporal.
+    Cacheadas por `desde`/`hasta` y versión de los datos; responde con ETag y 304 si
+    coincide con If-None-Match.
+    """
     permission_classes = [AllowAny]
 
     def get(self, request):
-        base_qs = Alert.objects.all()
-
-        desde = request.query_params.get('desde')
-        hasta = request.query_params.get('hasta')
-        if desde:
-            base_qs = base_qs.filter(fecha_hora__date__gte=desde)
-        if hasta:
-            base_qs = base_qs.filter(fecha_hora__date__lte=hasta)
-
-        por_tipo = list(base_qs.values('tipo_desastre').annotate(total=Count('id')).order_by('-total'))
-        por_nivel = list(base_qs.values('nivel_riesgo').annotate(total=Count('id')).order_by('-total'))
-        por_zona = list(
-            base_qs.filter(zona__isnull=False)
-            .values('zona__nombre')
-            .annotate(total=Count('id'))
-            .order_by('-total')[:10]
+        # Solo el rango de fechas del listado (los demás filtros no aplican al dashboard)
+        filterset = AlertFilter(
+            {name: request.query_params[name] for name in ('desde', 'hasta') if name in request.query_params},
+            queryset=Alert.objects.all(),
         )
-
-        hace_30 = timezone.now() - timedelta(days=30)
-        tendencia = list(
-            base_qs.filter(fecha_hora__gte=hace_30)
-            .annotate(date=TruncDate('fecha_hora'))
-            .values('date')
-            .annotate(total=Count('id'))
-            .order_by('date')
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        base_qs = filterset.qs
+        desde = filterset.form.cleaned_data.get('desde')
+        hasta = filterset.form.cleaned_data.get('hasta')
+
+        return statistics_cache.cached_response(
+            request, 'statistics', {'desde': desde, 'hasta': hasta},
+            lambda: dashboard_statistics(base_qs, desde, hasta),
         )
-        # Resumen general
-        resumen = {
-            'total_alertas': base_qs.count(),
-            'alertas_activas': base_qs.filter(activa=True).count(),
-            'alertas_criticas': base_qs.filter(nivel_riesgo='CRITICO', activa=True).count(),
-            'total_zonas': Zone.objects.count()
-        }
 
-        # Alertas recientes para el feed
-        alertas_recientes = AlertSerializer(base_qs.order_by('-fecha_hora')[:5], many=True).data
 
-        return Response({
-            'resumen': resumen,
-            'por_tipo': por_tipo,
-            'por_nivel': por_nivel,
-            'por_zona': por_zona,
-            'tendencia': tendencia,
-            'alertas_recientes': alertas_recientes
-        })
+class AnalyticsView(APIView):
+    """
+    Analítica de alertas: conteos por periodo y, opcionalmente, por celda de una grilla lat/lon.
+    ?bucket=hour|day|week|month (por defecto day), filtros del listado (desde, hasta, zona,
+    tipo_desastre, nivel_riesgo, activas) y ?celda=<grados> para la grilla.
+    Cacheada por parámetros y versión de los datos, con ETag como /api/statistics/.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            return Response(
+                {'error': f"bucket no soportado. Opciones: {', '.join(BUCKETS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        cell = None
+        if request.query_params.get('celda'):
+            try:
+                cell = float(request.query_params['celda'])
+            except ValueError:
+                cell = -1.0
+            if not MIN_CELL_DEGREES <= cell <= MAX_CELL_DEGREES:
+                return Response(
+                    {'error': f'celda debe ser un número de grados entre {MIN_CELL_DEGREES} y {MAX_CELL_DEGREES}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        filterset = AlertFilter(request.query_params, queryset=Alert.objects.order_by())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        filters = filterset.form.cleaned_data
+        try:
+            return statistics_cache.cached_response(
+                request, 'analytics', {**filters, 'bucket': bucket, 'celda': cell},
+                lambda: analytics(filterset.qs, filters, bucket, cell),
+            )
+        except TooManyCells as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class WeatherProxyView(APIView):
@@ -412,140 +504,180 @@ class WeatherProxyView(APIView):
 
 
 class SimulateNotificationsView(APIView):
-    """Simula el envío de notificaciones para alertas activas: registra en NotificationLog (sin envío real)."""
+    """
+    Encola el envío de notificaciones de todas las alertas activas como un trabajo
+    asíncrono y responde de inmediato con su id (lo procesa `notification_worker`).
+    """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        alertas = Alert.objects.filter(activa=True).select_related('zona')
-        created = []
-
-        # Recolectar suscriptores activos (suscripción global)
-        subscribers = list(Subscriber.objects.filter(active=True).values('email', 'name'))
-
-        # Si se pasó un email en el request, también lo incluimos (pero no duplicar)
-        request_email = request.data.get('email')
-
-        # Construir la lista de destinatarios (deduplicada)
-        recipients = []
-        for s in subscribers:
-            recipients.append(s['email'])
-        if request_email:
-            recipients.append(request_email)
-        # Deduplicar manteniendo orden
-        seen = set()
-        recipients = [r for r in recipients if not (r in seen or seen.add(r))]
-
-        if not recipients:
-            # Fallback a un correo de ejemplo si no hay suscriptores ni email
-            recipients = ['tu_correo@ejemplo.com']
-
-        for alert in alertas:
-            zona_nombre = alert.zona.nombre if alert.zona else 'Sin zona'
-
-            for recipient in recipients:
-                enviado = _send_alert_email(alert, recipient)
-
-                # Normalize result: puede ser bool (antiguo) o dict (nuevo)
-                if isinstance(enviado, dict):
-                    ok = bool(enviado.get('ok'))
-                    provider = enviado.get('provider')
-                    provider_id = enviado.get('provider_id')
-                    provider_response = enviado.get('response')
-                else:
-                    ok = bool(enviado)
-                    provider = None
-                    provider_id = None
-                    provider_response = str(enviado)
-
-                log = NotificationLog.objects.create(
-                    alert=alert,
-                    email_simulado=recipient,
-                    zona_nombre=zona_nombre,
-                    enviado_simulado=ok,
-                    provider=provider or '',
-                    provider_id=provider_id or '',
-                    provider_response=provider_response or ''
-                )
-                created.append({
-                    'alert_id': alert.id,
-                    'log_id': log.id,
-                    'zona': zona_nombre,
-                    'email': recipient,
-                    'estado_envio': 'Exitoso' if ok else f'Fallido ({provider or "error"})'
-                })
+        if backlog_exceeded():
+            # Backpressure: la cola de envíos está saturada, reintentar más tarde
+            return Response(
+                {'error': 'La cola de notificaciones está saturada, intente más tarde'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '60'}
+            )
 
+        # Si se pasó un email en el request, también se incluye (sin duplicar)
+        email = request.data.get('email') or ''
+        try:
+            if email:
+                validate_email(email)
+        except DjangoValidationError:
+            return Response({'error': 'Email inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = NotificationJob.objects.create(created_by=request.user, email=email)
         return Response({
-            'message': 'Proceso de notificación finalizado',
-            'detalles': created
-        })
+            'message': 'Notificación en proceso',
+            'job_id': job.pk,
+            'status': job.status,
+            'status_url': reverse('notifications-job', args=[job.pk], request=request),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class NotificationJobView(APIView):
+    """
+    Progreso de un trabajo de notificación y resultados por destinatario (paginados).
+    Con `?cursor=` devuelve solo los destinatarios finalizados después del cursor y el
+    cursor siguiente. Mientras el trabajo sigue en curso responde con `Retry-After`:
+    el cliente vuelve a consultar pasado ese intervalo.
+    """
+    permission_classes = [IsAuthenticated]
+    # Filas finalizadas hace menos de esto se devuelven en la consulta siguiente
+    SETTLE = timedelta(seconds=2)
+    RESULTS_PER_POLL = 500
+
+    def get(self, request, pk):
+        from django.conf import settings
+        job = get_object_or_404(NotificationJob, pk=pk)
+        progress = job_progress(job)
+        done = job.status in ('COMPLETADO', 'FALLIDO')
+        if 'cursor' in request.query_params:
+            data = {**progress, **self._since_cursor(job, request.query_params['cursor'], done)}
+        else:
+            paginator = PageNumberPagination()
+            page = paginator.paginate_queryset(job.mensajes.order_by('id'), request, view=self)
+            data = {
+                **progress,
+                'count': paginator.page.paginator.count,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                'results': [job_result(m) for m in page],
+            }
+        response = Response(data)
+        if not done:
+            response['Retry-After'] = str(getattr(settings, 'NOTIFICATION_JOB_POLL_INTERVAL', 2))
+        return response
+
+    def _since_cursor(self, job, raw_cursor, done):
+        cursor = (None, 0)
+        if raw_cursor:
+            # Cursor "<updated_at en µs desde epoch>-<id>": seguro en la URL sin codificar
+            micros, _, msg_id = raw_cursor.partition('-')
+            try:
+                cursor = (CURSOR_EPOCH + timedelta(microseconds=int(micros)), int(msg_id))
+            except (ValueError, OverflowError):
+                raise ValidationError({'cursor': 'Cursor inválido'})
+        until = None if done else timezone.now() - self.SETTLE
+        messages = list(finished_messages_since(job, *cursor, until=until)[:self.RESULTS_PER_POLL])
+        if messages:
+            last = messages[-1]
+            raw_cursor = f"{(last.updated_at - CURSOR_EPOCH) // timedelta(microseconds=1)}-{last.id}"
+        return {'cursor': raw_cursor, 'results': [job_result(m) for m in messages]}
 
 
 class AlertImportView(APIView):
-    """Importar alertas desde archivo Excel (.xlsx). Autenticado (Admin)."""
+    """
+    Importar alertas desde archivo Excel (.xlsx) o CSV. Autenticado (Admin).
+    Validación por columnas, inserción por lotes en una transacción y un único
+    trabajo de notificación para todas las alertas importadas.
+    Para archivos grandes usar `alerts/import/jobs/` (en segundo plano, por lotes).
+    """
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser]
 
     def post(self, request):
         file = request.FILES.get('file')
         if not file:
-             return Response({'error': 'No se proporcionó ningún archivo'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            import pandas as pd
-            df = pd.read_excel(file)
-            
-            # Validar columnas mínimas
-            required_cols = ['Tipo', 'Nivel', 'Descripcion', 'Latitud', 'Longitud']
-            if not all(col in df.columns for col in required_cols):
-                return Response(
-                    {'error': f'Formato inválido. Columnas requeridas: {", ".join(required_cols)}'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            return Response({'error': 'No se proporcionó ningún archivo'}, status=status.HTTP_400_BAD_REQUEST)
 
-            created_count = 0
-            errors = []
-            
-            # Mapeo de valores de display a claves del modelo (ej "INUNDACION" -> "INUNDACION")
-            # Asumimos que el Excel trae las claves en mayúsculas (INUNDACION, INCENDIO, etc.) o display
-            # Para simplificar, intentaremos mapear exacto o default a OTROS
-            
-            for index, row in df.iterrows():
-                try:
-                    # Parsear datos básicos
-                    tipo = str(row['Tipo']).upper()
-                    nivel = str(row['Nivel']).upper()
-                    
-                    # Validar opciones (simplificado)
-                    valid_types = [c[0] for c in Alert.TIPO_DESASTRE_CHOICES]
-                    if tipo not in valid_types:
-                        tipo = 'OTROS'
-                        
-                    valid_levels = [c[0] for c in Alert.NIVEL_RIESGO_CHOICES]
-                    if nivel not in valid_levels:
-                        nivel = 'BAJO'
-
-                    Alert.objects.create(
-                        tipo_desastre=tipo,
-                        nivel_riesgo=nivel,
-                        descripcion=row['Descripcion'],
-                        latitude=float(row['Latitud']),
-                        longitude=float(row['Longitud']),
-                        radio_impacto=float(row.get('Radio', 1000)), # Default 1km
-                        activa=True, # Por defecto activas al importar
-                        # Zona opcional: para hacerlo robusto habría que buscar la zona por nombre o coordenadas
-                        # Por ahora dejamos zona en null o buscamos por intersección automática si existiera esa lógica
-                    )
-                    created_count += 1
-                except Exception as e:
-                    errors.append(f"Fila {index + 2}: {str(e)}")
-            
-            return Response({
-                'message': f'Proceso completado. {created_count} alertas creadas.',
-                'created': created_count, 
-                'errors': errors
-            })
-            
+        fmt = upload_format(file.name)
+        if fmt is None:
+            return Response({'error': 'Formato no soportado. Use .xlsx o .csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            import pandas  # noqa: F401
         except ImportError:
             return Response({'error': 'Librería pandas no instalada en el servidor'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        try:
+            df = read_upload(file, fmt)
+        except Exception as e:
+            return Response({'error': f'Error procesando archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Validar columnas mínimas
+        missing = missing_columns(df)
+        if missing:
+            return Response(
+                {'error': f'Formato inválido. Columnas requeridas: {", ".join(REQUIRED_COLUMNS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        created_ids, errors, job = import_alerts(df, user=request.user)
+        data = {
+            'message': f'Proceso completado. {len(created_ids)} alertas creadas.',
+            'created': len(created_ids),
+            'errors': errors,
+        }
+        if job is not None:
+            data['job_id'] = job.pk
+            data['status_url'] = reverse('notifications-job', args=[job.pk], request=request)
+        return Response(data)
+
+
+class AlertImportJobView(APIView):
+    """
+    Importación en segundo plano para archivos grandes (.xlsx o .csv). El archivo se
+    guarda en disco y `import_worker` lo procesa por lotes con checkpoint; responde
+    202 con el id del trabajo.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        file = request.FILES.get('file')
+        if not file:
+            return Response({'error': 'No se proporcionó ningún archivo'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = upload_format(file.name)
+        if fmt is None:
+            return Response({'error': 'Formato no soportado. Use .xlsx o .csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            job = create_import_job(file, fmt, user=request.user)
+        except ImportError:
+            return Response({'error': 'Librería pandas/openpyxl no instalada en el servidor'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except InvalidImportFile as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-             return Response({'error': f'Error procesando archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'error': f'Error procesando archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'message': 'Importación en proceso',
+            'job_id': job.pk,
+            'status': job.status,
+            'total_rows': job.total_rows,
+            'status_url': reverse('alerts-import-job', args=[job.pk], request=request),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class AlertImportJobStatusView(APIView):
+    """Avance de una importación en segundo plano (filas confirmadas, creadas, errores)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ImportJob, pk=pk)
+        return Response(import_progress(job))
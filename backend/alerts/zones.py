@@ -0,0 +1,175 @@
+"""
+Caché de geometrías de zona compiladas e índice para resolver la zona de un punto.
+Cada Zone.geometry_json se compila una sola vez por versión (updated_at) y proceso.
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+from django.db.models import Case, F, JSONField, Value, When
+
+from .geo import compile_geometry, group_by_cell
+from .models import Zone
+
+CompiledZone = namedtuple('CompiledZone', ['id', 'nombre', 'updated_at', 'geometry'])
+
+# Zonas cuyo bbox tocaría más celdas que esto se prueban contra todos los puntos
+_MAX_CELLS_PER_ZONE = 4096
+
+# zone_id -> CompiledZone
+_compiled_zones = {}
+
+
+def invalidate_zone_geometry(zone_id):
+    """Descarta la geometría compilada de una zona (llamado desde signals al guardar/borrar)."""
+    _compiled_zones.pop(zone_id, None)
+
+
+def with_lod_fallback(queryset):
+    """
+    Anota `geometry_fallback`: la geometría original solo en las zonas sin niveles de
+    detalle precalculados (geometría vacía o que colapsa en el nivel más fino), NULL en
+    el resto. Así se puede diferir geometry_json sin una consulta extra por zona.
+    """
+    return queryset.annotate(geometry_fallback=Case(
+        When(geometry_lod={}, then=F('geometry_json')),
+        default=Value(None),
+        output_field=JSONField(),
+    ))
+
+
+def _compile(zone_id, nombre, updated_at, geometry_json):
+    entry = CompiledZone(zone_id, nombre, updated_at, compile_geometry(geometry_json))
+    _compiled_zones[zone_id] = entry
+    return entry
+
+
+def get_compiled_zone(zone_id):
+    """
+    Zona compilada por id, o None si no existe.
+
+    Solo se consulta (id, nombre, updated_at); el JSON de la geometría se lee y
+    compila únicamente si la versión en caché no coincide (otro proceso la editó).
+    """
+    row = Zone.objects.filter(pk=zone_id).values('id', 'nombre', 'updated_at').first()
+    if row is None:
+        invalidate_zone_geometry(zone_id)
+        return None
+    entry = _compiled_zones.get(row['id'])
+    if entry is not None and entry.updated_at == row['updated_at']:
+        return entry
+    geometry_json = Zone.objects.values_list('geometry_json', flat=True).get(pk=row['id'])
+    return _compile(row['id'], row['nombre'], row['updated_at'], geometry_json)
+
+
+def get_compiled_zones():
+    """Todas las zonas compiladas; recompila solo las nuevas o modificadas."""
+    rows = list(Zone.objects.values('id', 'nombre', 'updated_at'))
+    live_ids = {r['id'] for r in rows}
+    for zone_id in list(_compiled_zones):
+        if zone_id not in live_ids:
+            invalidate_zone_geometry(zone_id)
+
+    stale = [r for r in rows if getattr(_compiled_zones.get(r['id']), 'updated_at', None) != r['updated_at']]
+    if stale:
+        geometries = dict(
+            Zone.objects.filter(pk__in=[r['id'] for r in stale]).values_list('id', 'geometry_json')
+        )
+        for r in stale:
+            _compile(r['id'], r['nombre'], r['updated_at'], geometries.get(r['id']))
+    return [_compiled_zones[r['id']] for r in rows]
+
+
+class ZoneIndex:
+    """
+    Índice de rejilla sobre los bbox de las zonas compiladas.
+
+    Cada celda (lat/lon de `cell_deg` grados) guarda las zonas cuyo bbox la toca;
+    un punto solo se prueba con el polígono exacto de las zonas de su celda.
+    Las zonas muy grandes frente a la celda van a una lista común que se prueba siempre.
+    Si varias zonas contienen el punto gana la de menor área (la más específica).
+    """
+
+    def __init__(self, zones):
+        self.zones = [z for z in zones if z.geometry is not None]
+        spans = [max(z.geometry.bbox[2] - z.geometry.bbox[0], z.geometry.bbox[3] - z.geometry.bbox[1])
+                 for z in self.zones]
+        self.cell_deg = max(float(np.median(spans)), 0.01) if spans else 1.0
+        self.cells = {}
+        self.wide = []
+        for position, zone in enumerate(self.zones):
+            min_lon, min_lat, max_lon, max_lat = zone.geometry.bbox
+            ix0, ix1 = self._cell(min_lon), self._cell(max_lon)
+            iy0, iy1 = self._cell(min_lat), self._cell(max_lat)
+            if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > _MAX_CELLS_PER_ZONE:
+                self.wide.append(position)
+                continue
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    self.cells.setdefault((ix, iy), []).append(position)
+
+    def _cell(self, value):
+        return int(math.floor(value / self.cell_deg))
+
+    def resolve(self, lat, lon):
+        """Zona (CompiledZone) que contiene el punto, o None."""
+        best = None
+        for position in (*self.cells.get((self._cell(lon), self._cell(lat)), ()), *self.wide):
+            zone = self.zones[position]
+            if zone.geometry.contains(lat, lon) and (best is None or zone.geometry.area_km2 < best.geometry.area_km2):
+                best = zone
+        return best
+
+    def resolve_many(self, lats, lons):
+        """
+        Id de zona para cada punto (None si ninguna lo contiene).
+        Los puntos se agrupan por celda y cada zona candidata se prueba en bloque.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = [None] * len(lats)
+        if not self.zones or not len(lats):
+            return result
+        best_area = np.full(len(lats), np.inf)
+
+        def check(zone, idx):
+            inside = zone.geometry.contains_many(lats[idx], lons[idx])
+            better = idx[inside & (zone.geometry.area_km2 < best_area[idx])]
+            best_area[better] = zone.geometry.area_km2
+            for i in better:
+                result[i] = zone.id
+
+        for cell, idx in group_by_cell(lats, lons, self.cell_deg):
+            for position in self.cells.get(cell, ()):
+                check(self.zones[position], idx)
+        if self.wide:
+            everything = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+            for position in self.wide:
+                check(self.zones[position], everything)
+        return result
+
+
+_zone_index = None
+_zone_index_signature = None
+
+
+def get_zone_index():
+    """Índice de zonas vigente; se reconstruye solo si cambió alguna zona."""
+    global _zone_index, _zone_index_signature
+    zones = get_compiled_zones()
+    signature = tuple((z.id, z.updated_at) for z in zones)
+    if _zone_index is None or signature != _zone_index_signature:
+        _zone_index = ZoneIndex(zones)
+        _zone_index_signature = signature
+    return _zone_index
+
+
+def resolve_zone_id(lat, lon):
+    """Id de la zona que contiene (lat, lon), o None."""
+    zone = get_zone_index().resolve(lat, lon)
+    return zone.id if zone else None
+
+
+def resolve_zone_ids(lats, lons):
+    """Id de zona (o None) para cada punto de las listas lats/lons."""
+    return get_zone_index().resolve_many(lats, lons)
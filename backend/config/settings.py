@@ -153,3 +153,37 @@ OPENWEATHERMAP_API_KEY = os.environ.get('OPENWEATHERMAP_API_KEY', '')
 MAILERSEND_API_KEY = os.environ.get('MAILERSEND_API_KEY', '')
 MAILERSEND_SENDER = os.environ.get('MAILERSEND_SENDER', 'info@trial-z3m5yelyy9oldpyo.mlsender.net')
 MAILERSEND_SIMULATE = os.environ.get('MAILERSEND_SIMULATE', 'False').lower() == 'true'
+# URL base alternativa de la API (p. ej. un servidor de pruebas local)
+MAILERSEND_BASE_URL = os.environ.get('MAILERSEND_BASE_URL') or None
+# Envíos simultáneos por proceso (hilos del motor de envío)
+EMAIL_DELIVERY_CONCURRENCY = int(os.environ.get('EMAIL_DELIVERY_CONCURRENCY', '8'))
+# Destinatarios por solicitud bulk-email (MailerSend admite hasta 500)
+MAILERSEND_BULK_BATCH_SIZE = int(os.environ.get('MAILERSEND_BULK_BATCH_SIZE', '500'))
+# Segundos entre consultas del estado de un bulk-email aceptado (conciliación por destinatario)
+MAILERSEND_BULK_STATUS_INTERVAL = float(os.environ.get('MAILERSEND_BULK_STATUS_INTERVAL', '15'))
+# Solicitudes por segundo por proveedor (repartidas entre los procesos worker)
+DELIVERY_RATE_LIMITS = {
+    'mailersend': float(os.environ.get('MAILERSEND_RATE_LIMIT', '2')),
+    'smtp': float(os.environ.get('SMTP_RATE_LIMIT', '5')),
+}
+# Intentos por destinatario antes de marcar el mensaje como FALLIDO
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', '6'))
+# Mensajes en cola a partir de los cuales se rechaza la simulación manual (backpressure)
+OUTBOX_MAX_BACKLOG = int(os.environ.get('OUTBOX_MAX_BACKLOG', '50000'))
+# Segundos que notifications/jobs/<id>/ sugiere esperar (Retry-After) entre consultas
+NOTIFICATION_JOB_POLL_INTERVAL = int(os.environ.get('NOTIFICATION_JOB_POLL_INTERVAL', '2'))
+# Importaciones en segundo plano: carpeta de los archivos subidos y filas por lote (checkpoint)
+IMPORT_UPLOAD_DIR = Path(os.environ.get('IMPORT_UPLOAD_DIR') or BASE_DIR / 'uploads' / 'imports')
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '5000'))
+# Caché en disco de alerts/export/ (LRU por tamaño total; 0 = no guardar archivos)
+EXPORT_CACHE_DIR = Path(os.environ.get('EXPORT_CACHE_DIR') or BASE_DIR / 'cache' / 'exports')
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_MB', '500')) * 1024 * 1024
+# Caché de Django compartida entre procesos (teselas, estadísticas); requiere `pip install redis`.
+# Sin REDIS_URL cada proceso cachea en su memoria; la versión de los datos vive en la base,
+# así que igual ve los cambios de otros procesos, solo recalcula por su cuenta (y las teselas
+# se renuevan todas con cada cambio en vez de solo las que toca).
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+# Segundos que vive una respuesta cacheada de /api/statistics/ (libera memoria; no afecta la frescura)
+STATISTICS_CACHE_TIMEOUT = int(os.environ.get('STATISTICS_CACHE_TIMEOUT', '300'))
@@ -4,6 +4,7 @@ import api from '../services/api'
 export default function SubscribeForm(){
   const [email, setEmail] = useState('')
   const [name, setName] = useState('')
+  const [nearMe, setNearMe] = useState(false)
   const [loading, setLoading] = useState(false)
   const [message, setMessage] = useState(null)
 
@@ -12,10 +13,21 @@ export default function SubscribeForm(){
     setLoading(true)
     setMessage(null)
     try{
-      const res = await api.post('subscribers/', { email, name })
+      const payload = { email, name }
+      if (nearMe && 'geolocation' in navigator) {
+        // Suscripción solo para alertas cercanas a la ubicación actual
+        const pos = await new Promise((resolve, reject) =>
+          navigator.geolocation.getCurrentPosition(resolve, reject, { timeout: 10000 })
+        )
+        payload.home_latitude = pos.coords.latitude
+        payload.home_longitude = pos.coords.longitude
+        payload.home_radio = 10000
+      }
+      const res = await api.post('subscribers/', payload)
       setMessage({ type: 'success', text: 'Suscripción recibida. Gracias.' })
       setEmail('')
       setName('')
+      setNearMe(false)
     }catch(err){
       const txt = err?.response?.data?.detail || err?.response?.data || err.message
       setMessage({ type: 'error', text: String(txt) })
@@ -30,6 +42,10 @@ export default function SubscribeForm(){
         <input type="text" placeholder="Nombre (opcional)" value={name} onChange={e=>setName(e.target.value)} className="flex-1 px-3 py-2 rounded-lg border border-slate-200 text-sm" />
         <input type="email" placeholder="Tu correo" value={email} onChange={e=>setEmail(e.target.value)} required className="w-44 px-3 py-2 rounded-lg border border-slate-200 text-sm" />
       </div>
+      <label className="mt-2 flex items-center gap-2 text-xs text-slate-500">
+        <input type="checkbox" checked={nearMe} onChange={e=>setNearMe(e.target.checked)} />
+        Solo alertas a 10 km de mi ubicación
+      </label>
       <div className="mt-2 flex items-center gap-2">
         <button type="submit" disabled={loading} className="px-3 py-2 bg-green-600 text-white rounded-lg text-xs font-bold hover:bg-green-700">
           {loading ? 'Enviando...' : 'Suscribirse'}
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react'
+import { useState, useEffect } from 'react'
 import 'leaflet/dist/leaflet.css'
 import { MapContainer, TileLayer, Marker, Popup, Polygon, Circle, useMap } from 'react-leaflet'
 import L from 'leaflet'
@@ -22,21 +22,6 @@ L.Icon.Default.mergeOptions({
   shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.9.4/images/marker-shadow.png',
 })
 
-function getDistance(lat1, lon1, lat2, lon2) {
-  const R = 6371e3
-  const φ1 = (lat1 * Math.PI) / 180
-  const φ2 = (lat2 * Math.PI) / 180
-  const Δφ = ((lat2 - lat1) * Math.PI) / 180
-  const Δλ = ((lon2 - lon1) * Math.PI) / 180
-
-  const a = Math.sin(Δφ / 2) * Math.sin(Δφ / 2) +
-    Math.cos(φ1) * Math.cos(φ2) *
-    Math.sin(Δλ / 2) * Math.sin(Δλ / 2)
-  const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a))
-
-  return R * c
-}
-
 const MapController = ({ center, zoom, userPos, autoCenter, trigger }) => {
   const map = useMap()
   const [hasAutoCentered, setHasAutoCentered] = useState(false)
@@ -77,7 +62,7 @@ export default function MapPage() {
 
   useEffect(() => {
     let cancelled = false
-    Promise.all([alertsApi.list({ activas: 'true' }), zonesApi.list()])
+    Promise.all([alertsApi.list({ activas: 'true' }), zonesApi.list({ zoom: 12 })])
       .then(([alertsRes, zonesRes]) => {
         if (cancelled) return
         setAlerts(alertsRes.results || alertsRes)
@@ -124,29 +109,14 @@ export default function MapPage() {
     }
   }, [])
 
-  const checkDanger = useCallback(() => {
-    if (!userPos || alerts.length === 0) return
-
-    const danger = alerts.find(a => {
-      let lat, lon
-      try {
-        const geojson = typeof a.point_geojson === 'string' ? JSON.parse(a.point_geojson) : a.point_geojson
-        const c = geojson?.coordinates
-        if (c) { lon = c[0]; lat = c[1] }
-      } catch (_) { }
-
-      if (lat == null || lon == null) return false
-
-      const dist = getDistance(userPos[0], userPos[1], lat, lon)
-      return dist <= (a.radio_impacto + 50)
-    })
-
-    setNearbyAlert(danger || null)
-  }, [userPos, alerts])
-
   useEffect(() => {
-    checkDanger()
-  }, [checkDanger])
+    if (!userPos) return
+    let cancelled = false
+    alertsApi.nearby(userPos[0], userPos[1])
+      .then((res) => !cancelled && setNearbyAlert(res[0] || null))
+      .catch((err) => console.warn("Error consultando alertas cercanas:", err.message))
+    return () => { cancelled = true }
+  }, [userPos])
 
   useEffect(() => {
     if (nearbyAlert) setShowProximityAlert(true)
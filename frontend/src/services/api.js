@@ -28,6 +28,7 @@ const responseBody = (response) => response.data
 export const alertsApi = {
   list: (params) => api.get('alerts/', { params }).then(responseBody),
   get: (id) => api.get(`alerts/${id}/`).then(responseBody),
+  nearby: (lat, lon) => api.get('alerts/nearby/', { params: { lat, lon } }).then(responseBody),
   create: (data) => api.post('alerts/', data).then(responseBody),
   update: (id, data) => api.patch(`alerts/${id}/`, data).then(responseBody),
   delete: (id) => api.delete(`alerts/${id}/`).then(responseBody),
@@ -41,7 +42,7 @@ export const alertsApi = {
 }
 
 export const zonesApi = {
-  list: () => api.get('zones/').then(responseBody),
+  list: (params) => api.get('zones/', { params }).then(responseBody),
   get: (id) => api.get(`zones/${id}/`).then(responseBody),
   create: (data) => api.post('zones/', data).then(responseBody),
   update: (id, data) => api.patch(`zones/${id}/`, data).then(responseBody),